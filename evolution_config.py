@@ -15,9 +15,23 @@ class EvolutionConfig:
 
     
     # Endpoints
-    SEND_TEXT_ENDPOINT = f"{BASE_URL}message/sendText/{INSTANCE_ID}"
-    PRESENCE_ENDPOINT = f"{BASE_URL}chat/sendPresence/{INSTANCE_ID}"
-    CONNECTION_STATUS_ENDPOINT = f"{BASE_URL}instance/connectionState/{INSTANCE_ID}"
+    _BASE = (BASE_URL or "").rstrip("/")
+    SEND_TEXT_ENDPOINT = f"{_BASE}/message/sendText/{INSTANCE_ID}"
+    SEND_AUDIO_ENDPOINT = f"{_BASE}/message/sendWhatsAppAudio/{INSTANCE_ID}"
+    PRESENCE_ENDPOINT = f"{_BASE}/chat/sendPresence/{INSTANCE_ID}"
+    CONNECTION_STATUS_ENDPOINT = f"{_BASE}/instance/connectionState/{INSTANCE_ID}"
+
+    # Timeouts por endpoint (segundos)
+    CONNECT_TIMEOUT = float(os.getenv("EVOLUTION_CONNECT_TIMEOUT", "3"))
+    SEND_TEXT_TIMEOUT = float(os.getenv("EVOLUTION_SEND_TEXT_TIMEOUT", "10"))
+    SEND_AUDIO_TIMEOUT = float(os.getenv("EVOLUTION_SEND_AUDIO_TIMEOUT", "30"))
+    PRESENCE_TIMEOUT = float(os.getenv("EVOLUTION_PRESENCE_TIMEOUT", "10"))
+    CONNECTION_STATUS_TIMEOUT = float(os.getenv("EVOLUTION_STATUS_TIMEOUT", "5"))
+
+    # Pool de conexões keep-alive
+    MAX_CONNECTIONS = int(os.getenv("EVOLUTION_MAX_CONNECTIONS", "50"))
+    MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("EVOLUTION_MAX_KEEPALIVE", "20"))
+    KEEPALIVE_EXPIRY = float(os.getenv("EVOLUTION_KEEPALIVE_EXPIRY", "60"))
     
     @classmethod
     def is_configured(cls):
@@ -28,6 +42,11 @@ class EvolutionConfig:
             cls.INSTANCE_TOKEN,
         ]
         return all(required_vars)
+
+    @classmethod
+    def can_send(cls):
+        """Verifica se as variáveis necessárias para enviar mensagens estão configuradas"""
+        return all([cls.BASE_URL, cls.API_KEY, cls.INSTANCE_ID])
     
     @classmethod
     def get_headers(cls):
@@ -71,4 +90,4 @@ def print_evolution_status():
         print("📱 Sistema configurado para processar apenas mensagens de texto")
 
 if __name__ == "__main__":
-    print_evolution_status()
\ No newline at end of file
+    print_evolution_status()
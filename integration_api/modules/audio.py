@@ -0,0 +1,21 @@
+import base64
+import os
+import tempfile
+
+# Clipes maiores que este limite são mantidos em arquivo temporário em vez de memória
+AUDIO_SPOOL_MAX_BYTES = int(os.getenv("AUDIO_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+
+
+def decode_base64_audio(audio_base64: str):
+    """
+    Decodifica o áudio recebido da Evolution API para um buffer pronto para leitura.
+    O buffer fica em memória e só é despejado em disco se ultrapassar AUDIO_SPOOL_MAX_BYTES.
+    """
+    audio_file = tempfile.SpooledTemporaryFile(max_size=AUDIO_SPOOL_MAX_BYTES)
+    audio_file.write(base64.b64decode(audio_base64))
+    audio_file.seek(0)
+    return audio_file
+
+
+def encode_base64_audio(audio_bytes: bytes) -> str:
+    return base64.b64encode(audio_bytes).decode("ascii")
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Burst:
+    def __init__(self, started_at: float):
+        self.started_at = started_at
+        self.messages: List[str] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class MessageCoalescer:
+    """
+    Agrupa mensagens consecutivas de um mesmo remetente que chegam dentro da janela
+    de debounce (COALESCE_WINDOW_MS) e as entrega concatenadas em uma única chamada de on_flush.
+    COALESCE_MAX_WAIT_MS limita quanto tempo uma rajada contínua pode ser adiada.
+    Desativado por padrão (COALESCE_WINDOW_MS=0): a janela atrasa toda mensagem de texto,
+    então só compensa quando os usuários costumam escrever em várias mensagens curtas.
+    """
+
+    def __init__(
+        self,
+        on_flush: Callable[[str, str], None],
+        window_seconds: Optional[float] = None,
+        max_wait_seconds: Optional[float] = None,
+        separator: str = "\n",
+    ):
+        self.on_flush = on_flush
+        self.window_seconds = (
+            window_seconds
+            if window_seconds is not None
+            else float(os.getenv("COALESCE_WINDOW_MS", "0")) / 1000
+        )
+        self.max_wait_seconds = (
+            max_wait_seconds
+            if max_wait_seconds is not None
+            else float(os.getenv("COALESCE_MAX_WAIT_MS", "8000")) / 1000
+        )
+        self.separator = separator
+        self._bursts: Dict[str, _Burst] = {}
+
+    def is_pending(self, key: str) -> bool:
+        """Indica se já há uma rajada aberta do remetente, aguardando a entrega"""
+        return key in self._bursts
+
+    def add(self, key: str, message: str):
+        if self.window_seconds <= 0:
+            self.on_flush(key, message)
+            return
+
+        now = time.monotonic()
+        burst = self._bursts.get(key)
+        if burst is None:
+            burst = _Burst(now)
+            self._bursts[key] = burst
+        burst.messages.append(message)
+
+        if burst.timer is not None:
+            burst.timer.cancel()
+
+        # Reinicia a janela, sem ultrapassar o tempo máximo de espera da rajada
+        delay = min(self.window_seconds, burst.started_at + self.max_wait_seconds - now)
+        burst.timer = asyncio.get_running_loop().call_later(
+            max(delay, 0), self.flush, key
+        )
+
+    def flush(self, key: str):
+        """Entrega imediatamente as mensagens pendentes do remetente, se houver"""
+        burst = self._bursts.pop(key, None)
+        if burst is None:
+            return
+        if burst.timer is not None:
+            burst.timer.cancel()
+
+        if len(burst.messages) > 1:
+            logger.info(f"{len(burst.messages)} mensagens de {key} agrupadas em uma só.")
+        try:
+            self.on_flush(key, self.separator.join(burst.messages))
+        except Exception as e:
+            logger.error(f"Erro ao entregar mensagens agrupadas de {key}: {e}", exc_info=True)
+
+    def flush_all(self):
+        for key in list(self._bursts):
+            self.flush(key)
@@ -0,0 +1,98 @@
+import logging
+import os
+import threading
+from typing import Callable
+
+from modules.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_ROLE_NAMES = {"user": "Usuário", "assistant": "Assistente"}
+
+
+class ConversationCompactor:
+    """
+    Resume as mensagens mais antigas de conversas longas. Quando as mensagens ainda não
+    resumidas (sem contar as COMPACTION_KEEP_TURNS mais recentes) passam de
+    COMPACTION_TRIGGER_TOKENS, elas são incorporadas ao resumo da conversa em segundo plano.
+    Fica desligado quando o histórico não tem onde guardar os resumos.
+    """
+
+    def __init__(
+        self, history, counter, complete: Callable, executor, org_name: str, model: str
+    ):
+        self.history = history
+        self.counter = counter
+        self.complete = complete
+        self.executor = executor
+        self.org_name = org_name
+        self.model = model
+        self.enabled = (
+            os.getenv("COMPACTION_ENABLED", "true").lower() == "true" and history.summaries_enabled
+        )
+        self.trigger_tokens = int(os.getenv("COMPACTION_TRIGGER_TOKENS", "600"))
+        self.keep_turns = int(os.getenv("COMPACTION_KEEP_TURNS", "6"))
+        self.summary_max_tokens = int(os.getenv("COMPACTION_SUMMARY_MAX_TOKENS", "250"))
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def _candidates(self, number):
+        summary, turns = self.history.unfolded_turns(number)
+        candidates = turns[: max(0, len(turns) - self.keep_turns)]
+        tokens = sum(self.counter.count(message) for _, message, _ in candidates)
+        return summary, candidates, tokens
+
+    def maybe_schedule(self, number):
+        if not self.enabled:
+            return
+        _, _, tokens = self._candidates(number)
+        if tokens < self.trigger_tokens:
+            return
+        with self._lock:
+            if number in self._running:
+                return
+            self._running.add(number)
+        self.executor.submit(self.compact, number)
+
+    def compact(self, number):
+        try:
+            summary, candidates, tokens = self._candidates(number)
+            if tokens < self.trigger_tokens:
+                return
+
+            transcript = "\n".join(
+                f"{_ROLE_NAMES.get(role, role)}: {message}" for role, message, _ in candidates
+            )
+            chat_completion = self.complete(
+                messages=[
+                    {
+                        "role": "system",
+                        "content": f"""
+                            Você resume conversas de atendimento da {self.org_name}.
+                            Atualize o resumo da conversa incorporando as novas mensagens, mantendo as dúvidas do usuário,
+                            os serviços mencionados e as orientações já dadas, para que o atendimento possa continuar.
+                            Seja objetivo. Responda apenas com o resumo atualizado.
+                        """,
+                    },
+                    {
+                        "role": "user",
+                        "content": f"Resumo até agora:\n{summary or 'Nenhum.'}\n\nNovas mensagens:\n{transcript}",
+                    },
+                ],
+                model=self.model,
+                max_tokens=self.summary_max_tokens,
+            )
+            new_summary = chat_completion.choices[0].message.content.strip()
+
+            self.history.mark_folded(number, candidates[-1], new_summary)
+            metrics.increment("conversation_compactions")
+            metrics.observe("conversation_compacted_tokens", tokens)
+            logger.info(
+                f"Conversa de {number} compactada: {len(candidates)} mensagens ({tokens} tokens) "
+                f"resumidas em {self.counter.count(new_summary)} tokens."
+            )
+        except Exception as e:
+            logger.error(f"Erro ao compactar a conversa de {number}: {e!r}")
+        finally:
+            with self._lock:
+                self._running.discard(number)
@@ -1,4 +1,5 @@
 import psycopg2
+import psycopg2.extras
 import os
 
 
@@ -12,7 +13,7 @@ class DB:
             "schema": os.getenv("POSTGRE_SCHEMA"),
         }
 
-    def __exec_select__(self, select_query):
+    def __exec_select__(self, select_query, params=None):
         schema_name = self.connection_data["schema"]
         conn = psycopg2.connect(
             host=self.connection_data["host"],
@@ -22,14 +23,14 @@ class DB:
             options=f"-c search_path={schema_name}",
         )
         cursor = conn.cursor()
-        cursor.execute(select_query)
+        cursor.execute(select_query, params)
         messages = cursor.fetchall()
         cursor.close()
         conn.close()
 
         return messages
 
-    def __exec_insert__(self, insert_query):
+    def __exec_insert__(self, insert_query, params=None):
         schema_name = self.connection_data["schema"]
         conn = psycopg2.connect(
             host=self.connection_data["host"],
@@ -39,13 +40,48 @@ class DB:
             options=f"-c search_path={schema_name}",
         )
         cursor = conn.cursor()
-        cursor.execute(insert_query)
+        cursor.execute(insert_query, params)
         conn.commit()
         cursor.close()
         conn.close()
 
         return None
 
+    def __exec_insert_many__(self, insert_query, rows):
+        schema_name = self.connection_data["schema"]
+        conn = psycopg2.connect(
+            host=self.connection_data["host"],
+            database=self.connection_data["database"],
+            user=self.connection_data["user"],
+            password=self.connection_data["password"],
+            options=f"-c search_path={schema_name}",
+        )
+        cursor = conn.cursor()
+        psycopg2.extras.execute_values(cursor, insert_query, rows)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+        return None
+
+    def __exec_returning__(self, write_query, params=None):
+        schema_name = self.connection_data["schema"]
+        conn = psycopg2.connect(
+            host=self.connection_data["host"],
+            database=self.connection_data["database"],
+            user=self.connection_data["user"],
+            password=self.connection_data["password"],
+            options=f"-c search_path={schema_name}",
+        )
+        cursor = conn.cursor()
+        cursor.execute(write_query, params)
+        row = cursor.fetchone()
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+        return row
+
     def get_messages(self, number):
         select_query = f"""
             SELECT role, message
@@ -65,6 +101,45 @@ class DB:
 
         return self.__exec_insert__(insert_query)
 
+    def get_recent_messages(self, number, limit, with_summary=True):
+        # Mais recentes primeiro; folded indica se a mensagem já está no resumo da conversa
+        if not with_summary:
+            # Sem as colunas de resumo: mesmo formato, nenhuma mensagem resumida
+            select_query = """
+                SELECT role, message, created_at, FALSE AS folded, '' AS conversation_summary
+                FROM chatbot_whatsapp
+                WHERE phone_number = %s
+                ORDER BY created_at DESC
+                LIMIT %s;
+            """
+            return self.__exec_select__(select_query, (number, limit))
+
+        select_query = """
+            SELECT c.role, c.message, c.created_at,
+                   COALESCE(c.created_at <= i.conversation_summary_until, FALSE) AS folded,
+                   COALESCE(i.conversation_summary, '') AS conversation_summary
+            FROM chatbot_whatsapp c
+            LEFT JOIN whatsapp_information i ON i.phone_number = c.phone_number
+            WHERE c.phone_number = %s
+            ORDER BY c.created_at DESC
+            LIMIT %s;
+        """
+
+        return self.__exec_select__(select_query, (number, limit))
+
+    def get_local_timestamp(self):
+        # Relógio do banco, sem fuso, como o DEFAULT now() gravado em colunas TIMESTAMP
+        return self.__exec_select__("SELECT LOCALTIMESTAMP;")[0][0]
+
+    def insert_messages(self, rows):
+        # rows: (phone_number, role, message, created_at), gravadas em uma única transação
+        insert_query = """
+            INSERT INTO chatbot_whatsapp (phone_number, role, message, created_at)
+            VALUES %s;
+        """
+
+        return self.__exec_insert_many__(insert_query, rows)
+
     def get_foreknowledge(self, number):
         select_query = f"""
             select general_information 
@@ -88,3 +163,66 @@ class DB:
         """
 
         return self.__exec_insert__(upsert_query)
+
+    def create_conversation_summary_columns(self):
+        alter_query = """
+            ALTER TABLE whatsapp_information
+                ADD COLUMN IF NOT EXISTS conversation_summary TEXT,
+                ADD COLUMN IF NOT EXISTS conversation_summary_until TIMESTAMP;
+        """
+
+        return self.__exec_insert__(alter_query)
+
+    def update_conversation_summary(self, number, summary, summary_until):
+        upsert_query = """
+            INSERT INTO whatsapp_information (
+                phone_number, general_information, conversation_summary, conversation_summary_until
+            )
+            VALUES (%s, '', %s, %s)
+            ON CONFLICT ( phone_number )
+            DO UPDATE SET
+                conversation_summary = EXCLUDED.conversation_summary,
+                conversation_summary_until = EXCLUDED.conversation_summary_until;
+        """
+
+        return self.__exec_insert__(upsert_query, (number, summary, summary_until))
+
+    def create_webhook_dedup_table(self):
+        create_query = """
+            CREATE TABLE IF NOT EXISTS webhook_dedup (
+                dedup_key TEXT PRIMARY KEY,
+                created_at TIMESTAMP NOT NULL DEFAULT now()
+            );
+        """
+
+        return self.__exec_insert__(create_query)
+
+    def mark_webhook_message(self, dedup_key, ttl_seconds):
+        # Retorna True se a chave é nova (ou a anterior já expirou)
+        upsert_query = """
+            INSERT INTO webhook_dedup ( dedup_key, created_at )
+            VALUES (%s, now())
+            ON CONFLICT ( dedup_key )
+            DO UPDATE SET
+                created_at = EXCLUDED.created_at
+            WHERE webhook_dedup.created_at < now() - make_interval(secs => %s)
+            RETURNING dedup_key;
+        """
+
+        return self.__exec_returning__(upsert_query, (dedup_key, ttl_seconds)) is not None
+
+    def purge_webhook_messages(self, ttl_seconds):
+        delete_query = """
+            DELETE FROM webhook_dedup
+            WHERE created_at < now() - make_interval(secs => %s);
+        """
+
+        return self.__exec_insert__(delete_query, (ttl_seconds,))
+
+    def delete_webhook_message(self, dedup_key):
+        delete_query = """
+            DELETE FROM webhook_dedup
+            WHERE dedup_key = %s;
+        """
+
+        return self.__exec_insert__(delete_query, (dedup_key,))
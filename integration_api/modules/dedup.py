@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryDedupBackend:
+    """Armazena as chaves já vistas em memória, com TTL e tamanho máximo (O(1) por verificação)"""
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+
+    def mark(self, key: str) -> bool:
+        """Registra a chave e retorna True se ela ainda não tinha sido vista"""
+        now = time.monotonic()
+        self._evict_expired(now)
+
+        expires_at = self._entries.get(key)
+        if expires_at is not None and expires_at > now:
+            return False
+
+        self._entries[key] = now + self.ttl_seconds
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return True
+
+    def release(self, key: str):
+        self._entries.pop(key, None)
+
+    def _evict_expired(self, now: float):
+        # As entradas estão em ordem de inserção, então as expiradas ficam no início
+        while self._entries:
+            if next(iter(self._entries.values())) > now:
+                break
+            self._entries.popitem(last=False)
+
+
+class PostgresDedupBackend:
+    """
+    Armazena as chaves na tabela webhook_dedup, que sobrevive a reinícios e é compartilhada
+    entre o processo antigo e o novo durante um deploy
+    """
+
+    PURGE_EVERY = 500
+
+    def __init__(self, ttl_seconds: float):
+        from modules.db import DB
+
+        self.ttl_seconds = ttl_seconds
+        self.db = DB()
+        self._initialized = False
+        self._marks = 0
+
+    def _ensure_initialized(self):
+        """Cria a tabela apenas quando necessário"""
+        if not self._initialized:
+            self.db.create_webhook_dedup_table()
+            self._initialized = True
+
+    def mark(self, key: str) -> bool:
+        self._ensure_initialized()
+        is_new = self.db.mark_webhook_message(key, self.ttl_seconds)
+
+        self._marks += 1
+        if self._marks % self.PURGE_EVERY == 0:
+            self.db.purge_webhook_messages(self.ttl_seconds)
+        return is_new
+
+    def release(self, key: str):
+        self._ensure_initialized()
+        self.db.delete_webhook_message(key)
+
+
+class MessageDeduplicator:
+    """
+    Descarta eventos re-entregues pela Evolution API, usando instância + id da mensagem.
+    A verificação local em memória sempre acontece primeiro; o backend Postgres
+    (WEBHOOK_DEDUP_BACKEND=postgres) só é consultado para chaves ainda não vistas neste processo.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        max_size: Optional[int] = None,
+    ):
+        backend = (backend or os.getenv("WEBHOOK_DEDUP_BACKEND", "memory")).lower()
+        ttl_seconds = ttl_seconds or float(os.getenv("WEBHOOK_DEDUP_TTL", "600"))
+        max_size = max_size or int(os.getenv("WEBHOOK_DEDUP_MAX_SIZE", "10000"))
+
+        self.local = InMemoryDedupBackend(ttl_seconds, max_size)
+        self.shared = None
+        if backend == "postgres":
+            self.shared = PostgresDedupBackend(ttl_seconds)
+        elif backend != "memory":
+            raise ValueError(f"Backend de deduplicação desconhecido: {backend}")
+
+    async def is_duplicate(self, instance: str, message_id: str) -> bool:
+        if not message_id:
+            return False
+
+        key = f"{instance}:{message_id}"
+        if not self.local.mark(key):
+            return True
+
+        if self.shared is not None:
+            try:
+                return not await asyncio.to_thread(self.shared.mark, key)
+            except Exception as e:
+                # Na falha do backend compartilhado, prefere processar a mensagem a perdê-la
+                logger.error(f"Erro ao verificar duplicidade no Postgres: {e}")
+        return False
+
+    async def release(self, instance: str, message_id: str):
+        """Remove o registro da mensagem, para que uma nova entrega dela seja processada"""
+        if not message_id:
+            return
+
+        key = f"{instance}:{message_id}"
+        self.local.release(key)
+        if self.shared is not None:
+            try:
+                await asyncio.to_thread(self.shared.release, key)
+            except Exception as e:
+                logger.error(f"Erro ao remover registro de duplicidade no Postgres: {e}")
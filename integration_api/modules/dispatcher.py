@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DispatcherFullError(Exception):
+    """Levantada quando a fila de processamento atingiu o limite configurado"""
+
+
+class ConversationDispatcher:
+    """
+    Distribui o processamento das mensagens em uma fila ordenada por remetente,
+    com limite global de workers simultâneos e limite de profundidade das filas.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        max_per_sender: Optional[int] = None,
+    ):
+        self.max_workers = max_workers or int(os.getenv("DISPATCHER_MAX_WORKERS", "8"))
+        self.max_pending = max_pending or int(os.getenv("DISPATCHER_MAX_PENDING", "200"))
+        self.max_per_sender = max_per_sender or int(
+            os.getenv("DISPATCHER_MAX_PER_SENDER", "10")
+        )
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._queues: Dict[str, Deque] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._reserved: Dict[str, int] = {}
+        self._pending = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Cria o semáforo apenas quando necessário, dentro do event loop em execução"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        return self._semaphore
+
+    def check_capacity(self, key: str) -> None:
+        """Levanta DispatcherFullError se uma nova mensagem de `key` não puder ser enfileirada"""
+        queue = self._queues.get(key)
+
+        if self._pending >= self.max_pending:
+            raise DispatcherFullError(
+                f"Limite global de {self.max_pending} mensagens pendentes atingido"
+            )
+        queued = (len(queue) if queue is not None else 0) + self._reserved.get(key, 0)
+        if queued >= self.max_per_sender:
+            raise DispatcherFullError(
+                f"Limite de {self.max_per_sender} mensagens pendentes atingido para {key}"
+            )
+
+    def reserve(self, key: str) -> None:
+        """
+        Reserva uma vaga na fila de `key` para um submit(..., reserved=True) posterior,
+        levantando DispatcherFullError se não houver espaço
+        """
+        self.check_capacity(key)
+        self._reserved[key] = self._reserved.get(key, 0) + 1
+        self._pending += 1
+
+    def _take_reservation(self, key: str):
+        self._reserved[key] -= 1
+        if not self._reserved[key]:
+            del self._reserved[key]
+
+    def submit(
+        self, key: str, func: Callable[..., Awaitable], *args, reserved: bool = False
+    ) -> None:
+        """
+        Enfileira func(*args) na fila do remetente `key`, preservando a ordem de chegada.
+        Com reserved=True usa a vaga obtida antes por reserve(), sem nova verificação de limite.
+        """
+        if reserved:
+            self._take_reservation(key)
+        else:
+            self.check_capacity(key)
+            self._pending += 1
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = deque()
+            self._queues[key] = queue
+        queue.append((func, args))
+
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._drain(key))
+
+    async def _drain(self, key: str):
+        queue = self._queues[key]
+        try:
+            while queue:
+                func, args = queue.popleft()
+                try:
+                    async with self._get_semaphore():
+                        await func(*args)
+                except Exception as e:
+                    logger.error(
+                        f"Erro ao processar mensagem de {key}: {e}", exc_info=True
+                    )
+                finally:
+                    self._pending -= 1
+        finally:
+            self._queues.pop(key, None)
+            self._workers.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._pending,
+            "active_senders": len(self._workers),
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+        }
+
+    async def shutdown(self, timeout: float = 30):
+        """Aguarda as filas em andamento terminarem, até o timeout informado"""
+        workers = list(self._workers.values())
+        if not workers:
+            return
+        logger.info(f"Aguardando {len(workers)} fila(s) de processamento terminarem.")
+        done, still_running = await asyncio.wait(workers, timeout=timeout)
+        for task in still_running:
+            task.cancel()
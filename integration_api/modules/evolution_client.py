@@ -0,0 +1,127 @@
+import logging
+from typing import Optional
+
+import httpx
+
+from evolution_config import EvolutionConfig
+from modules.resilience import (
+    REJECTED_STATUS,
+    RETRYABLE_STATUS,
+    RetryableStatusError,
+    RetryPolicy,
+    acall_with_retry,
+    get_breaker,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class EvolutionClient:
+    """Cliente assíncrono compartilhado da Evolution API, com pool de conexões keep-alive"""
+
+    def __init__(self, config=EvolutionConfig):
+        self.config = config
+        self._client: Optional[httpx.AsyncClient] = None
+        self.breaker = get_breaker("evolution")
+        self.retry_policy = RetryPolicy()
+        # Presença atrasada não tem utilidade: uma única tentativa
+        self.presence_policy = RetryPolicy(max_attempts=1)
+
+    def is_configured(self) -> bool:
+        return self.config.can_send()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Cria o cliente HTTP apenas quando necessário, dentro do event loop em execução"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=self.config.get_headers(),
+                limits=httpx.Limits(
+                    max_connections=self.config.MAX_CONNECTIONS,
+                    max_keepalive_connections=self.config.MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=self.config.KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(
+                    self.config.SEND_TEXT_TIMEOUT, connect=self.config.CONNECT_TIMEOUT
+                ),
+            )
+            logger.info("Pool de conexões da Evolution API criado.")
+        return self._client
+
+    def _timeout(self, seconds: float) -> httpx.Timeout:
+        return httpx.Timeout(seconds, connect=self.config.CONNECT_TIMEOUT)
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("Pool de conexões da Evolution API encerrado.")
+        self._client = None
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        timeout: float,
+        policy: RetryPolicy = None,
+        idempotent: bool = False,
+        **kwargs,
+    ) -> httpx.Response:
+        """
+        Faz a requisição com novas tentativas e circuito. Envios não são idempotentes: só são
+        repetidos quando a Evolution API com certeza não os recebeu (falha de conexão, 429, 503).
+        Se as tentativas se esgotarem, a última resposta é devolvida ao chamador.
+        """
+        retry_status = RETRYABLE_STATUS if idempotent else REJECTED_STATUS
+
+        async def request():
+            response = await self._get_client().request(
+                method, url, timeout=self._timeout(timeout), **kwargs
+            )
+            if response.status_code in retry_status:
+                raise RetryableStatusError(response)
+            return response
+
+        try:
+            return await acall_with_retry(
+                self.breaker,
+                request,
+                policy=policy or self.retry_policy,
+                idempotent=idempotent,
+            )
+        except RetryableStatusError as e:
+            return e.response
+
+    async def send_text(self, number: str, text: str) -> httpx.Response:
+        payload = {"number": number, "text": text}
+        return await self._request(
+            "POST", self.config.SEND_TEXT_ENDPOINT, self.config.SEND_TEXT_TIMEOUT, json=payload
+        )
+
+    async def send_audio(self, number: str, audio_base64: str) -> httpx.Response:
+        payload = {
+            "number": number,
+            "audio": audio_base64,
+            "encoding": False,
+        }
+        return await self._request(
+            "POST", self.config.SEND_AUDIO_ENDPOINT, self.config.SEND_AUDIO_TIMEOUT, json=payload
+        )
+
+    async def send_presence(
+        self, number: str, presence: str, delay: int
+    ) -> httpx.Response:
+        payload = {"number": number, "delay": delay, "presence": presence}
+        return await self._request(
+            "POST",
+            self.config.PRESENCE_ENDPOINT,
+            self.config.PRESENCE_TIMEOUT,
+            policy=self.presence_policy,
+            json=payload,
+        )
+
+    async def connection_state(self) -> httpx.Response:
+        return await self._request(
+            "GET",
+            self.config.CONNECTION_STATUS_ENDPOINT,
+            self.config.CONNECTION_STATUS_TIMEOUT,
+            idempotent=True,
+        )
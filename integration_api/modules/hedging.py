@@ -0,0 +1,68 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from modules.metrics import metrics
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """Guarda as últimas latências de uma etapa para estimar o p95 usado como prazo do hedge"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+async def hedged(
+    call: Callable[[], Awaitable[T]],
+    hedge_after: Optional[float],
+    timeout: float,
+    stage: str,
+) -> T:
+    """
+    Executa call() com tempo limite. Se hedge_after for informado e a primeira tentativa não
+    responder nesse prazo, dispara uma cópia e usa a que responder primeiro, cancelando a outra.
+    """
+    tasks = []
+
+    async def race():
+        tasks.append(asyncio.ensure_future(call()))
+        first = tasks[0]
+        if hedge_after is not None:
+            done, _ = await asyncio.wait({first}, timeout=hedge_after)
+            if not done:
+                metrics.increment("llm_hedged_requests", {"stage": stage})
+                tasks.append(asyncio.ensure_future(call()))
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        metrics.increment("llm_hedge_wins", {"stage": stage})
+                    return task.result()
+        # Todas falharam: propaga o erro da primeira
+        return first.result()
+
+    try:
+        return await asyncio.wait_for(race(), timeout)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,250 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from modules.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Conversation:
+    """
+    turns guarda (role, message, created_at); as primeiras `folded` mensagens já estão
+    resumidas em `summary`
+    """
+
+    __slots__ = ("turns", "last_access", "summary", "folded")
+
+    def __init__(self, turns: deque, summary: str = "", folded: int = 0):
+        self.turns = turns
+        self.last_access = time.monotonic()
+        self.summary = summary
+        self.folded = folded
+
+    def extend(self, turns):
+        overflow = max(0, len(self.turns) + len(turns) - self.turns.maxlen)
+        self.turns.extend(turns)
+        # Mensagens que saíram do buffer deixam de contar como resumidas
+        self.folded = max(0, self.folded - overflow)
+
+
+class ConversationHistoryCache:
+    """
+    Histórico recente de cada número em memória (LRU com expiração por inatividade), com as
+    novas mensagens gravadas em lote no chatbot_whatsapp por uma thread em segundo plano.
+    close() grava tudo o que estiver pendente.
+
+    Cada conversa também guarda o resumo das mensagens mais antigas (ver ConversationCompactor),
+    para que o prompt leve o resumo e apenas as mensagens ainda não resumidas.
+
+    O cache é do processo: com mais de um worker atendendo o mesmo número, cada um veria só as
+    próprias mensagens. A aplicação deve rodar com um único worker (o padrão do uvicorn), como
+    já exigem as filas por remetente do ConversationDispatcher.
+
+    O created_at das mensagens segue o relógio do banco (o mesmo do DEFAULT now() das linhas
+    gravadas antes do cache): a diferença para o relógio local é medida na inicialização.
+
+    Se as colunas de resumo não puderem ser criadas (usuário sem permissão de ALTER TABLE,
+    banco fora do ar na subida), o histórico funciona sem resumos (summaries_enabled False).
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.summaries_enabled = self._create_summary_columns()
+        self.turns = int(os.getenv("HISTORY_CACHE_TURNS", "20"))
+        self.max_numbers = int(os.getenv("HISTORY_CACHE_MAX_NUMBERS", "5000"))
+        self.idle_ttl = float(os.getenv("HISTORY_CACHE_IDLE_TTL", "1800"))
+        self.flush_interval = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+        self.flush_batch = int(os.getenv("HISTORY_FLUSH_BATCH", "200"))
+        # Limite de mensagens pendentes caso o banco fique fora do ar por muito tempo
+        self.max_pending = int(os.getenv("HISTORY_MAX_PENDING", "20000"))
+
+        self._clock_offset = self._measure_clock_offset()
+
+        self._conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._pending: List[Tuple[str, str, str, datetime]] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._writer = threading.Thread(
+            target=self._run_writer, name="history-writer", daemon=True
+        )
+        self._writer.start()
+
+    def _create_summary_columns(self) -> bool:
+        try:
+            self.db.create_conversation_summary_columns()
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao criar as colunas de resumo, seguindo sem resumos: {e}")
+            return False
+
+    def _measure_clock_offset(self) -> timedelta:
+        try:
+            before = datetime.now()
+            database_now = self.db.get_local_timestamp()
+            after = datetime.now()
+            return database_now - (before + (after - before) / 2)
+        except Exception as e:
+            logger.error(f"Erro ao ler o relógio do banco, usando o relógio local: {e}")
+            return timedelta(0)
+
+    def _evict(self, now: float):
+        while self._conversations:
+            number, conversation = next(iter(self._conversations.items()))
+            if (
+                len(self._conversations) <= self.max_numbers
+                and now - conversation.last_access < self.idle_ttl
+            ):
+                break
+            del self._conversations[number]
+
+    def _get(self, number: str) -> _Conversation:
+        """Conversa do cache (carregada do banco se necessário); chamar sem o lock"""
+        now = time.monotonic()
+        with self._lock:
+            conversation = self._conversations.get(number)
+            if conversation is not None:
+                conversation.last_access = now
+                self._conversations.move_to_end(number)
+                metrics.increment("history_cache", {"result": "hit"})
+                return conversation
+
+        metrics.increment("history_cache", {"result": "miss"})
+        rows = self.db.get_recent_messages(number, self.turns, self.summaries_enabled)
+
+        with self._lock:
+            conversation = self._conversations.get(number)
+            if conversation is None:
+                rows = list(reversed(rows))
+                turns = deque(
+                    ((role, message, created_at) for role, message, created_at, _, _ in rows),
+                    maxlen=self.turns,
+                )
+                conversation = _Conversation(
+                    turns,
+                    summary=rows[-1][4] if rows else "",
+                    folded=sum(1 for row in rows if row[3]),
+                )
+                # Mensagens ainda não gravadas no banco também fazem parte do histórico
+                conversation.extend(
+                    [
+                        (role, message, created_at)
+                        for pending_number, role, message, created_at in self._pending
+                        if pending_number == number
+                    ]
+                )
+                self._conversations[number] = conversation
+            conversation.last_access = now
+            self._conversations.move_to_end(number)
+            self._evict(now)
+            return conversation
+
+    def get_messages(self, number: str) -> List[Tuple[str, str]]:
+        """Mesmo formato de DB.get_messages: (role, message), da mais recente para a mais antiga"""
+        conversation = self._get(number)
+        with self._lock:
+            return [(role, message) for role, message, _ in reversed(conversation.turns)]
+
+    def get_context(self, number: str) -> Tuple[str, List[Tuple[str, str]]]:
+        """Resumo da conversa e as mensagens ainda não resumidas, da mais recente para a mais antiga"""
+        conversation = self._get(number)
+        with self._lock:
+            recent = list(conversation.turns)[conversation.folded :]
+            return conversation.summary, [(role, message) for role, message, _ in reversed(recent)]
+
+    def unfolded_turns(self, number: str) -> Tuple[str, list]:
+        """Resumo atual e as mensagens (role, message, created_at) ainda fora dele, em ordem cronológica"""
+        conversation = self._get(number)
+        with self._lock:
+            return conversation.summary, list(conversation.turns)[conversation.folded :]
+
+    def mark_folded(self, number: str, last_turn: tuple, summary: str):
+        """Registra que as mensagens até last_turn (inclusive) estão no novo resumo"""
+        with self._lock:
+            conversation = self._conversations.get(number)
+            if conversation is not None:
+                # Busca por identidade: o buffer pode ter andado desde a leitura
+                for index, turn in enumerate(conversation.turns):
+                    if turn is last_turn:
+                        conversation.folded = index + 1
+                        break
+                else:
+                    conversation.folded = 0
+                conversation.summary = summary
+        self.db.update_conversation_summary(number, summary, last_turn[2])
+
+    def append(self, number: str, messages: List[Tuple[str, str]]):
+        """Acrescenta (role, message) ao histórico em memória e agenda a gravação no banco"""
+        now = time.monotonic()
+        # Horários distintos mantêm a ordem das mensagens gravadas no mesmo lote
+        started_at = datetime.now() + self._clock_offset
+        turns = [
+            (role, message, started_at + timedelta(microseconds=index))
+            for index, (role, message) in enumerate(messages)
+        ]
+        with self._lock:
+            conversation = self._conversations.get(number)
+            if conversation is not None:
+                conversation.extend(turns)
+                conversation.last_access = now
+                self._conversations.move_to_end(number)
+
+            for role, message, created_at in turns:
+                self._pending.append((number, role, message, created_at))
+            if len(self._pending) > self.max_pending:
+                dropped = len(self._pending) - self.max_pending
+                del self._pending[:dropped]
+                metrics.increment("history_dropped_messages", value=dropped)
+                logger.error(f"{dropped} mensagem(ns) do histórico descartada(s): banco indisponível.")
+            if len(self._pending) >= self.flush_batch:
+                self._wake.notify()
+            self._evict(now)
+
+    def flush(self):
+        """Grava as mensagens pendentes; em caso de erro elas voltam para a fila"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return
+            try:
+                self.db.insert_messages(rows)
+                metrics.increment("history_flushed_messages", value=len(rows))
+            except Exception as e:
+                logger.error(f"Erro ao gravar {len(rows)} mensagem(ns) do histórico: {e}")
+                with self._lock:
+                    self._pending[:0] = rows
+                raise
+
+    def _run_writer(self):
+        failed = False
+        while True:
+            with self._lock:
+                # Depois de uma falha espera o intervalo inteiro, mesmo com o lote cheio
+                if not self._closed and (failed or len(self._pending) < self.flush_batch):
+                    self._wake.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+                failed = False
+            except Exception:
+                failed = True
+            if closed:
+                return
+
+    def close(self, timeout: float = 10):
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+        self._writer.join(timeout)
+        # Garante a gravação mesmo que a thread tenha falhado ou estourado o tempo
+        try:
+            self.flush()
+        except Exception:
+            logger.error(f"{len(self._pending)} mensagem(ns) do histórico não gravada(s) no encerramento.")
@@ -0,0 +1,182 @@
+import logging
+import os
+import re
+import threading
+from typing import Callable, List, NamedTuple, Optional
+
+import numpy as np
+
+from modules.metrics import metrics
+from modules.semantic_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+GREETING = "greeting"
+THANKS = "thanks"
+ACKNOWLEDGEMENT = "acknowledgement"
+GOODBYE = "goodbye"
+OUT_OF_SCOPE = "out_of_scope"
+
+DEFAULT_TEMPLATES = {
+    GREETING: "Olá! Eu sou o assistente virtual da {org_name}. Como posso ajudar você hoje?",
+    THANKS: (
+        "Por nada! Se precisar de mais alguma informação sobre os serviços da {org_name}, "
+        "é só chamar."
+    ),
+    ACKNOWLEDGEMENT: "Certo! Se tiver mais alguma dúvida, é só mandar uma mensagem.",
+    GOODBYE: "Até logo! Sempre que precisar, estou por aqui.",
+    OUT_OF_SCOPE: (
+        "Olá, eu sou um assistente virtual da {org_name} e fui desenvolvido apenas para ajudar "
+        "com dúvidas sobre os serviços da {org_name}."
+    ),
+}
+
+# Termos das mensagens curtas: a mensagem inteira precisa ser formada por eles
+_GREETING_TERMS = (
+    r"oi+|ola|ole|opa|eai|e ai|hey|hello|bom dia|boa tarde|boa noite|tudo bem|tudo bom|td bem|"
+    r"como vai|saudacoes"
+)
+_THANKS_WORDS = r"obrigad[oa]s?|brigad[oa]|obg|valeu|vlw|agradeco|grat[oa]"
+# Intensificadores só contam junto de um agradecimento ("muito obrigado"), nunca sozinhos
+_INTENSIFIER_TERMS = r"muito|mt|mto"
+_ACKNOWLEDGEMENT_TERMS = r"ok|okay|certo|entendi|ta bom|ta|blz|beleza|perfeito|show|combinado"
+_GOODBYE_TERMS = r"tchau|ate logo|ate mais|ate breve|ate amanha|falou|adeus|bom descanso"
+_FILLER_TERMS = r"e voce|com voce|contigo|ai|ae|pessoal|entao|sim|pela ajuda|por tudo|viu"
+
+# Assuntos que o prompt de sistema recusaria de qualquer forma
+_OUT_OF_SCOPE_PATTERNS = [
+    r"\b(conte|conta|contar|fala|sabe|manda)( me)? (uma )?piada",
+    r"\b(horoscopo|meu signo)\b",
+    r"\b(em quem|quem) (eu )?(devo )?votar\b",
+    r"\b(quem ganhou|placar d[oea])\b.*\b(jogo|partida|campeonato|copa)\b",
+]
+
+# Exemplos usados pela classificação por similaridade (opcional)
+_EXAMPLES = {
+    GREETING: ["oi tudo bem", "ola bom dia", "boa tarde tudo bom"],
+    THANKS: ["muito obrigado pela ajuda", "valeu obrigada", "agradeco a atencao"],
+    GOODBYE: ["tchau ate mais", "ate logo obrigado"],
+    OUT_OF_SCOPE: [
+        "me conta uma piada",
+        "qual time vai ganhar o campeonato",
+        "me passa uma receita de bolo",
+        "o que voce acha do presidente",
+    ],
+}
+
+
+class RoutedReply(NamedTuple):
+    intent: str
+    reply: str
+
+
+def _whole_message(terms: str, fillers: str = _FILLER_TERMS) -> re.Pattern:
+    return re.compile(rf"^(?:{terms})(?:\s+(?:{terms}|{fillers}))*$")
+
+
+class IntentRouter:
+    """
+    Classifica localmente as mensagens que não precisam do RAG (saudações, agradecimentos,
+    despedidas e assuntos fora do escopo) e responde com modelos configuráveis por
+    INTENT_REPLY_<INTENÇÃO>. Regras de palavras-chave e regex vêm primeiro; a similaridade
+    com exemplos (INTENT_EMBEDDING_ENABLED) é opcional. Toda decisão vai para as métricas.
+    """
+
+    def __init__(self, org_name: str, embed: Optional[Callable[[List[str]], list]] = None):
+        self.enabled = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+        self.max_words = int(os.getenv("INTENT_MAX_WORDS", "8"))
+        self.embedding_enabled = (
+            embed is not None and os.getenv("INTENT_EMBEDDING_ENABLED", "false").lower() == "true"
+        )
+        self.embedding_threshold = float(os.getenv("INTENT_EMBEDDING_THRESHOLD", "0.85"))
+        self.embed = embed
+
+        self.templates = {
+            intent: os.getenv(f"INTENT_REPLY_{intent.upper()}", template).format(org_name=org_name)
+            for intent, template in DEFAULT_TEMPLATES.items()
+        }
+
+        org_terms = re.escape(normalize_question(org_name))
+        self.short_message_rules = [
+            (GREETING, _whole_message(_GREETING_TERMS, rf"{_FILLER_TERMS}|{org_terms}")),
+            (
+                THANKS,
+                _whole_message(rf"{_THANKS_WORDS}|{_INTENSIFIER_TERMS}|{_ACKNOWLEDGEMENT_TERMS}"),
+            ),
+            # Confirmação só quando a mensagem inteira é confirmação ("ok", "ta bom entao")
+            (ACKNOWLEDGEMENT, _whole_message(_ACKNOWLEDGEMENT_TERMS)),
+            (
+                GOODBYE,
+                _whole_message(
+                    rf"{_GOODBYE_TERMS}|{_THANKS_WORDS}", rf"{_FILLER_TERMS}|{_INTENSIFIER_TERMS}"
+                ),
+            ),
+        ]
+        self._thanks_word = re.compile(rf"\b(?:{_THANKS_WORDS})\b")
+
+        keywords = [
+            re.escape(normalize_question(keyword))
+            for keyword in os.getenv("INTENT_OUT_OF_SCOPE_KEYWORDS", "").split(",")
+            if keyword.strip()
+        ]
+        patterns = _OUT_OF_SCOPE_PATTERNS + ([rf"\b(?:{'|'.join(keywords)})\b"] if keywords else [])
+        self.out_of_scope = re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+
+        self._example_intents: List[str] = []
+        self._example_matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def _classify_rules(self, normalized: str) -> Optional[str]:
+        if self.out_of_scope.search(normalized):
+            return OUT_OF_SCOPE
+        if len(normalized.split()) > self.max_words:
+            return None
+        for intent, pattern in self.short_message_rules:
+            if pattern.match(normalized):
+                # "ok obrigado" e "muito obrigado" são agradecimentos; "muito" sozinho não
+                if intent == THANKS and not self._thanks_word.search(normalized):
+                    continue
+                return intent
+        return None
+
+    def _examples(self) -> np.ndarray:
+        with self._lock:
+            if self._example_matrix is None:
+                texts = [text for examples in _EXAMPLES.values() for text in examples]
+                self._example_intents = [
+                    intent for intent, examples in _EXAMPLES.items() for _ in examples
+                ]
+                vectors = np.asarray(self.embed(texts), dtype=np.float32)
+                self._example_matrix = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            return self._example_matrix
+
+    def _classify_embedding(self, normalized: str) -> Optional[str]:
+        matrix = self._examples()
+        vector = np.asarray(self.embed([normalized])[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return None
+        scores = matrix @ (vector / norm)
+        best = int(np.argmax(scores))
+        if scores[best] >= self.embedding_threshold:
+            return self._example_intents[best]
+        return None
+
+    def route(self, message: str) -> Optional[RoutedReply]:
+        """Retorna a resposta pronta, ou None quando a mensagem deve seguir para o RAG"""
+        if not self.enabled:
+            return None
+
+        normalized = normalize_question(message)
+        intent, method = self._classify_rules(normalized), "rule"
+        if intent is None and self.embedding_enabled and normalized:
+            try:
+                intent, method = self._classify_embedding(normalized), "embedding"
+            except Exception as e:
+                logger.error(f"Erro na classificação de intenção por similaridade: {e}")
+
+        if intent is None:
+            metrics.increment("intent_routing", {"intent": "rag", "method": "default"})
+            return None
+        metrics.increment("intent_routing", {"intent": intent, "method": method})
+        return RoutedReply(intent, self.templates[intent])
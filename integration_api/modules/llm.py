@@ -1,247 +1,579 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from modules.db import DB
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+import threading
+import time
 import chromadb
 import random
 import os
-from rapidfuzz import fuzz
 from num2words import num2words
-from google.cloud import texttospeech
+from modules.tts import create_tts_engine
+from modules.tts_cache import TTSCache
+from modules.transcription_corrector import TranscriptionCorrector
+from modules.profile_gate import ProfileUpdateGate
+from modules.semantic_cache import (
+    SemanticAnswerCache,
+    create_embedding_function,
+)
+from modules.retrieval import RetrievalSettings, fuse_results
+from modules.prompt_builder import PROVIDER_CACHE_MIN_TOKENS, PromptBuilder
+from modules.services_index import ServicesIndex
+from modules.metrics import metrics
+from modules.sentence_chunker import SentenceChunker
+from modules.history_cache import ConversationHistoryCache
+from modules.conversation_compactor import ConversationCompactor
+from modules.intent_router import IntentRouter
+from modules.model_router import ModelRouter
+from modules.query_batcher import QueryBatcher
+from modules.hedging import LatencyTracker, hedged
+from modules.resilience import RetryPolicy, acall_with_retry, call_with_retry, get_breaker
+from integration_api.services.knowledge_events import subscribe
+
+FALLBACK_REPLY = "Não consegui compreender bem a sua mensagem... Poderia reformulá-la, por favor?"
 
 
 class LLM:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPEN_AI_API_KEY"))
-        self.collection = chromadb.HttpClient(
+        # Novas tentativas ficam com a camada de resiliência (backoff, jitter e circuito), não com o SDK
+        self.client = OpenAI(
+            api_key=os.getenv("OPEN_AI_API_KEY"),
+            timeout=float(os.getenv("OPENAI_TIMEOUT", "60")),
+            max_retries=0,
+        )
+        self.async_client = AsyncOpenAI(api_key=os.getenv("OPEN_AI_API_KEY"), max_retries=0)
+        self.openai_breaker = get_breaker("openai")
+        self.retry_policy = RetryPolicy()
+        self.stage_timeouts = {
+            "prompt": float(os.getenv("LLM_TIMEOUT_PROMPT", "10")),
+            "completion": float(os.getenv("LLM_TIMEOUT_COMPLETION", "20")),
+            "transcription": float(os.getenv("LLM_TIMEOUT_TRANSCRIPTION", "30")),
+        }
+        # Hedge: repete a chamada se a primeira não responder até o p95 observado da etapa
+        self.hedge_enabled = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+        self.hedge_default_delay = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "5"))
+        self.stage_latency = {"completion": LatencyTracker(), "transcription": LatencyTracker()}
+        self.chroma = chromadb.HttpClient(
             host=os.getenv("CHROMADB_HOST"), port=os.getenv("CHROMADB_PORT")
-        ).get_or_create_collection(name=os.getenv("CHROMADB_COLLECTION"))
+        )
+        self.collection = self.chroma.get_or_create_collection(name=os.getenv("CHROMADB_COLLECTION"))
+        # Consultas de conversas simultâneas vão ao Chroma em uma única requisição
+        self.query_batcher = QueryBatcher(lambda: self.collection)
         self.db = DB()
+        # Histórico recente em memória, gravado em lote no banco
+        self.history = ConversationHistoryCache(self.db)
+        self.retrieval_settings = RetrievalSettings()
+        self.prompt_builder = PromptBuilder()
+        self.tts = create_tts_engine(self.client)
+        self.tts_cache = TTSCache()
         # Organização alvo
         self.org_name = os.getenv("ORG_NAME", "PROCON")
+        self.transcription_corrector = TranscriptionCorrector.from_env(self.org_name)
+        # Instruções montadas uma única vez, idênticas em todas as chamadas
+        self.system_instructions = self.__render_instructions__()
+        instructions_tokens = self.prompt_builder.counter.count(self.system_instructions)
+        if instructions_tokens < PROVIDER_CACHE_MIN_TOKENS:
+            print(
+                f"Instruções fixas com {instructions_tokens} tokens: o cache de prefixo do provedor "
+                f"só se aplica quando o histórico da conversa completa {PROVIDER_CACHE_MIN_TOKENS}."
+            )
 
-        # Arquivo de serviços por órgão (permite trocar para PROCON sem alterar código)
+        # Arquivo de serviços por órgão (permite trocar para PROCON sem alterar código).
+        # Só as seções relevantes para a pergunta entram no prompt
         services_file_path = os.getenv("ORG_SERVICES_FILE", os.path.join("utils", "servicos.txt"))
-        with open(services_file_path, "r", encoding="utf-8") as file:
-            self.services_context = file.read()
+        self.services_index = ServicesIndex(self.chroma, services_file_path)
+
+        # Atualização do perfil do usuário: "async" (após a resposta), "parallel" (junto com a resposta)
+        # ou "sync" (a resposta espera o resumo atualizado)
+        self.profile_update_mode = os.getenv("PROFILE_UPDATE_MODE", "async").lower()
+        if self.profile_update_mode not in ("async", "parallel", "sync"):
+            raise ValueError(f"PROFILE_UPDATE_MODE inválido: {self.profile_update_mode}")
+        self.profile_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("PROFILE_UPDATE_WORKERS", "4")),
+            thread_name_prefix="profile-update",
+        )
+        self.profile_gate = ProfileUpdateGate()
+        # Modelo de cada chamada escolhido por sinais locais; resumos vão para o mais barato
+        self.model_router = ModelRouter()
+        self.compactor = ConversationCompactor(
+            self.history,
+            self.prompt_builder.counter,
+            partial(self.__complete__, "compaction"),
+            self.profile_executor,
+            self.org_name,
+            self.model_router.summary_model,
+        )
 
-    def __to_recognize__(self, number, question, attempt=1):
-        client = self.client
+        # Cache semântico de respostas, descartado sempre que a base de documentos muda
+        self.answer_cache = SemanticAnswerCache(create_embedding_function(self.client))
+        subscribe(self.answer_cache.invalidate)
+        # Saudações, agradecimentos e assuntos fora do escopo são respondidos sem chamar o modelo
+        self.intent_router = IntentRouter(self.org_name, self.answer_cache.embed)
+        # Locks por faixa de números, para que dois resumos do mesmo usuário não se sobrescrevam
+        self._profile_locks = [threading.Lock() for _ in range(64)]
+
+    def __complete__(self, task, **kwargs):
+        """Chat completion com novas tentativas, registrando latência e tokens por modelo e tarefa"""
+        start = time.monotonic()
+        chat_completion = call_with_retry(
+            self.openai_breaker,
+            self.client.chat.completions.create,
+            policy=self.retry_policy,
+            **kwargs,
+        )
+        # Em streaming, mede até o início do stream; os tokens chegam no último evento
+        metrics.observe(
+            "llm_latency_seconds",
+            time.monotonic() - start,
+            {"model": kwargs["model"], "task": task},
+        )
+        if not kwargs.get("stream"):
+            self.__record_usage__(chat_completion.usage, kwargs["model"])
+        return chat_completion
 
+    def __to_recognize__(self, number, question):
         foreknowledge = self.db.get_foreknowledge(number)
 
-        if attempt == 4:
+        messages = [
+            {
+                "role": "system",
+                "content": """
+                    Você é um agente especialista em classificação de dados relevantes sobre pessoas. 
+                    Sua missão é, dada uma mensagem, extrair dela ( se for possível e pertinente ), informações relevantes sobre a pessoa.
+                    Sua resposta deve apenas o resumo do perfil da pessoa atualizado.
+                    O resumo deve sempre ser o mais objetivo possível, pois ele deve ser curto ( não exceder, 300 palavras ).
+                    Se não houver dados relevantes, apenas responda com o resumo já construído até o momento.
+                    A resposta não deve conter caracteres como aspas ( de nenhum tipo ) ou parêntes.
+                """,
+            },
+            {
+                "role": "user",
+                "content": f"""
+                    A mensagem de interação com a pessoa é: "{question}"
+                    Abaixo, está o que se sabe até o momento sobre a pessoa. Agregue mais informações, se houver algo relevante para que possa ser criado um pequeno resumo do perfil dessa pessoa:
+                    
+                    {foreknowledge}
+                """,
+            },
+        ]
+
+        try:
+            chat_completion = self.__complete__(
+                "profile", messages=messages, model=self.model_router.summary_model
+            )
+        except Exception as e:
+            print(f"Erro ao resumir o perfil de {number}: {e!r}")
             return foreknowledge
-        if attempt > 1:
-            sleep(2)
-
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": """
-                        Você é um agente especialista em classificação de dados relevantes sobre pessoas. 
-                        Sua missão é, dada uma mensagem, extrair dela ( se for possível e pertinente ), informações relevantes sobre a pessoa.
-                        Sua resposta deve apenas o resumo do perfil da pessoa atualizado.
-                        O resumo deve sempre ser o mais objetivo possível, pois ele deve ser curto ( não exceder, 300 palavras ).
-                        Se não houver dados relevantes, apenas responda com o resumo já construído até o momento.
-                        A resposta não deve conter caracteres como aspas ( de nenhum tipo ) ou parêntes.
-                    """,
-                },
-                {
-                    "role": "user",
-                    "content": f"""
-                        A mensagem de interação com a pessoa é: "{question}"
-                        Abaixo, está o que se sabe até o momento sobre a pessoa. Agregue mais informações, se houver algo relevante para que possa ser criado um pequeno resumo do perfil dessa pessoa:
-                        
-                        {foreknowledge}
-                    """,
-                },
-            ],
-            model="gpt-3.5-turbo",
-        )
 
+        new_summary = chat_completion.choices[0].message.content
+        self.db.update_foreknowledge(number, new_summary)
+        return new_summary
+
+    def __update_profile__(self, number, question):
         try:
-            new_summary = chat_completion.choices[0].message.content
-            self.db.update_foreknowledge(number, new_summary)
-            return new_summary
-        except:
-            return self.__to_recognize__(number, question, attempt + 1)
+            with self._profile_locks[hash(number) % len(self._profile_locks)]:
+                self.__to_recognize__(number, question)
+        except Exception as e:
+            print(f"Erro ao atualizar perfil de {number}: {e}")
+
+    def schedule_profile_update(self, number, question):
+        """Atualiza o resumo do perfil em segundo plano, fora do caminho da resposta"""
+        self.profile_executor.submit(self.__update_profile__, number, question)
+
+    def shutdown(self):
+        self.profile_executor.shutdown(wait=True)
+        self.history.close()
 
     def __rate_question__(self, questions):
-        results = self.collection.query(query_texts=questions, n_results=30)
-        return (
-            " ".join(results["documents"][0])
-            if results["documents"]
-            else "Nenhum resultado encontrado."
+        settings = self.retrieval_settings
+        # ids e distâncias são necessários para a fusão; embeddings e metadados não
+        results = self.query_batcher.query(
+            query_texts=questions,
+            n_results=settings.candidates_per_query,
+            include=["documents", "distances"],
+        )
+        return fuse_results(results, settings)
+
+    def __render_instructions__(self):
+        """Parte fixa do prompt de sistema; fica no início das mensagens para o cache de prefixo"""
+        return f"""
+                Você é um assistente virtual da {self.org_name}, desenvolvido pelo willian, treinado exclusivamente para responder dúvidas sobre os serviços públicos oferecidos pela {self.org_name}.
+
+                Você foi projetado para responder perguntas com base exclusiva no conteúdo dos arquivos do contexto adicional.
+
+                Esses arquivos contêm informações relevantes que foram processadas e armazenadas com o objetivo de fornecer respostas precisas e baseadas em evidências.
+
+                As informações disponíveis incluem:
+                - Dados do perfil do usuário com quem você está interagindo, que devem ser usados para personalizar a resposta, quando relevante.
+                - Contexto adicional, que serve de base para construir suas respostas com mais precisão.
+
+                Restrições obrigatórias:
+                - Use o contexto adicional como base principal para suas respostas.
+                - Se a informação exata não estiver presente, construa uma resposta informativa baseada no que está disponível no contexto.
+                - Analise o contexto para extrair informações relevantes e responda de forma útil.
+                - Se o usuário fizer perguntas completamente fora do escopo do contexto — como piadas, política, receitas, hobbies — responda educadamente que você é especializado em assuntos da {self.org_name}.
+                - Sempre que possível, forneça informações específicas extraídas do contexto.
+
+                Responda de forma cordial, mas firme, com uma frase como:
+                "Olá, eu sou um assistente virtual da {self.org_name} e fui desenvolvido apenas para ajudar com dúvidas sobre os serviços da {self.org_name}."
+
+                Estilo de resposta:
+                - Sempre que for dito um número de telefone, coloque essas tags ao redor do número: <speak><say-as interpret-as='telephone'>8530042840</say-as></speak>
+                - Seja sempre objetivo, acolhedor e respeitoso. **Vá direto ao ponto.**
+                - **Suas respostas devem ser concisas, focando apenas na informação mais importante para o usuário.**
+                - Sempre que possível, utilize o nome ou outros dados relevantes do perfil do usuário, se tiverem sido fornecidos.
+                - Suas respostas devem ser fáceis de entender por pessoas com baixa escolaridade.
+                - Formate suas respostas de forma apropriada para o WhatsApp, com parágrafos curtos e linguagem clara. No máximo 300 caracteres.
+                - **Se uma resposta exigir vários passos ou detalhes, use uma lista simples com marcadores (•) em vez de um parágrafo longo.**
+                - Caso a informação esteja disponível, responda com base no trecho mais relevante e, se possível, mencione a fonte ou nome do arquivo de onde a informação foi extraída.
+"""
+
+    def __render_context_prompt__(self, profile, services, context):
+        return f"""
+                ##### Início do Perfil do usuário #####
+                {profile}
+                ##### Fim do perfil do usuário #####
+
+                ##### Início de informações sobre os serviços oferecidos pela {self.org_name} #####
+                {services}
+                ##### Fim de informações sobre os serviços oferecidos pela {self.org_name} #####
+
+                ##### Início de contexto adicional #####
+                {context}
+                ##### Fim de contexto adicional #####
+"""
+
+    def __record_usage__(self, usage, model):
+        """Registra os tokens do prompt e quantos deles vieram do cache de prefixo do provedor"""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+        labels = {"model": model}
+        metrics.increment("llm_prompt_tokens", labels, usage.prompt_tokens)
+        metrics.increment("llm_cached_prompt_tokens", labels, cached_tokens)
+        metrics.increment("llm_completion_tokens", labels, usage.completion_tokens)
+        print(
+            f"Tokens usados ({model}): prompt={usage.prompt_tokens} (em cache={cached_tokens}), "
+            f"resposta={usage.completion_tokens}"
         )
 
-    def to_transcribe(self, filename):
+    def to_transcribe(self, audio_file, filename="audio_message.ogg"):
         client = self.client
 
-        transcription_text = ""
-        with open(filename, "rb") as file:
-            transcription = client.audio.transcriptions.create(
-                file=(filename, file.read()),
+        def transcribe():
+            # Uma nova tentativa precisa reenviar o arquivo desde o início
+            audio_file.seek(0)
+            return client.audio.transcriptions.create(
+                file=(filename, audio_file),
                 model="whisper-1",
                 language="pt",
             )
-            transcription_text = transcription.text
-        
-        import re
-        def replace_procon(match):
-            word = match.group(0)
-            target = self.org_name
-            if fuzz.ratio(word.lower(), target.lower()) > 65 and word.lower() != target.lower():
-                print(f"Correção aplicada: '{word}' para '{target}'")
-                return target
-            return word
-
-        transcription_text = re.sub(r'\b\w+\b', replace_procon, transcription_text)
+
+        transcription = call_with_retry(self.openai_breaker, transcribe, policy=self.retry_policy)
+        transcription_text = self.transcription_corrector.correct(transcription.text)
         print("Transcrição:", transcription_text)
         return transcription_text
 
-    def generate_audio_via_openai(self, number, text):
-        client = self.client
-
-        target_file = f"{number}_audio_answer.ogg"
-        path_file = os.path.join("media", target_file)
-        with client.audio.speech.with_streaming_response.create(
-            model="tts-1",
-            voice="nova",
-            input=text,
-            response_format="opus",  # onyx; nova; shimmer
-        ) as answer:
-            answer.stream_to_file(path_file)
-
-    def generate_audio(self, number, text):
+    def generate_audio(self, text):
         """
-        Gera áudio usando a API do Google Text-to-Speech com a voz Zephir
+        Gera o áudio da resposta com a engine de TTS configurada, passando pelo cache de áudios
         """
-        #### Configurações da voz Zephir
-        os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+        engine = self.tts
+        return self.tts_cache.get_or_create(
+            text,
+            engine.voice,
+            engine.name,
+            engine.audio_format,
+            lambda: engine.synthesize(text),
+        )
 
-        # ##Inicializa o cliente do Google Text-to-Speech
-        client = texttospeech.TextToSpeechClient()
+    def __build_messages__(
+        self, number, question, update_profile, standalone=False, schedule_profile=True
+    ):
+        """
+        Monta as mensagens com RAG; retorna (mensagens, modelo escolhido para a resposta).
+        Perguntas autônomas (standalone) têm a resposta guardada no cache compartilhado,
+        então o prompt delas não leva perfil nem histórico do usuário.
+        """
+        if standalone:
+            # O perfil não entra no prompt: nem no modo sync a resposta espera a atualização
+            if update_profile and schedule_profile and self.profile_update_mode != "async":
+                self.schedule_profile_update(number, question)
+            profile, conversation_summary, history_messages = None, None, []
+        else:
+            if self.profile_update_mode == "sync" and update_profile:
+                profile = self.__to_recognize__(number, question)
+            else:
+                if self.profile_update_mode == "parallel" and schedule_profile and update_profile:
+                    self.schedule_profile_update(number, question)
+                # Usa o último resumo salvo; o novo fica pronto para as próximas mensagens
+                profile = self.db.get_foreknowledge(number)
 
-        # ##Configura o texto para síntese
-        synthesis_input = texttospeech.SynthesisInput(
-            text=text
-        )
+            # Mensagens antigas de conversas longas chegam resumidas; as recentes vão na íntegra
+            conversation_summary, history_messages = self.history.get_context(number)
 
-        # ##Configura a voz Zephir (pt-BR)
-        voice = texttospeech.VoiceSelectionParams(
-            language_code="pt-BR",
-            name="pt-BR-Chirp3-HD-Zephyr",  # Voz Zephir feminina
-            ssml_gender=texttospeech.SsmlVoiceGender.FEMALE
+        # Consulta também pela última pergunta do usuário, para manter o contexto da conversa
+        previous_question = next(
+            (message for role, message in history_messages if role == "user"), None
         )
-
-        audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.OGG_OPUS,
-            speaking_rate=1  # Velocidade similar à anterior
+        questions = [question, previous_question] if previous_question else [question]
+
+        print(questions)
+        chunks = self.__rate_question__(questions)
+        context_chunks = [chunk.document for chunk in chunks]
+        services_context = "\n\n".join(self.services_index.search(questions))
+        # constroi a ordem de mensagens para a memorizacao, dentro do orçamento de tokens
+        messages, prompt_tokens = self.prompt_builder.build(
+            self.system_instructions,
+            self.__render_context_prompt__,
+            profile,
+            services_context,
+            context_chunks,
+            history_messages[::-1],
+            question,
+            conversation_summary,
         )
+        print(f"Tokens do prompt: {prompt_tokens}")
 
-        # ##Gera a síntese de fala
-        response = client.synthesize_speech(
-            input=synthesis_input,
-            voice=voice,
-            audio_config=audio_config
+        model_choice = self.model_router.choose(
+            self.prompt_builder.counter.count(question),
+            min((chunk.distance for chunk in chunks), default=None),
+            0 if standalone else len(self.history.get_messages(number)),
         )
+        print(f"Modelo: {model_choice.model} ({model_choice.reason})")
+        return messages, model_choice
 
-        target_file = f"{number}_audio_answer.ogg"
-        path_file = os.path.join("media", target_file)
+    def __generate_reply__(
+        self, number, question, update_profile, standalone=False, schedule_profile=True
+    ):
+        """
+        Gera a resposta com RAG; retorna None se a chamada falhar de forma definitiva,
+        as tentativas se esgotarem ou o circuito da OpenAI estiver aberto
+        """
+        try:
+            messages, model_choice = self.__build_messages__(
+                number, question, update_profile, standalone, schedule_profile
+            )
+            chat_completion = self.__complete__(
+                "reply", messages=messages, model=model_choice.model
+            )
+        except Exception as e:
+            print(f"Erro ao gerar resposta: {e!r}")
+            return None
 
-        with open(path_file, "wb") as out:
-            out.write(response.audio_content)
+        return chat_completion.choices[0].message.content
 
-        print(f"Áudio gerado com sucesso: {text}")
-        return path_file
-                
-    def to_respond(self, number, question, attempt=1):
-        if attempt == 4:
-            return "Não consegui compreender bem a sua mensagem... Poderia reformulá-la, por favor?"
+    def __lookup_cached_reply__(self, question):
+        """
+        As respostas do cache semântico são compartilhadas entre usuários: só perguntas
+        autônomas consultam o cache, decidido pela própria pergunta. Um ticket sem resposta
+        indica que a resposta deve ser gerada sem perfil nem histórico e guardada.
+        """
         try:
+            return self.answer_cache.lookup(question)
+        except Exception as e:
+            print(f"Erro ao consultar o cache semântico: {e}")
+            return None, None
 
-            client = self.client
-            services_context = self.services_context
+    def __finish_reply__(self, number, question, reply, cache_ticket, update_profile):
+        """
+        Guarda a resposta no cache semântico (sem ticket, como em um acerto do cache ou em uma
+        pergunta que depende da conversa, não guarda) e no histórico, e agenda a atualização
+        do perfil
+        """
+        self.answer_cache.store(question, reply, cache_ticket)
+
+        self.history.append(number, [("user", question), ("assistant", reply)])
+        self.compactor.maybe_schedule(number)
+
+        if self.profile_update_mode == "async" and update_profile:
+            self.schedule_profile_update(number, question)
+
+    def __route_locally__(self, number, question):
+        """Resposta pronta do roteador de intenções, já salva no histórico, ou None"""
+        routed = self.intent_router.route(question)
+        if routed is None:
+            return None
+        print(f"Mensagem respondida localmente: {routed.intent}")
+        self.__finish_reply__(number, question, routed.reply, None, False)
+        return routed.reply
+
+    def to_respond(self, number, question):
+        local_reply = self.__route_locally__(number, question)
+        if local_reply is not None:
+            return local_reply
+
+        # Só atualiza o perfil quando a mensagem pode trazer informação pessoal nova
+        update_profile = self.profile_gate.should_update(number, question)
+
+        cached_reply, cache_ticket = self.__lookup_cached_reply__(question)
+
+        if cached_reply is not None:
+            truncated_reply = cached_reply
+            cache_ticket = None
+        else:
+            reply_message = self.__generate_reply__(
+                number, question, update_profile, standalone=cache_ticket is not None
+            )
+            if reply_message is None:
+                return FALLBACK_REPLY
 
-            new_summary = self.__to_recognize__(number, question)
+            # Truncate the reply to a maximum of 300 characters as instructed in the system prompt
+            truncated_reply = reply_message[:300]
 
-            history_messages = self.db.get_messages(number)
+        self.__finish_reply__(number, question, truncated_reply, cache_ticket, update_profile)
+        return truncated_reply
 
-            questions = []
-            if history_messages:
-                questions = [question, history_messages[1][1]]
-            else:
-                questions = [question]
-
-            print(questions)
-            context = self.__rate_question__(questions)
-            # constroi a ordem de mensagens para a memorizacao
-            messages = [
-                {
-                    "role": "system",
-                    "content": f"""
-                        Você é um assistente virtual da {self.org_name}, desenvolvido pelo willian, treinado exclusivamente para responder dúvidas sobre os serviços públicos oferecidos pela {self.org_name}.
-
-                        Você foi projetado para responder perguntas com base exclusiva no conteúdo dos arquivos do contexto adicional.
-
-                        Esses arquivos contêm informações relevantes que foram processadas e armazenadas com o objetivo de fornecer respostas precisas e baseadas em evidências.
-
-                        As informações disponíveis incluem:
-                        - Dados do perfil do usuário com quem você está interagindo, que devem ser usados para personalizar a resposta, quando relevante.
-                        - Contexto adicional, que serve de base para construir suas respostas com mais precisão.
-
-                        Restrições obrigatórias:
-                        - Use o contexto adicional como base principal para suas respostas.
-                        - Se a informação exata não estiver presente, construa uma resposta informativa baseada no que está disponível no contexto.
-                        - Analise o contexto para extrair informações relevantes e responda de forma útil.
-                        - Se o usuário fizer perguntas completamente fora do escopo do contexto — como piadas, política, receitas, hobbies — responda educadamente que você é especializado em assuntos da {self.org_name}.
-                        - Sempre que possível, forneça informações específicas extraídas do contexto.
-
-                        Responda de forma cordial, mas firme, com uma frase como:
-                        "Olá, eu sou um assistente virtual da {self.org_name} e fui desenvolvido apenas para ajudar com dúvidas sobre os serviços da {self.org_name}."
-
-                        Estilo de resposta:
-                        - Sempre que for dito um número de telefone, coloque essas tags ao redor do número: <speak><say-as interpret-as='telephone'>8530042840</say-as></speak>
-                        - Seja sempre objetivo, acolhedor e respeitoso. **Vá direto ao ponto.**
-                        - **Suas respostas devem ser concisas, focando apenas na informação mais importante para o usuário.**
-                        - Sempre que possível, utilize o nome ou outros dados relevantes do perfil do usuário, se tiverem sido fornecidos.
-                        - Suas respostas devem ser fáceis de entender por pessoas com baixa escolaridade.
-                        - Formate suas respostas de forma apropriada para o WhatsApp, com parágrafos curtos e linguagem clara. No máximo 300 caracteres.
-                        - **Se uma resposta exigir vários passos ou detalhes, use uma lista simples com marcadores (•) em vez de um parágrafo longo.**
-                        - Caso a informação esteja disponível, responda com base no trecho mais relevante e, se possível, mencione a fonte ou nome do arquivo de onde a informação foi extraída.
-
-                        ##### Início do Perfil do usuário #####
-                        {new_summary}
-                        ##### Fim do perfil do usuário #####
-
-                        ##### Início de informações sobre os serviços oferecidos pela {self.org_name} #####
-                        {services_context}
-                        ##### Fim de informações sobre os serviços oferecidos pela {self.org_name} #####
-
-                        ##### Início de contexto adicional #####
-                        {context}
-                        ##### Fim de contexto adicional #####
-                    """,
-                }
-            ]
-            for role, message in history_messages[::-1]:
-                messages += [{"role": role, "content": message}]
-            messages += [{"role": "user", "content": question}]
-
-            chat_completion = client.chat.completions.create(
-                messages=messages,
-                model="gpt-3.5-turbo",
+    def stream_respond(self, number, question):
+        """
+        Versão em streaming de to_respond: gera os trechos da resposta (cortados em fim de frase)
+        à medida que o modelo os produz, dentro do mesmo limite de 300 caracteres.
+        A resposta completa é salva no histórico quando o stream termina.
+        """
+        local_reply = self.__route_locally__(number, question)
+        if local_reply is not None:
+            yield local_reply
+            return
+
+        update_profile = self.profile_gate.should_update(number, question)
+
+        cached_reply, cache_ticket = self.__lookup_cached_reply__(question)
+        if cached_reply is not None:
+            yield cached_reply
+            self.__finish_reply__(number, question, cached_reply, None, update_profile)
+            return
+        standalone = cache_ticket is not None
+
+        chunker = SentenceChunker(
+            max_chars=300, min_chars=int(os.getenv("STREAMING_MIN_CHUNK_CHARS", "80"))
+        )
+        try:
+            messages, model_choice = self.__build_messages__(
+                number, question, update_profile, standalone
             )
+            with self.__complete__(
+                "reply",
+                messages=messages,
+                model=model_choice.model,
+                stream=True,
+                stream_options={"include_usage": True},
+            ) as stream:
+                for event in stream:
+                    if event.usage is not None:
+                        self.__record_usage__(event.usage, model_choice.model)
+                    if event.choices and event.choices[0].delta.content:
+                        yield from chunker.feed(event.choices[0].delta.content)
+                        # Limite atingido: fecha o stream e deixa de gerar tokens
+                        if chunker.done:
+                            break
+            yield from chunker.finish()
+        except Exception as e:
+            print(f"Erro no streaming da resposta: {e!r}")
+            if not chunker.text:
+                # Nada foi enviado ainda: recorre ao fluxo sem streaming
+                reply_message = self.__generate_reply__(
+                    number, question, update_profile, standalone, schedule_profile=False
+                )
+                if reply_message is None:
+                    yield FALLBACK_REPLY
+                    return
+                chunker = SentenceChunker(max_chars=300, min_chars=chunker.min_chars)
+                yield from chunker.feed(reply_message)
+                yield from chunker.finish()
+
+        if chunker.text:
+            self.__finish_reply__(number, question, chunker.text, cache_ticket, update_profile)
+
+    async def __timed_call__(self, stage, call, model):
+        """Executa uma chamada assíncrona à OpenAI com o tempo limite e o hedge da etapa"""
+        hedge_after = None
+        if self.hedge_enabled:
+            hedge_after = self.stage_latency[stage].p95() or self.hedge_default_delay
+
+        start = time.monotonic()
+        result = await hedged(call, hedge_after, self.stage_timeouts[stage], stage)
+        elapsed = time.monotonic() - start
+        self.stage_latency[stage].record(elapsed)
+        metrics.observe("llm_latency_seconds", elapsed, {"model": model, "task": stage})
+        return result
+
+    async def to_transcribe_async(self, audio_file, filename="audio_message.ogg"):
+        # Lido uma única vez: uma chamada duplicada pelo hedge não pode disputar o mesmo arquivo
+        audio_bytes = audio_file.read()
+        transcription = await acall_with_retry(
+            self.openai_breaker,
+            self.__timed_call__,
+            "transcription",
+            lambda: self.async_client.audio.transcriptions.create(
+                file=(filename, audio_bytes),
+                model="whisper-1",
+                language="pt",
+            ),
+            "whisper-1",
+            policy=self.retry_policy,
+        )
+        transcription_text = self.transcription_corrector.correct(transcription.text)
+        print("Transcrição:", transcription_text)
+        return transcription_text
 
-            reply_message = chat_completion.choices[0].message.content
+    async def __generate_reply_async__(self, number, question, update_profile, standalone=False):
+        """Equivalente assíncrono de __generate_reply__, com tempo limite em cada etapa"""
+        try:
+            # Banco e Chroma continuam síncronos; rodam em thread sem bloquear o event loop
+            messages, model_choice = await asyncio.wait_for(
+                asyncio.to_thread(
+                    self.__build_messages__, number, question, update_profile, standalone
+                ),
+                self.stage_timeouts["prompt"],
+            )
+            chat_completion = await acall_with_retry(
+                self.openai_breaker,
+                self.__timed_call__,
+                "completion",
+                lambda: self.async_client.chat.completions.create(
+                    messages=messages,
+                    model=model_choice.model,
+                ),
+                model_choice.model,
+                policy=self.retry_policy,
+            )
         except Exception as e:
-            print(e)
-            return self.to_respond(number, question, attempt=attempt + 1)
-        
-        self.db.insert_message(number, "user", question)
-        # Truncate the reply to a maximum of 300 characters as instructed in the system prompt
-        truncated_reply = reply_message[:300]
-        self.db.insert_message(number, "assistant", truncated_reply)
+            print(f"Erro ao gerar resposta: {e!r}")
+            return None
+
+        self.__record_usage__(chat_completion.usage, model_choice.model)
+        return chat_completion.choices[0].message.content
+
+    async def to_respond_async(self, number, question):
+        """Versão assíncrona de to_respond, para atender várias conversas em um único event loop"""
+        local_reply = await asyncio.to_thread(self.__route_locally__, number, question)
+        if local_reply is not None:
+            return local_reply
+
+        update_profile = self.profile_gate.should_update(number, question)
 
+        cached_reply, cache_ticket = await asyncio.to_thread(self.__lookup_cached_reply__, question)
+
+        if cached_reply is not None:
+            truncated_reply = cached_reply
+            cache_ticket = None
+        else:
+            reply_message = await self.__generate_reply_async__(
+                number, question, update_profile, standalone=cache_ticket is not None
+            )
+            if reply_message is None:
+                return FALLBACK_REPLY
+
+            truncated_reply = reply_message[:300]
+
+        await asyncio.to_thread(
+            self.__finish_reply__,
+            number,
+            question,
+            truncated_reply,
+            cache_ticket,
+            update_profile,
+        )
         return truncated_reply
@@ -0,0 +1,48 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+
+class Metrics:
+    """Contadores e somatórios em memória do processo, expostos pelo endpoint /metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._observations: Dict[Tuple[str, Tuple], Dict[str, float]] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Optional[dict]) -> Tuple[str, Tuple]:
+        return name, tuple(sorted((labels or {}).items()))
+
+    def increment(self, name: str, labels: Optional[dict] = None, value: float = 1):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Optional[dict] = None):
+        """Registra uma medição (latência, tokens...), guardando contagem, soma, mínimo e máximo"""
+        key = self._key(name, labels)
+        with self._lock:
+            stats = self._observations.get(key)
+            if stats is None:
+                self._observations[key] = {"count": 1, "sum": value, "min": value, "max": value}
+            else:
+                stats["count"] += 1
+                stats["sum"] += value
+                stats["min"] = min(stats["min"], value)
+                stats["max"] = max(stats["max"], value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in self._counters.items()
+            ]
+            observations = [
+                {"name": name, "labels": dict(labels), **stats}
+                for (name, labels), stats in self._observations.items()
+            ]
+        return {"counters": counters, "observations": observations}
+
+
+metrics = Metrics()
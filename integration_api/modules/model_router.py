@@ -0,0 +1,65 @@
+import os
+from typing import NamedTuple, Optional
+
+from modules.metrics import metrics
+
+SMALL = "small"
+DEFAULT = "default"
+LARGE = "large"
+
+
+class ModelChoice(NamedTuple):
+    model: str
+    tier: str
+    reason: str
+
+
+class ModelRouter:
+    """
+    Escolhe o modelo de cada resposta a partir de sinais locais: tamanho da pergunta, distância
+    do trecho mais próximo na busca e profundidade da conversa. O modelo maior só é usado quando
+    a busca é fraca ou a pergunta é complexa; perguntas curtas com contexto forte vão para o menor.
+    Sem nenhum trecho na busca (base vazia ou fora do ar) não há contexto que um modelo maior
+    aproveite, e a resposta vai para o menor. Resumos (perfil e compactação) usam LLM_MODEL_SUMMARY.
+
+    Desativado por padrão (MODEL_ROUTING_ENABLED=false): todas as respostas usam LLM_MODEL_DEFAULT,
+    como antes. Ativado, parte das respostas passa para LLM_MODEL_LARGE (gpt-4o), com custo por
+    token bem maior; acompanhe a métrica model_routing e os tokens por modelo antes de ativar.
+    """
+
+    def __init__(self):
+        self.models = {
+            SMALL: os.getenv("LLM_MODEL_SMALL", "gpt-4o-mini"),
+            DEFAULT: os.getenv("LLM_MODEL_DEFAULT", "gpt-3.5-turbo"),
+            LARGE: os.getenv("LLM_MODEL_LARGE", "gpt-4o"),
+        }
+        self.summary_model = os.getenv("LLM_MODEL_SUMMARY", self.models[SMALL])
+        self.enabled = os.getenv("MODEL_ROUTING_ENABLED", "false").lower() == "true"
+        self.short_question_tokens = int(os.getenv("MODEL_ROUTING_SHORT_QUESTION_TOKENS", "20"))
+        self.long_question_tokens = int(os.getenv("MODEL_ROUTING_LONG_QUESTION_TOKENS", "80"))
+        self.strong_distance = float(os.getenv("MODEL_ROUTING_STRONG_DISTANCE", "0.6"))
+        self.weak_distance = float(os.getenv("MODEL_ROUTING_WEAK_DISTANCE", "1.1"))
+        self.deep_conversation = int(os.getenv("MODEL_ROUTING_DEEP_CONVERSATION", "12"))
+
+    def _classify(
+        self, question_tokens: int, top_distance: Optional[float], depth: int
+    ) -> ModelChoice:
+        if top_distance is None:
+            return ModelChoice(self.models[SMALL], SMALL, "no_retrieval")
+        if top_distance >= self.weak_distance:
+            return ModelChoice(self.models[LARGE], LARGE, "weak_retrieval")
+        if question_tokens >= self.long_question_tokens:
+            return ModelChoice(self.models[LARGE], LARGE, "long_question")
+        if depth >= self.deep_conversation and question_tokens > self.short_question_tokens:
+            return ModelChoice(self.models[LARGE], LARGE, "deep_conversation")
+        if question_tokens <= self.short_question_tokens and top_distance <= self.strong_distance:
+            return ModelChoice(self.models[SMALL], SMALL, "simple_question")
+        return ModelChoice(self.models[DEFAULT], DEFAULT, "default")
+
+    def choose(self, question_tokens: int, top_distance: Optional[float], depth: int) -> ModelChoice:
+        """depth: quantidade de mensagens anteriores da conversa (resumidas ou não)"""
+        if not self.enabled:
+            return ModelChoice(self.models[DEFAULT], DEFAULT, "routing_disabled")
+        choice = self._classify(question_tokens, top_distance, depth)
+        metrics.increment("model_routing", {"tier": choice.tier, "reason": choice.reason})
+        return choice
@@ -0,0 +1,76 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+from modules.metrics import metrics
+
+# Padrões de mensagens que costumam trazer informação pessoal
+PERSONAL_INFO_PATTERNS = {
+    "name": re.compile(
+        r"\b(meu nome|me chamo|pode me chamar|aqui (?:é|e) (?:o|a))\b", re.IGNORECASE
+    ),
+    "cpf": re.compile(r"\b\d{3}\.?\d{3}\.?\d{3}-?\d{2}\b"),
+    # Telefone: com DDD separado ("(62) 3201-2345", "62 999998888") ou, sem DDD, com o
+    # separador típico ("3201-2345", "99999 8888"); sequências maiores de dígitos
+    # (protocolos, cartões, processos) não contam
+    "phone": re.compile(
+        r"(?<![\d.\-/])"
+        r"(?:(?:\+?55\s?)?(?:\(\d{2}\)\s?|\d{2}[\s-])9?\d{4}[-\s]?\d{4}"
+        r"|9?\d{4}-\d{4}"
+        r"|9\d{4}\s\d{4})"
+        r"(?![\d-])"
+    ),
+    "address": re.compile(
+        r"\b(rua|avenida|av\.|travessa|bairro|cep|moro|resido|endere[çc]o)\b|\b\d{5}-?\d{3}\b",
+        re.IGNORECASE,
+    ),
+    "email": re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.]+\b"),
+    "age": re.compile(r"\btenho \d{1,3} anos\b", re.IGNORECASE),
+}
+
+
+class ProfileUpdateGate:
+    """
+    Decide localmente se uma mensagem justifica uma nova chamada ao LLM para atualizar
+    o perfil do usuário, registrando cada decisão nas métricas.
+    """
+
+    def __init__(self):
+        self.min_length = int(os.getenv("PROFILE_GATE_MIN_LENGTH", "15"))
+        self.long_message_length = int(os.getenv("PROFILE_GATE_LONG_MESSAGE", "160"))
+        self.every_n_messages = int(os.getenv("PROFILE_GATE_EVERY_N_MESSAGES", "10"))
+        self.max_tracked = int(os.getenv("PROFILE_GATE_MAX_TRACKED", "50000"))
+        self._since_update: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _classify(self, message: str, since_update: int) -> Tuple[bool, str]:
+        for kind, pattern in PERSONAL_INFO_PATTERNS.items():
+            if pattern.search(message):
+                return True, kind
+
+        if len(message.strip()) < self.min_length:
+            return False, "short"
+        if len(message) >= self.long_message_length:
+            return True, "long_message"
+        if since_update >= self.every_n_messages:
+            return True, "periodic"
+        return False, "no_personal_info"
+
+    def should_update(self, number: str, message: str) -> bool:
+        with self._lock:
+            since_update = self._since_update.pop(number, 0) + 1
+
+            update, reason = self._classify(message, since_update)
+
+            # Reinicia a contagem quando o perfil será atualizado
+            self._since_update[number] = 0 if update else since_update
+            while len(self._since_update) > self.max_tracked:
+                self._since_update.popitem(last=False)
+
+        metrics.increment(
+            "profile_update_decisions",
+            {"decision": "update" if update else "skip", "reason": reason},
+        )
+        return update
@@ -0,0 +1,209 @@
+import logging
+import os
+from typing import Callable, Dict, List, Tuple
+
+from modules.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Tokens extras que a API conta para cada mensagem (papel e delimitadores)
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_PREFIX = "Resumo da conversa anterior com o usuário:\n"
+# O cache de prefixo da OpenAI só vale para prompts com pelo menos 1024 tokens de prefixo comum
+PROVIDER_CACHE_MIN_TOKENS = 1024
+
+
+class TokenCounter:
+    """
+    Conta tokens localmente com o tiktoken. Se o encoding não puder ser carregado
+    (pacote ausente ou sem acesso ao arquivo BPE), usa a estimativa de ~4 caracteres por token.
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        self._encoding = None
+        try:
+            import tiktoken
+
+            self._encoding = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            logger.warning(f"Tokenizador {encoding_name} indisponível, usando estimativa: {e}")
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0 or not text:
+            return ""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            return self._encoding.decode(tokens[:max_tokens])
+        return text[: max_tokens * 4]
+
+
+class PromptBudget:
+    """Orçamento de tokens por seção do prompt, lido do ambiente"""
+
+    def __init__(self):
+        self.total = int(os.getenv("PROMPT_MAX_TOKENS", "6000"))
+        self.profile = int(os.getenv("PROMPT_BUDGET_PROFILE", "400"))
+        self.services = int(os.getenv("PROMPT_BUDGET_SERVICES", "1500"))
+        self.context = int(os.getenv("PROMPT_BUDGET_CONTEXT", "1500"))
+        self.history = int(os.getenv("PROMPT_BUDGET_HISTORY", "1200"))
+        self.summary = int(os.getenv("PROMPT_BUDGET_SUMMARY", "300"))
+        # Seções cortadas primeiro quando o total excede o limite
+        self.trim_order = [
+            section.strip()
+            for section in os.getenv(
+                "PROMPT_TRIM_ORDER", "history,summary,context,services,profile"
+            ).split(",")
+            if section.strip()
+        ]
+
+
+class PromptBuilder:
+    """
+    Monta as mensagens do chat respeitando o orçamento de cada seção. Quando o total ainda
+    excede PROMPT_MAX_TOKENS, corta as seções na ordem de PROMPT_TRIM_ORDER (padrão: histórico
+    mais antigo, contexto menos relevante, serviços e, por último, perfil).
+    Instruções e a pergunta atual nunca são cortadas.
+
+    As mensagens seguem uma ordem estável para aproveitar o cache de prefixo do provedor:
+    instruções fixas, resumo e histórico da conversa e só então o conteúdo que muda a cada pergunta
+    (perfil, serviços e contexto) junto da pergunta atual.
+
+    As instruções sozinhas ficam perto ou abaixo de PROVIDER_CACHE_MIN_TOKENS; o ganho vem
+    principalmente do prefixo de cada conversa (instruções, resumo e histórico), que se repete
+    entre os turnos e passa do limite depois de algumas mensagens. O tamanho desse prefixo vai
+    para as métricas.
+    """
+
+    def __init__(self, counter: TokenCounter = None, budget: PromptBudget = None):
+        self.counter = counter or TokenCounter()
+        self.budget = budget or PromptBudget()
+
+    def _fit_chunks(self, chunks: List[str], max_tokens: int) -> Tuple[List[str], List[int]]:
+        kept, sizes, used = [], [], 0
+        for chunk in chunks:
+            size = self.counter.count(chunk)
+            if used + size > max_tokens:
+                if not kept:
+                    # Mantém ao menos o trecho mais relevante, truncado
+                    chunk = self.counter.truncate(chunk, max_tokens)
+                    kept.append(chunk)
+                    sizes.append(self.counter.count(chunk))
+                break
+            kept.append(chunk)
+            sizes.append(size)
+            used += size
+        return kept, sizes
+
+    def _fit_history(
+        self, history: List[Tuple[str, str]], max_tokens: int
+    ) -> Tuple[List[Tuple[str, str]], List[int]]:
+        """Mantém as mensagens mais recentes; history vem em ordem cronológica"""
+        kept, sizes, used = [], [], 0
+        for role, message in reversed(history):
+            size = self.counter.count(message) + MESSAGE_OVERHEAD_TOKENS
+            if used + size > max_tokens:
+                break
+            kept.append((role, message))
+            sizes.append(size)
+            used += size
+        kept.reverse()
+        sizes.reverse()
+        return kept, sizes
+
+    def build(
+        self,
+        instructions: str,
+        render_context: Callable[[str, str, str], str],
+        profile: str,
+        services: str,
+        context_chunks: List[str],
+        history: List[Tuple[str, str]],
+        question: str,
+        conversation_summary: str = "",
+    ) -> Tuple[List[dict], Dict[str, int]]:
+        """
+        instructions é o prompt de sistema fixo; render_context(perfil, serviços, contexto)
+        devolve a mensagem de sistema variável. conversation_summary resume as mensagens
+        anteriores ao histórico recebido. Retorna as mensagens prontas para a API e a contagem final de tokens por seção.
+        """
+        counter = self.counter
+        budget = self.budget
+
+        profile = counter.truncate(profile, budget.profile)
+        services = counter.truncate(services, budget.services)
+        context_chunks, context_sizes = self._fit_chunks(context_chunks, budget.context)
+        history, history_sizes = self._fit_history(history, budget.history)
+        conversation_summary = counter.truncate(conversation_summary, budget.summary)
+        summary_tokens = (
+            counter.count(SUMMARY_PREFIX + conversation_summary) + MESSAGE_OVERHEAD_TOKENS
+            if conversation_summary
+            else 0
+        )
+
+        sizes = {
+            "instructions": counter.count(instructions)
+            + counter.count(render_context("", "", ""))
+            + 2 * MESSAGE_OVERHEAD_TOKENS,
+            "profile": counter.count(profile),
+            "services": counter.count(services),
+            "context": sum(context_sizes),
+            "history": sum(history_sizes),
+            "summary": summary_tokens,
+            "question": counter.count(question) + MESSAGE_OVERHEAD_TOKENS,
+        }
+
+        def excess():
+            return sum(sizes.values()) - budget.total
+
+        for section in budget.trim_order:
+            if section == "history":
+                while excess() > 0 and history:
+                    history.pop(0)
+                    sizes["history"] -= history_sizes.pop(0)
+            elif section == "context":
+                while excess() > 0 and context_chunks:
+                    context_chunks.pop()
+                    sizes["context"] -= context_sizes.pop()
+            elif section == "summary" and excess() > 0 and conversation_summary:
+                conversation_summary = ""
+                sizes["summary"] = 0
+            elif section == "services" and excess() > 0 and services:
+                services = counter.truncate(services, sizes["services"] - excess())
+                sizes["services"] = counter.count(services)
+            elif section == "profile" and excess() > 0 and profile:
+                profile = counter.truncate(profile, sizes["profile"] - excess())
+                sizes["profile"] = counter.count(profile)
+
+        context = "\n".join(context_chunks) if context_chunks else "Nenhum resultado encontrado."
+        messages = [{"role": "system", "content": instructions}]
+        if conversation_summary:
+            messages += [{"role": "system", "content": SUMMARY_PREFIX + conversation_summary}]
+        for role, message in history:
+            messages += [{"role": role, "content": message}]
+        messages += [
+            {"role": "system", "content": render_context(profile, services, context)},
+            {"role": "user", "content": question},
+        ]
+
+        stable_prefix = (
+            counter.count(instructions) + MESSAGE_OVERHEAD_TOKENS + sizes["summary"] + sizes["history"]
+        )
+        metrics.observe("prompt_stable_prefix_tokens", stable_prefix)
+        metrics.increment(
+            "prompt_prefix_cacheable",
+            {"cacheable": str(stable_prefix >= PROVIDER_CACHE_MIN_TOKENS).lower()},
+        )
+
+        sizes["total"] = sum(sizes.values())
+        for section, tokens in sizes.items():
+            metrics.observe("prompt_tokens", tokens, {"section": section})
+        return messages, sizes
@@ -0,0 +1,94 @@
+import os
+import threading
+from typing import Callable, Dict, List, Tuple
+
+from modules.metrics import metrics
+
+# Campos do QueryResult do Chroma que trazem uma lista por texto consultado
+_PER_QUERY_FIELDS = ("ids", "embeddings", "documents", "uris", "data", "metadatas", "distances")
+
+
+class _Batch:
+    def __init__(self):
+        self.texts: List[str] = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class QueryBatcher:
+    """
+    Junta as consultas de conversas simultâneas em uma única chamada collection.query.
+    Enquanto outro lote está em andamento no Chroma, a primeira consulta de um lote novo espera
+    QUERY_BATCH_WINDOW_MS (ou até QUERY_BATCH_MAX_QUERIES textos) para juntar as que chegarem;
+    sem nada em andamento ela é enviada na hora, sem a espera. Cada chamador recebe apenas os
+    seus resultados. Consultas com n_results ou include diferentes vão em lotes separados.
+    """
+
+    def __init__(self, get_collection: Callable):
+        self.get_collection = get_collection
+        self.enabled = os.getenv("QUERY_BATCH_ENABLED", "true").lower() == "true"
+        self.window_seconds = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5")) / 1000
+        self.max_queries = int(os.getenv("QUERY_BATCH_MAX_QUERIES", "32"))
+        self._open: Dict[Tuple, _Batch] = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _run(self, key: Tuple, batch: _Batch, wait: bool):
+        if wait:
+            batch.full.wait(self.window_seconds)
+        with self._lock:
+            if self._open.get(key) is batch:
+                del self._open[key]
+            self._in_flight += 1
+
+        n_results, include = key
+        metrics.observe("chroma_batch_size", len(batch.texts))
+        try:
+            batch.results = self.get_collection().query(
+                query_texts=batch.texts, n_results=n_results, include=list(include)
+            )
+        except Exception as e:
+            batch.error = e
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            batch.done.set()
+
+    def query(self, query_texts: List[str], n_results: int, include: List[str]) -> dict:
+        """Mesmo contrato de collection.query para os textos informados"""
+        if not self.enabled:
+            return self.get_collection().query(
+                query_texts=query_texts, n_results=n_results, include=include
+            )
+
+        key = (n_results, tuple(include))
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            # Sem outro lote em andamento, esperar só atrasaria a consulta
+            wait = self._in_flight > 0
+            if leader:
+                batch = _Batch()
+                self._open[key] = batch
+            offset = len(batch.texts)
+            batch.texts.extend(query_texts)
+            if len(batch.texts) >= self.max_queries:
+                # Lote cheio: as próximas consultas abrem outro
+                del self._open[key]
+                batch.full.set()
+
+        if leader:
+            self._run(key, batch, wait)
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+
+        end = offset + len(query_texts)
+        return {
+            field: values[offset:end] if field in _PER_QUERY_FIELDS and values is not None else values
+            for field, values in batch.results.items()
+        }
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import httpx
+import openai
+
+from modules.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Respostas HTTP que indicam sobrecarga ou falha temporária do provedor
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Respostas em que o provedor recusou a requisição sem processá-la
+REJECTED_STATUS = {429, 503}
+
+
+class CircuitOpenError(Exception):
+    """O provedor está indisponível; a chamada nem foi tentada"""
+
+
+class RetryableStatusError(Exception):
+    """Resposta HTTP de falha temporária, para clientes que não lançam erro por status"""
+
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+        self.status_code = response.status_code
+
+
+def is_retryable(error: BaseException, idempotent: bool = True) -> bool:
+    """
+    Classifica o erro: falhas de rede, tempo esgotado e respostas 408/409/429/5xx podem ser
+    repetidas; erros de requisição (400, 401, 404...) se repetiriam a cada tentativa.
+    Para chamadas não idempotentes (envio de mensagem), só repete quando a requisição
+    com certeza não foi processada.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    if isinstance(error, (openai.APIStatusError, RetryableStatusError)):
+        status = error.status_code
+        return status in (RETRYABLE_STATUS if idempotent else REJECTED_STATUS)
+    if not idempotent:
+        return False
+    return isinstance(
+        error,
+        (
+            openai.APIConnectionError,  # inclui APITimeoutError
+            httpx.TransportError,
+            asyncio.TimeoutError,
+            TimeoutError,
+            ConnectionError,
+        ),
+    )
+
+
+class RetryPolicy:
+    """Backoff exponencial com jitter completo"""
+
+    def __init__(self, max_attempts: int = None, base_delay: float = None, max_delay: float = None):
+        self.max_attempts = max_attempts or int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+        self.base_delay = (
+            base_delay if base_delay is not None else float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+        )
+        self.max_delay = (
+            max_delay if max_delay is not None else float(os.getenv("RETRY_MAX_DELAY", "8"))
+        )
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Abre após failure_threshold falhas seguidas e passa a recusar chamadas imediatamente.
+    Depois de reset_timeout segundos deixa uma chamada de teste passar (meio aberto):
+    se ela funcionar o circuito fecha, se falhar volta a abrir.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = None, reset_timeout: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or int(
+            os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")
+        )
+        self.reset_timeout = reset_timeout or float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Levanta CircuitOpenError se a chamada não puder ser feita; retorna True se ela é o teste"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return False
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+        metrics.increment("circuit_rejections", {"circuit": self.name})
+        raise CircuitOpenError(f"Circuito {self.name} aberto, chamada recusada")
+
+    def release_probe(self):
+        """A chamada de teste terminou sem resultado (cancelada): outra chamada pode testar"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuito {self.name} fechado.")
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    logger.warning(f"Circuito {self.name} aberto após {self._failures} falha(s).")
+                    metrics.increment("circuit_opened", {"circuit": self.name})
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Um circuito por provedor, compartilhado por todos os clientes do processo"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    Indica se o erro mostra o provedor fora do ar ou sobrecarregado (rede, tempo esgotado,
+    408/409/429/5xx), mesmo quando a chamada não pode ser repetida
+    """
+    if isinstance(error, (openai.APIStatusError, RetryableStatusError)):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return isinstance(
+        error,
+        (
+            openai.APIConnectionError,
+            httpx.TransportError,
+            asyncio.TimeoutError,
+            TimeoutError,
+            ConnectionError,
+        ),
+    )
+
+
+def _after_failure(breaker, policy, error, attempt, idempotent, probe) -> float:
+    """Registra a falha e retorna a espera antes da próxima tentativa; relança se não houver"""
+    if is_provider_failure(error):
+        breaker.record_failure()
+    elif isinstance(error, (openai.APIStatusError, RetryableStatusError)):
+        # O provedor respondeu (erro da requisição): ele está no ar
+        breaker.record_success()
+    elif probe:
+        # Erro local (bug, dado inválido): não diz nada sobre o provedor
+        breaker.release_probe()
+    retryable = is_retryable(error, idempotent)
+    if not retryable or attempt >= policy.max_attempts or breaker.state == "open":
+        raise error
+    metrics.increment("call_retries", {"circuit": breaker.name})
+    delay = policy.delay(attempt)
+    logger.warning(
+        f"Falha temporária em {breaker.name} (tentativa {attempt}): {error!r}. "
+        f"Nova tentativa em {delay:.2f}s."
+    )
+    return delay
+
+
+def call_with_retry(
+    breaker: CircuitBreaker,
+    func: Callable,
+    *args,
+    policy: RetryPolicy = None,
+    idempotent: bool = True,
+    **kwargs,
+):
+    """Executa func com novas tentativas e circuito; para código síncrono (threads)"""
+    policy = policy or RetryPolicy()
+    attempt = 1
+    while True:
+        probe = breaker.allow()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            time.sleep(_after_failure(breaker, policy, e, attempt, idempotent, probe))
+            attempt += 1
+            continue
+        except BaseException:
+            if probe:
+                breaker.release_probe()
+            raise
+        breaker.record_success()
+        return result
+
+
+async def acall_with_retry(
+    breaker: CircuitBreaker,
+    func: Callable,
+    *args,
+    policy: RetryPolicy = None,
+    idempotent: bool = True,
+    **kwargs,
+):
+    """Versão assíncrona de call_with_retry: a espera entre tentativas não ocupa thread"""
+    policy = policy or RetryPolicy()
+    attempt = 1
+    while True:
+        probe = breaker.allow()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            await asyncio.sleep(_after_failure(breaker, policy, e, attempt, idempotent, probe))
+            attempt += 1
+            continue
+        except BaseException:
+            # CancelledError não é Exception: sem isso o teste ficaria preso e o circuito aberto
+            if probe:
+                breaker.release_probe()
+            raise
+        breaker.record_success()
+        return result
@@ -0,0 +1,70 @@
+import os
+import re
+from typing import Dict, List, NamedTuple
+
+
+class RetrievedChunk(NamedTuple):
+    id: str
+    document: str
+    distance: float
+    score: float
+
+
+class RetrievalSettings:
+    """Parâmetros da busca no Chroma, lidos do ambiente"""
+
+    def __init__(self):
+        self.candidates_per_query = int(os.getenv("RETRIEVAL_CANDIDATES_PER_QUERY", "15"))
+        self.top_k = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+        self.max_distance = float(os.getenv("RETRIEVAL_MAX_DISTANCE", "1.4"))
+        self.rrf_k = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+
+
+def _normalize_chunk(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def fuse_results(results: dict, settings: RetrievalSettings) -> List[RetrievedChunk]:
+    """
+    Combina as listas ranqueadas de cada consulta com reciprocal rank fusion,
+    descartando trechos além de max_distance e trechos repetidos (mesmo id ou mesmo texto).
+    """
+    fused: Dict[str, dict] = {}
+
+    ids_per_query = results.get("ids") or []
+    documents_per_query = results.get("documents") or []
+    distances_per_query = results.get("distances") or []
+
+    for ids, documents, distances in zip(ids_per_query, documents_per_query, distances_per_query):
+        for rank, (chunk_id, document, distance) in enumerate(zip(ids, documents, distances)):
+            if distance > settings.max_distance:
+                # Resultados vêm ordenados por distância; os seguintes também estão longe demais
+                break
+
+            entry = fused.get(chunk_id)
+            if entry is None:
+                entry = {"document": document, "distance": distance, "score": 0.0}
+                fused[chunk_id] = entry
+            entry["score"] += 1.0 / (settings.rrf_k + rank + 1)
+            entry["distance"] = min(entry["distance"], distance)
+
+    ranked = sorted(fused.items(), key=lambda item: item[1]["score"], reverse=True)
+
+    chunks: List[RetrievedChunk] = []
+    position_by_text: Dict[str, int] = {}
+    for chunk_id, entry in ranked:
+        normalized = _normalize_chunk(entry["document"])
+        position = position_by_text.get(normalized)
+        if position is not None:
+            # Mesmo texto com outro id: mantém a menor distância, usada na escolha do modelo
+            kept = chunks[position]
+            chunks[position] = kept._replace(distance=min(kept.distance, entry["distance"]))
+            continue
+        if len(chunks) >= settings.top_k:
+            continue
+        position_by_text[normalized] = len(chunks)
+        chunks.append(
+            RetrievedChunk(chunk_id, entry["document"], entry["distance"], entry["score"])
+        )
+
+    return chunks
@@ -0,0 +1,210 @@
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from modules.metrics import metrics
+from modules.resilience import call_with_retry, get_breaker
+
+logger = logging.getLogger(__name__)
+
+# Similaridade mínima padrão de cada provedor de embeddings. O modelo local (MiniLM, treinado
+# em inglês) dá notas altas a perguntas em português que só diferem no serviço pedido
+# ("como tirar o RG" x "como tirar a CNH"), então precisa de um limite bem mais estrito.
+DEFAULT_THRESHOLDS = {"local": 0.97, "openai": 0.90}
+
+# Palavras (já normalizadas) que indicam que a pergunta depende da conversa ("quanto custa isso?")
+# ou do próprio usuário ("minha CNH venceu"); a resposta dessas perguntas não é compartilhada
+CONTEXT_DEPENDENT_WORDS = frozenset(
+    """
+    isso isto esse essa esses essas este esta estes estas aquele aquela aqueles aquelas
+    disso disto desse dessa desses dessas deste desta nisso nisto nesse nessa neste nesta
+    ele ela eles elas dele dela deles delas nele nela la ali aqui tambem mesmo mesma anterior
+    eu me mim comigo meu minha meus minhas nosso nossa nossos nossas
+    """.split()
+)
+# Continuações da mensagem anterior ("e o endereço?", "mas abre sábado?")
+FOLLOW_UP_OPENERS = frozenset({"e", "mas", "entao", "ai"})
+
+
+def normalize_question(question: str) -> str:
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def embedding_provider() -> str:
+    return os.getenv("SEMANTIC_CACHE_EMBEDDING", "local").lower()
+
+
+def create_embedding_function(openai_client) -> Callable[[List[str]], List[List[float]]]:
+    """
+    SEMANTIC_CACHE_EMBEDDING=local usa o modelo ONNX padrão do Chroma (sem custo por chamada);
+    openai usa a API de embeddings.
+    """
+    provider = embedding_provider()
+    if provider == "local":
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+        return DefaultEmbeddingFunction()
+    if provider == "openai":
+        model = os.getenv("SEMANTIC_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+
+        def embed(texts: List[str]):
+            response = call_with_retry(
+                get_breaker("openai"), openai_client.embeddings.create, model=model, input=texts
+            )
+            return [item.embedding for item in response.data]
+
+        return embed
+    raise ValueError(f"Provedor de embeddings desconhecido: {provider}")
+
+
+class CacheTicket(NamedTuple):
+    """Embedding da pergunta e geração do cache no momento da consulta, usados por store()"""
+
+    embedding: np.ndarray
+    generation: int
+
+
+class _Entry:
+    def __init__(self, question: str, answer: str, embedding: np.ndarray, expires_at: float):
+        self.question = question
+        self.answer = answer
+        self.embedding = embedding
+        self.expires_at = expires_at
+
+
+class SemanticAnswerCache:
+    """
+    Cache de pares pergunta/resposta consultado por similaridade de cosseno entre as perguntas
+    normalizadas. Entradas expiram por TTL, são removidas por LRU acima de SEMANTIC_CACHE_MAX_ENTRIES
+    e o cache inteiro é descartado quando a base de documentos muda.
+
+    Cada invalidação avança a geração do cache: uma resposta calculada antes dela (com a base
+    antiga) e guardada depois é descartada em store().
+    """
+
+    def __init__(self, embed: Callable[[List[str]], List[List[float]]], provider: str = None):
+        self.embed = embed
+        self.enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+        provider = provider or embedding_provider()
+        self.threshold = float(
+            os.getenv("SEMANTIC_CACHE_THRESHOLD", str(DEFAULT_THRESHOLDS.get(provider, 0.97)))
+        )
+        self.ttl_seconds = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+        self.max_entries = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+        # Perguntas muito curtas costumam depender do histórico ("o endereço?")
+        self.min_words = int(os.getenv("SEMANTIC_CACHE_MIN_WORDS", "3"))
+
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: List[str] = []
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def is_standalone(self, normalized: str) -> bool:
+        """
+        Pergunta que se entende sozinha, sem histórico nem perfil: só essas usam o cache,
+        e a resposta delas é gerada sem os dados do usuário. Números (protocolos, documentos)
+        também tornam a pergunta pessoal.
+        """
+        words = normalized.split()
+        return (
+            len(words) >= self.min_words
+            and words[0] not in FOLLOW_UP_OPENERS
+            and not CONTEXT_DEPENDENT_WORDS.intersection(words)
+            and not any(char.isdigit() for char in normalized)
+        )
+
+    def _embed(self, normalized: str) -> np.ndarray:
+        vector = np.asarray(self.embed([normalized])[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _rebuild_matrix(self):
+        self._keys = list(self._entries)
+        self._matrix = (
+            np.stack([self._entries[key].embedding for key in self._keys])
+            if self._keys
+            else None
+        )
+
+    def _evict_expired(self, now: float):
+        expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def lookup(self, question: str) -> Tuple[Optional[str], Optional[CacheTicket]]:
+        """
+        Retorna (resposta, ticket); a resposta é None em caso de miss ou pergunta não elegível.
+        O ticket só vem para perguntas autônomas: a resposta gerada sem perfil nem histórico
+        é repassada a store() junto com ele
+        """
+        normalized = normalize_question(question)
+        if not self.enabled or not self.is_standalone(normalized):
+            return None, None
+
+        # A geração é lida antes do embedding e da geração da resposta, que podem ser lentos
+        generation = self._generation
+        embedding = self._embed(normalized)
+        ticket = CacheTicket(embedding, generation)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            if self._matrix is None:
+                self._rebuild_matrix()
+
+            if self._matrix is not None:
+                scores = self._matrix @ embedding
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = self._keys[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    metrics.increment("semantic_cache", {"result": "hit"})
+                    return self._entries[key].answer, ticket
+
+            self.misses += 1
+        metrics.increment("semantic_cache", {"result": "miss"})
+        return None, ticket
+
+    def store(self, question: str, answer: str, ticket: Optional[CacheTicket]):
+        if not self.enabled or ticket is None:
+            return
+
+        normalized = normalize_question(question)
+        with self._lock:
+            if ticket.generation != self._generation:
+                # A base mudou enquanto a resposta era gerada
+                metrics.increment("semantic_cache_stale_stores")
+                return
+            self._entries[normalized] = _Entry(
+                normalized, answer, ticket.embedding, time.monotonic() + self.ttl_seconds
+            )
+            self._entries.move_to_end(normalized)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def invalidate(self, reason: str = ""):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._matrix = None
+        metrics.increment("semantic_cache_invalidations")
+        logger.info(f"Cache semântico de respostas invalidado. {reason}".strip())
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
@@ -0,0 +1,86 @@
+import re
+from typing import List
+
+# Fim de frase seguido de espaço, ou quebra de linha (itens de lista começam em linha nova)
+_BOUNDARY = re.compile(r"(?<=[.!?…:])[ \t]+|\s*\n\s*")
+_LAST_WORD = re.compile(r"(\S+)\.$")
+# Abreviações comuns em endereços e atendimentos: o ponto delas não encerra a frase
+_ABBREVIATIONS = frozenset(
+    "av dr dra sr sra srta prof profa r q qd lt n nº tel cel ex obs aprox apto".split()
+)
+
+
+class SentenceChunker:
+    """
+    Recebe o texto da resposta em pedaços (streaming) e devolve trechos completos, cortados em
+    fim de frase ou de item de lista, para serem enviados assim que ficam prontos.
+    Trechos menores que min_chars são agrupados com os seguintes. O total entregue é o mesmo
+    que resposta[:max_chars] no modo sem streaming.
+    """
+
+    def __init__(self, max_chars: int = 300, min_chars: int = 80):
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+        self._buffer = ""
+        self._delivered = ""
+
+    @property
+    def done(self) -> bool:
+        """Indica que o limite de caracteres foi atingido; o restante do stream pode ser descartado"""
+        return len(self._delivered) >= self.max_chars
+
+    @property
+    def text(self) -> str:
+        """Texto entregue até o momento, como será salvo no histórico"""
+        return self._delivered.strip()
+
+    def _ends_sentence(self, match: "re.Match") -> bool:
+        """Ignora o ponto de abreviações ("Av. Goiás"), iniciais e marcadores de lista ("1. ")"""
+        if "\n" in match.group():
+            return True
+        word = _LAST_WORD.search(self._buffer, 0, match.start())
+        if word is None:
+            return True
+        word = word.group(1).lower()
+        return not (word in _ABBREVIATIONS or word.isdigit() or len(word) == 1)
+
+    def _take(self, end: int) -> str:
+        remaining = self.max_chars - len(self._delivered)
+        raw = self._buffer[: min(end, remaining)]
+        self._buffer = self._buffer[end:]
+        self._delivered += raw
+        return raw.strip()
+
+    def feed(self, delta: str) -> List[str]:
+        if self.done:
+            return []
+        self._buffer += delta
+
+        chunks = []
+        while not self.done:
+            remaining = self.max_chars - len(self._delivered)
+            cut = None
+            for match in _BOUNDARY.finditer(self._buffer):
+                if (
+                    len(self._buffer[: match.start()].strip()) >= self.min_chars
+                    and self._ends_sentence(match)
+                ):
+                    cut = match.end()
+                    break
+                if match.start() >= remaining:
+                    break
+            if cut is None:
+                if len(self._buffer) < remaining:
+                    break
+                # O limite chega antes de um fim de frase: entrega até o limite
+                cut = remaining
+            chunk = self._take(cut)
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def finish(self) -> List[str]:
+        if self.done:
+            return []
+        chunk = self._take(len(self._buffer))
+        return [chunk] if chunk else []
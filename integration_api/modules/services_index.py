@@ -0,0 +1,162 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+_MARKDOWN_HEADING = re.compile(r"^#+\s+\S")
+_HEADING_MAX_CHARS = 80
+
+
+def _is_heading(line: str) -> bool:
+    """
+    Linhas curtas que abrem uma nova seção: "# Título", "TÍTULO EM CAIXA ALTA" ou "Título:".
+    Os dois últimos precisam começar por letra e não ter dígitos, para que telefones,
+    horários ("08:00 - 17:00") e endereços com número não quebrem a seção.
+    """
+    line = line.strip()
+    if _MARKDOWN_HEADING.match(line):
+        return True
+    if not 3 <= len(line) <= _HEADING_MAX_CHARS or not line[0].isalpha():
+        return False
+    if any(char.isdigit() for char in line):
+        return False
+    return line.isupper() or line.endswith(":")
+
+
+def split_sections(text: str, max_chars: int) -> List[str]:
+    """
+    Divide o arquivo de serviços em seções: cada título abre uma seção nova e seções longas
+    são quebradas nos parágrafos para não passarem de max_chars.
+    """
+    sections: List[str] = []
+    current: List[str] = []
+
+    def close():
+        section = "\n\n".join(current).strip()
+        if section:
+            sections.append(section)
+        current.clear()
+
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        first_line = paragraph.split("\n", 1)[0]
+        size = sum(len(part) + 2 for part in current)
+        if current and (_is_heading(first_line) or size + len(paragraph) > max_chars):
+            close()
+        current.append(paragraph)
+    close()
+
+    return [
+        section[start : start + max_chars]
+        for section in sections
+        for start in range(0, len(section), max_chars)
+    ]
+
+
+class ServicesIndex:
+    """
+    Indexa as seções do arquivo de serviços no Chroma, em uma coleção por versão do arquivo
+    (o nome leva o hash do conteúdo). Uma versão nova é montada ao lado da atual e só então
+    passa a ser usada; a anterior continua existindo para buscas e workers que ainda não trocaram.
+    """
+
+    def __init__(self, chroma_client, path: str):
+        self.chroma_client = chroma_client
+        self.path = path
+        self.collection_name = os.getenv(
+            "SERVICES_COLLECTION", f"{os.getenv('CHROMADB_COLLECTION', 'documents')}_servicos"
+        )
+        self.top_k = int(os.getenv("SERVICES_TOP_K", "3"))
+        self.max_distance = float(os.getenv("SERVICES_MAX_DISTANCE", "1.4"))
+        self.section_max_chars = int(os.getenv("SERVICES_SECTION_MAX_CHARS", "1500"))
+
+        # (coleção, seções) trocados juntos, em uma única atribuição
+        self._current = (None, [])
+        self._hash = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._ensure_current()
+
+    def _file_hash(self) -> str:
+        with open(self.path, "rb") as file:
+            return hashlib.sha256(file.read()).hexdigest()
+
+    def _versioned_name(self, file_hash: str) -> str:
+        return f"{self.collection_name}_{file_hash[:12]}"
+
+    def _is_versioned_name(self, name: str) -> bool:
+        return re.fullmatch(rf"{re.escape(self.collection_name)}_[0-9a-f]{{12}}", name) is not None
+
+    def _ensure_current(self):
+        """Reindexa se o arquivo mudou; o stat evita recalcular o hash a cada pergunta"""
+        mtime = os.stat(self.path).st_mtime
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            file_hash = self._file_hash()
+            if file_hash != self._hash:
+                self._load(file_hash)
+            self._mtime = mtime
+
+    def _load(self, file_hash: str):
+        with open(self.path, "r", encoding="utf-8") as file:
+            sections = split_sections(file.read(), self.section_max_chars)
+
+        name = self._versioned_name(file_hash)
+        collection = self.chroma_client.get_or_create_collection(
+            name=name, metadata={"source_hash": file_hash}
+        )
+        if collection.count() != len(sections):
+            logger.info(f"Indexando {len(sections)} seções de {self.path} na coleção {name}.")
+            if sections:
+                # upsert: outro worker pode estar montando a mesma versão ao mesmo tempo
+                collection.upsert(
+                    ids=[f"servicos-{index}" for index in range(len(sections))],
+                    documents=sections,
+                )
+
+        previous_hash = self._hash
+        self._current = (collection, sections)
+        self._hash = file_hash
+        self._drop_old_versions(keep={name, self._versioned_name(previous_hash or file_hash)})
+
+    def _drop_old_versions(self, keep):
+        try:
+            for collection in self.chroma_client.list_collections():
+                # list_collections retorna nomes ou objetos, conforme a versão do cliente
+                name = getattr(collection, "name", collection)
+                # Só remove as versões criadas por este índice, nunca outras com o prefixo
+                if self._is_versioned_name(name) and name not in keep:
+                    self.chroma_client.delete_collection(name=name)
+                    logger.info(f"Coleção antiga de serviços removida: {name}.")
+        except Exception as e:
+            logger.error(f"Erro ao remover coleções antigas de serviços: {e}")
+
+    def search(self, questions: List[str]) -> List[str]:
+        """Retorna as seções mais próximas das perguntas, na ordem em que aparecem no arquivo"""
+        self._ensure_current()
+        # Coleção e seções da mesma versão, mesmo que o índice seja trocado durante a consulta
+        collection, sections = self._current
+        if len(sections) <= self.top_k:
+            return list(sections)
+
+        results = collection.query(
+            query_texts=questions, n_results=self.top_k, include=["distances"]
+        )
+        best = {}
+        for ids, distances in zip(results["ids"], results["distances"]):
+            for section_id, distance in zip(ids, distances):
+                if distance <= self.max_distance:
+                    best[section_id] = min(distance, best.get(section_id, distance))
+
+        chosen = sorted(best, key=best.get)[: self.top_k]
+        indexes = sorted(int(section_id.rsplit("-", 1)[1]) for section_id in chosen)
+        return [sections[index] for index in indexes]
@@ -0,0 +1,117 @@
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+from rapidfuzz import fuzz, process
+
+# Erros de transcrição conhecidos do nome do órgão
+DEFAULT_MISTRANSCRIPTIONS = ["ascom", "poscon", "proton", "cupom", "compom"]
+
+
+def _parse_substitutions(raw: str) -> Dict[str, str]:
+    """Converte 'errado:certo,errado2:certo2' em dicionário"""
+    substitutions = {}
+    for pair in raw.split(","):
+        if ":" in pair:
+            wrong, right = pair.split(":", 1)
+            if wrong.strip() and right.strip():
+                substitutions[wrong.strip()] = right.strip()
+    return substitutions
+
+
+class TranscriptionCorrector:
+    """
+    Corrige transcrições em uma única passada: uma alternação pré-compilada aplica a tabela
+    de substituições exatas e as demais palavras passam por um pré-filtro barato
+    (inicial e tamanho) antes da pontuação fuzzy contra o vocabulário.
+    Palavras com menos de min_length letras não passam pela comparação fuzzy: "pro" (para o)
+    já teria nota 66,7 contra "procon".
+    """
+
+    def __init__(
+        self,
+        substitutions: Dict[str, str],
+        vocabulary: Iterable[str],
+        threshold: float = 65,
+        min_length: int = 4,
+    ):
+        self.substitutions = {wrong.lower(): right for wrong, right in substitutions.items()}
+        self.vocabulary = [term for term in vocabulary if term]
+        self.threshold = threshold
+        self.min_length = min_length
+
+        # Termos indexados pela inicial, em minúsculas, para o pré-filtro
+        self._by_initial: Dict[str, list] = {}
+        for term in self.vocabulary:
+            self._by_initial.setdefault(term[0].lower(), []).append(term)
+        self._vocabulary_lower = {term.lower() for term in self.vocabulary}
+
+        exact = "|".join(
+            re.escape(wrong) for wrong in sorted(self.substitutions, key=len, reverse=True)
+        )
+        word_pattern = r"(?P<word>\w+)"
+        pattern = rf"\b(?:(?P<exact>{exact})|{word_pattern})\b" if exact else rf"\b{word_pattern}\b"
+        self._pattern = re.compile(pattern, flags=re.IGNORECASE)
+        self._match_vocabulary = lru_cache(maxsize=4096)(self._match_vocabulary)
+
+    @classmethod
+    def from_env(cls, org_name: str) -> "TranscriptionCorrector":
+        substitutions = {wrong: org_name for wrong in DEFAULT_MISTRANSCRIPTIONS}
+        substitutions.update(_parse_substitutions(os.getenv("TRANSCRIPTION_SUBSTITUTIONS", "")))
+
+        vocabulary = [org_name] + [
+            term.strip()
+            for term in os.getenv("TRANSCRIPTION_VOCABULARY", "").split(",")
+            if term.strip()
+        ]
+        threshold = float(os.getenv("TRANSCRIPTION_FUZZY_THRESHOLD", "65"))
+        min_length = int(os.getenv("TRANSCRIPTION_FUZZY_MIN_LENGTH", "4"))
+        return cls(substitutions, vocabulary, threshold, min_length)
+
+    def _match_vocabulary(self, word_lower: str) -> Optional[str]:
+        candidates = self._by_initial.get(word_lower[0])
+        if not candidates:
+            return None
+
+        # fuzz.ratio nunca passa de 200 * menor / (soma dos tamanhos)
+        size = len(word_lower)
+        candidates = [
+            term
+            for term in candidates
+            if 200 * min(size, len(term)) / (size + len(term)) > self.threshold
+        ]
+        if not candidates:
+            return None
+
+        best = process.extractOne(
+            word_lower,
+            candidates,
+            scorer=fuzz.ratio,
+            processor=str.lower,
+            score_cutoff=self.threshold,
+        )
+        if best is None or best[1] <= self.threshold:
+            return None
+        return best[0]
+
+    def _replace(self, match) -> str:
+        exact = match.group("exact") if "exact" in self._pattern.groupindex else None
+        if exact:
+            right = self.substitutions[exact.lower()]
+            print(f"Correção aplicada: '{exact}' para '{right}'")
+            return right
+
+        word = match.group("word")
+        word_lower = word.lower()
+        if len(word_lower) < self.min_length or word_lower in self._vocabulary_lower:
+            return word
+
+        target = self._match_vocabulary(word_lower)
+        if target is None:
+            return word
+        print(f"Correção aplicada: '{word}' para '{target}'")
+        return target
+
+    def correct(self, text: str) -> str:
+        return self._pattern.sub(self._replace, text)
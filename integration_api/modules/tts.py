@@ -0,0 +1,107 @@
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+
+from modules.resilience import call_with_retry, get_breaker
+
+logger = logging.getLogger(__name__)
+
+
+class TTSEngine(ABC):
+    """Interface comum dos provedores de síntese de voz"""
+
+    name = ""
+    voice = ""
+    audio_format = ""
+
+    @abstractmethod
+    def synthesize(self, text: str) -> bytes:
+        """Sintetiza o texto e retorna o áudio no formato audio_format"""
+
+    def warm_up(self):
+        """Prepara clientes e conexões antes da primeira síntese"""
+
+
+class GoogleTTSEngine(TTSEngine):
+    """Google Text-to-Speech com a voz Zephir; o cliente gRPC é criado uma vez e compartilhado entre threads"""
+
+    name = "google"
+    voice = "pt-BR-Chirp3-HD-Zephyr"
+    audio_format = "ogg_opus"
+
+    def __init__(self):
+        from google.cloud import texttospeech
+
+        self.texttospeech = texttospeech
+        self._client = None
+        self._lock = threading.Lock()
+
+        # ##Configura a voz Zephir (pt-BR)
+        self.voice_params = texttospeech.VoiceSelectionParams(
+            language_code="pt-BR",
+            name=self.voice,  # Voz Zephir feminina
+            ssml_gender=texttospeech.SsmlVoiceGender.FEMALE,
+        )
+        self.audio_config = texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding.OGG_OPUS,
+            speaking_rate=1,  # Velocidade similar à anterior
+        )
+
+    def _get_client(self):
+        """Cria o cliente apenas quando necessário (canal gRPC e credenciais carregados uma única vez)"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self.texttospeech.TextToSpeechClient()
+                    logger.info("Cliente do Google Text-to-Speech inicializado.")
+        return self._client
+
+    def synthesize(self, text: str) -> bytes:
+        response = self._get_client().synthesize_speech(
+            input=self.texttospeech.SynthesisInput(text=text),
+            voice=self.voice_params,
+            audio_config=self.audio_config,
+        )
+        return response.audio_content
+
+    def warm_up(self):
+        self._get_client()
+
+
+class OpenAITTSEngine(TTSEngine):
+    """OpenAI TTS, reaproveitando o cliente OpenAI do LLM"""
+
+    name = "openai-tts-1"
+    voice = "nova"  # onyx; nova; shimmer
+    audio_format = "opus"
+
+    def __init__(self, client):
+        self.client = client
+
+    def synthesize(self, text: str) -> bytes:
+        answer = call_with_retry(
+            get_breaker("openai"),
+            self.client.audio.speech.create,
+            model="tts-1",
+            voice=self.voice,
+            input=text,
+            response_format=self.audio_format,
+        )
+        return answer.content
+
+
+def create_tts_engine(openai_client) -> TTSEngine:
+    """
+    Escolhe o provedor por TTS_ENGINE (google | openai). Sem TTS_ENGINE, mantém a regra
+    anterior: Google quando GOOGLE_APPLICATION_CREDENTIALS não está definida, OpenAI caso contrário.
+    """
+    engine = os.getenv("TTS_ENGINE", "").lower()
+    if not engine:
+        engine = "openai" if os.getenv("GOOGLE_APPLICATION_CREDENTIALS") else "google"
+
+    if engine == "google":
+        return GoogleTTSEngine()
+    if engine == "openai":
+        return OpenAITTSEngine(openai_client)
+    raise ValueError(f"Engine de TTS desconhecida: {engine}")
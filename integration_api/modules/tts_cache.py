@@ -0,0 +1,204 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_tts_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def tts_cache_key(text: str, voice: str, engine: str, audio_format: str) -> str:
+    raw = "\x1f".join([engine, voice, audio_format, normalize_tts_text(text)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryTTSStore:
+    """LRU em memória limitado pelo total de bytes armazenados"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        audio = self._entries.get(key)
+        if audio is not None:
+            self._entries.move_to_end(key)
+        return audio
+
+    def put(self, key: str, audio: bytes):
+        if len(audio) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._entries[key] = audio
+        self._size += len(audio)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+
+class DiskTTSStore:
+    """Arquivos em um diretório local, removendo os menos usados quando o limite de bytes é excedido"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.audio")
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as audio_file:
+                audio = audio_file.read()
+        except FileNotFoundError:
+            return None
+        # Atualiza o mtime para que a evicção trate o arquivo como usado recentemente
+        os.utime(path)
+        return audio
+
+    def put(self, key: str, audio: bytes):
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as audio_file:
+            audio_file.write(audio)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".audio"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+
+class MinioTTSStore:
+    """
+    Objetos em um bucket próprio do MinIO (TTS_CACHE_BUCKET), com evicção por tamanho total.
+    Fica fora do bucket da base de conhecimento para não aparecer nas listagens dos arquivos.
+    """
+
+    EVICT_EVERY = 50
+
+    def __init__(self, max_bytes: int):
+        from integration_api.repository.minio_repository import MinioRepository
+
+        self.max_bytes = max_bytes
+        self.minio = MinioRepository(bucket=os.getenv("TTS_CACHE_BUCKET", "tts-cache"))
+        self._puts = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.minio.get_bytes(key)
+
+    def put(self, key: str, audio: bytes):
+        self.minio.put_bytes(key, audio)
+        self._puts += 1
+        if self._puts % self.EVICT_EVERY == 0:
+            self._evict()
+
+    def _evict(self):
+        objects = sorted(
+            self.minio.list_objects_info(""), key=lambda obj: obj[2]
+        )
+        total = sum(size for _, size, _ in objects)
+        for name, size, _ in objects:
+            if total <= self.max_bytes:
+                break
+            self.minio.delete_file(name)
+            total -= size
+
+
+class TTSCache:
+    """
+    Cache de áudios sintetizados, endereçado pelo hash do texto normalizado, voz, engine e formato.
+    A camada em memória sempre existe; TTS_CACHE_BACKEND=disk|minio adiciona uma camada persistente.
+    """
+
+    def __init__(self):
+        self.memory = MemoryTTSStore(
+            int(os.getenv("TTS_CACHE_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+        )
+        self.persistent = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        backend = os.getenv("TTS_CACHE_BACKEND", "").lower()
+        persistent_max_bytes = int(
+            os.getenv("TTS_CACHE_PERSISTENT_MAX_BYTES", str(1024 * 1024 * 1024))
+        )
+        if backend == "disk":
+            self.persistent = DiskTTSStore(
+                os.getenv("TTS_CACHE_DIR", os.path.join("media", "tts_cache")),
+                persistent_max_bytes,
+            )
+        elif backend == "minio":
+            self.persistent = MinioTTSStore(persistent_max_bytes)
+        elif backend:
+            raise ValueError(f"Backend de cache de TTS desconhecido: {backend}")
+
+    def get_or_create(
+        self,
+        text: str,
+        voice: str,
+        engine: str,
+        audio_format: str,
+        synthesize: Callable[[], bytes],
+    ) -> bytes:
+        key = tts_cache_key(text, voice, engine, audio_format)
+
+        with self._lock:
+            audio = self.memory.get(key)
+        if audio is not None:
+            self.hits += 1
+            return audio
+
+        if self.persistent is not None:
+            try:
+                audio = self.persistent.get(key)
+            except Exception as e:
+                logger.error(f"Erro ao ler áudio do cache persistente: {e}")
+            if audio is not None:
+                self.hits += 1
+                with self._lock:
+                    self.memory.put(key, audio)
+                return audio
+
+        self.misses += 1
+        audio = synthesize()
+
+        with self._lock:
+            self.memory.put(key, audio)
+        if self.persistent is not None:
+            try:
+                self.persistent.put(key, audio)
+            except Exception as e:
+                logger.error(f"Erro ao gravar áudio no cache persistente: {e}")
+        return audio
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
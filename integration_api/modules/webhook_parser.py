@@ -0,0 +1,121 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+import os
+
+import orjson
+
+MESSAGE_TEXT = "text"
+MESSAGE_AUDIO = "audio"
+MESSAGE_IMAGE = "image"
+MESSAGE_DOCUMENT = "document"
+MESSAGE_VIDEO = "video"
+MESSAGE_UNKNOWN = "unknown"
+
+MESSAGES_UPSERT = "messages.upsert"
+
+UNSUPPORTED_MEDIA = (MESSAGE_IMAGE, MESSAGE_DOCUMENT, MESSAGE_VIDEO)
+
+LOG_PREVIEW_CHARS = int(os.getenv("WEBHOOK_LOG_PREVIEW_CHARS", "120"))
+
+
+class InvalidWebhookError(ValueError):
+    """Corpo do webhook que não é JSON válido"""
+
+
+@dataclass
+class WebhookMessage:
+    instance: str
+    message_id: str
+    number_sender: str
+    kind: str
+    text: Optional[str] = None
+    audio_base64: Optional[str] = None
+
+
+@dataclass
+class WebhookEvent:
+    instance: str
+    event_type: str
+    messages: List[WebhookMessage] = field(default_factory=list)
+    skipped: int = 0
+
+
+def preview(text: Optional[str], limit: int = LOG_PREVIEW_CHARS) -> str:
+    """Versão truncada do texto para logs"""
+    if text is None:
+        return ""
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... (+{len(text) - limit} caracteres)"
+
+
+def _parse_message(instance: str, item) -> Optional[WebhookMessage]:
+    if not isinstance(item, dict) or "message" not in item or "key" not in item:
+        return None
+
+    message_data = item.get("message") or {}
+    key_data = item.get("key") or {}
+    if not isinstance(message_data, dict) or not isinstance(key_data, dict):
+        return None
+    # Eco das mensagens enviadas pelo próprio número do bot
+    if key_data.get("fromMe"):
+        return None
+
+    number_sender = key_data.get("remoteJid", "").replace("@s.whatsapp.net", "")
+    message_id = key_data.get("id", "")
+    message = WebhookMessage(instance, message_id, number_sender, MESSAGE_UNKNOWN)
+
+    # Determina o tipo de mensagem, mantendo apenas os campos usados no processamento
+    if "conversation" in message_data:
+        message.kind = MESSAGE_TEXT
+        message.text = message_data["conversation"]
+    elif "textMessage" in message_data:
+        message.kind = MESSAGE_TEXT
+        message.text = (message_data["textMessage"] or {}).get("text")
+    elif "audioMessage" in message_data:
+        message.kind = MESSAGE_AUDIO
+        message.audio_base64 = message_data.get("base64")
+    elif "imageMessage" in message_data:
+        message.kind = MESSAGE_IMAGE
+    elif "documentMessage" in message_data:
+        message.kind = MESSAGE_DOCUMENT
+    elif "videoMessage" in message_data:
+        message.kind = MESSAGE_VIDEO
+
+    if message.kind == MESSAGE_TEXT and not isinstance(message.text, str):
+        message.kind, message.text = MESSAGE_UNKNOWN, None
+    return message
+
+
+def parse_webhook(body: bytes) -> Optional[WebhookEvent]:
+    """
+    Converte o corpo do webhook da Evolution API em um WebhookEvent.
+    Aceita `data` como lista de mensagens ou como um único dicionário (formato antigo);
+    as mensagens só são extraídas para eventos messages.upsert.
+    Retorna None se o payload não tiver o campo 'instance'; mensagens enviadas pelo próprio bot
+    (fromMe) ou sem key/message são contadas em skipped. Levanta InvalidWebhookError se o corpo
+    não for JSON válido.
+    """
+    try:
+        json_body = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise InvalidWebhookError(f"Corpo do webhook não é JSON válido: {e}") from e
+    if not isinstance(json_body, dict) or "instance" not in json_body:
+        return None
+
+    instance = json_body["instance"]
+    event = WebhookEvent(instance=instance, event_type=json_body.get("event", ""))
+    if event.event_type != MESSAGES_UPSERT:
+        return event
+
+    data = json_body.get("data", [])
+    items = data if isinstance(data, list) else [data]
+
+    for item in items:
+        message = _parse_message(instance, item)
+        if message is None:
+            event.skipped += 1
+        else:
+            event.messages.append(message)
+
+    return event
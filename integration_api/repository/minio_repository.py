@@ -1,13 +1,16 @@
 import os
 from minio import Minio
+from minio.error import S3Error
 from fastapi.responses import StreamingResponse
 import io
 
 
 class MinioRepository:
-    def __init__(self):
+    def __init__(self, bucket: str = None):
+        """bucket: por padrão, o bucket dos arquivos da base de conhecimento (MINIO_BUCKET)"""
         self.client = None
         self.bucket = None
+        self._bucket_name = bucket
         self._initialized = False
 
     def _ensure_initialized(self):
@@ -17,7 +20,7 @@ class MinioRepository:
             minio_access_key = os.getenv("MINIO_ACCESS_KEY")
             minio_secret_key = os.getenv("MINIO_SECRET_KEY")
             minio_secure = os.getenv("MINIO_SECURE", "false").lower() == "true"
-            minio_bucket = os.getenv("MINIO_BUCKET")
+            minio_bucket = self._bucket_name or os.getenv("MINIO_BUCKET")
             
             if not all([minio_endpoint, minio_access_key, minio_secret_key, minio_bucket]):
                 raise ValueError("Variáveis de ambiente MinIO não configuradas corretamente")
@@ -71,3 +74,36 @@ class MinioRepository:
             files.append(obj.object_name)
 
         return {"files": files}
+
+    def put_bytes(self, object_name: str, data: bytes):
+        self._ensure_initialized()
+        self.client.put_object(
+            bucket_name=self.bucket,
+            object_name=object_name,
+            data=io.BytesIO(data),
+            length=len(data),
+            content_type="application/octet-stream",
+        )
+
+    def get_bytes(self, object_name: str):
+        """Retorna o conteúdo do objeto, ou None se ele não existir"""
+        self._ensure_initialized()
+        try:
+            response = self.client.get_object(self.bucket, object_name)
+        except S3Error as error:
+            if error.code == "NoSuchKey":
+                return None
+            raise
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def list_objects_info(self, prefix: str):
+        """Lista (nome, tamanho, última modificação) dos objetos com o prefixo informado"""
+        self._ensure_initialized()
+        return [
+            (obj.object_name, obj.size, obj.last_modified)
+            for obj in self.client.list_objects(self.bucket, prefix=prefix, recursive=True)
+        ]
@@ -3,6 +3,7 @@ from typing import List
 from ..repository.minio_repository import MinioRepository
 from ..repository.postgre_repository import PostgreRepository
 from ..repository.chroma_repository import ChromaRepository
+from .knowledge_events import notify_knowledge_changed
 from zoneinfo import ZoneInfo
 import hashlib
 from fastapi import UploadFile, HTTPException, BackgroundTasks, Response, status
@@ -164,7 +165,7 @@ class FileManagerService:
                         f"Adicionando tarefa em background para indexar {file.filename} (UUID: {generated_uuid_str}) no ChromaDB."
                     )
                     background_tasks.add_task(
-                        self.chroma.index_new_documents,
+                        self.__index_document,
                         UUID(generated_uuid_str),
                         file.filename,
                         file_bytes,
@@ -231,6 +232,7 @@ class FileManagerService:
         )
 
         if updated_file_metadata is not None:
+            notify_knowledge_changed(f"metadados do arquivo {file_id} atualizados")
             return {
                 "id": updated_file_metadata[0],
                 "titulo": updated_file_metadata[1],
@@ -265,6 +267,8 @@ class FileManagerService:
             logger.debug(f"Removendo índice com UUID {file_id} do PostgreSQL.")
             self.postgre.delete_index(file_id)
             logger.info(f"Índice com UUID {file_id} removido do PostgreSQL.")
+
+            notify_knowledge_changed(f"arquivo {file_id} removido")
         else:
             logger.warning(f"Arquivo com UUID {file_id} não encontrado para deleção.")
             raise HTTPException(status_code=404, detail="Arquivo não encontrado")
@@ -306,6 +310,10 @@ class FileManagerService:
             logger.warning(f"Arquivo com UUID {file_id} não encontrado para download.")
             raise HTTPException(status_code=404, detail="Arquivo não encontrado")
 
+    def __index_document(self, file_id: UUID, filename: str, file_bytes: bytes):
+        self.chroma.index_new_documents(file_id, filename, file_bytes)
+        notify_knowledge_changed(f"arquivo {file_id} indexado")
+
     def __document_is_indexed(self, hash_value: str) -> bool:
         logger.debug(
             f"Verificando no PostgreSQL se o hash {hash_value} já está indexado."
@@ -0,0 +1,20 @@
+import logging
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+_listeners: List[Callable[[str], None]] = []
+
+
+def subscribe(listener: Callable[[str], None]):
+    """Registra uma função chamada sempre que a base de documentos muda"""
+    _listeners.append(listener)
+
+
+def notify_knowledge_changed(reason: str):
+    logger.info(f"Base de documentos alterada ({reason}). Notificando {len(_listeners)} ouvinte(s).")
+    for listener in list(_listeners):
+        try:
+            listener(reason)
+        except Exception as e:
+            logger.error(f"Erro ao notificar alteração da base de documentos: {e}", exc_info=True)
@@ -1,21 +1,44 @@
 from dotenv import load_dotenv
 load_dotenv()
 from integration_api.routes import file_manager, users
-from fastapi import FastAPI, Request, Query, BackgroundTasks
+from fastapi import FastAPI, Request, Query
 from fastapi.responses import Response, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 from datetime import datetime
-import requests
-import json
+import asyncio
 import re
 import os
-import base64
 
 from modules.llm_chatgpt import LLM
+from modules.evolution_client import EvolutionClient
+from modules.dispatcher import ConversationDispatcher, DispatcherFullError
+from modules.dedup import MessageDeduplicator
+from modules.coalescer import MessageCoalescer
+from modules.metrics import metrics
+from modules.audio import decode_base64_audio, encode_base64_audio
+from modules.webhook_parser import (
+    MESSAGE_AUDIO,
+    MESSAGE_TEXT,
+    MESSAGES_UPSERT,
+    UNSUPPORTED_MEDIA,
+    InvalidWebhookError,
+    WebhookMessage,
+    parse_webhook,
+    preview,
+)
+from evolution_config import EvolutionConfig
 
 org_name = os.getenv("ORG_NAME", "PROCON")
 app = FastAPI(title=f"Chatbot {org_name} - Evolution API", version="1.0.0")
 llm = LLM()
+evolution = EvolutionClient()
+dispatcher = ConversationDispatcher()
+deduplicator = MessageDeduplicator()
+# Envia a resposta de texto em trechos, à medida que o modelo gera cada frase
+streaming_enabled = os.getenv("LLM_STREAMING", "false").lower() == "true"
+# Usa o cliente assíncrono da OpenAI (tempos limite por etapa e hedge) em vez de uma thread por mensagem
+async_engine_enabled = os.getenv("LLM_ASYNC_ENGINE", "false").lower() == "true"
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,68 +52,54 @@ app.include_router(file_manager.router)
 app.include_router(users.router)
 
 
-def _log_event(message: str):
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"{now} - {message}")
-
-def correct_audio_transcription(text):
-    substitutions = {
+@app.on_event("startup")
+async def warm_up_tts():
+    if os.getenv("TTS_WARM_UP", "false").lower() == "true":
+        await run_in_threadpool(llm.tts.warm_up)
 
-    "ascom": org_name,
-    "poscon": org_name,
-    "proton": org_name,
-    "cupom": org_name,
-    "compom": org_name
-}
 
-    for wrong, right in substitutions.items():
-        text = re.sub(re.escape(wrong), right, text, flags=re.IGNORECASE)
+@app.on_event("shutdown")
+async def shutdown_evolution_client():
+    coalescer.flush_all()
+    await dispatcher.shutdown()
+    await evolution.aclose()
+    await llm.async_client.close()
+    await run_in_threadpool(llm.shutdown)
 
-    return text
 
+def _log_event(message: str):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"{now} - {message}")
 
-def get_transcription(output_file_path):
-    return llm.to_transcribe(output_file_path)
+def get_transcription(audio_base64):
+    with decode_base64_audio(audio_base64) as audio_file:
+        return llm.to_transcribe(audio_file)
+
+async def generate_audio_answer(recipient_phone_number, audio_base64):
+    """Transcreve o áudio recebido, gera a resposta e a sintetiza, retornando o áudio em base64"""
+    if async_engine_enabled:
+        audio_file = await run_in_threadpool(decode_base64_audio, audio_base64)
+        with audio_file:
+            transcription = await llm.to_transcribe_async(audio_file)
+        llm_response = await llm.to_respond_async(recipient_phone_number, transcription)
+    else:
+        transcription = await run_in_threadpool(get_transcription, audio_base64)
+        llm_response = await run_in_threadpool(
+            llm.to_respond, recipient_phone_number, transcription
+        )
 
-def mp3_to_base64(file_path):
-    with open(file_path, "rb") as audio_file:
-        encoded_string = base64.b64encode(audio_file.read()).decode('utf-8')
-    return encoded_string
+    audio_bytes = await run_in_threadpool(llm.generate_audio, llm_response)
+    _log_event(f"Síntese de voz via {llm.tts.name}")
 
-def send_audio_to_whatsapp(recipient_phone_number):
-    evolution_url = os.getenv("EVOLUTION_API_URL")
-    evolution_key = os.getenv("EVOLUTION_API_KEY")
-    instance_name = os.getenv("EVOLUTION_INSTANCE_ID")
+    return encode_base64_audio(audio_bytes)
 
-    if not all([evolution_url, evolution_key, instance_name]):
+async def send_audio_to_whatsapp(recipient_phone_number, audio):
+    if not evolution.is_configured():
         _log_event("Variáveis de ambiente Evolution API ausentes ou inválidas.")
         return {"status": 500, "message": "Erro interno de configuração"}
-    
-    llm_response = llm.to_respond(recipient_phone_number, correct_audio_transcription(get_transcription(f"media/{recipient_phone_number}_audio_message.ogg")))
-
-    if not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
-        audio_path = llm.generate_audio(recipient_phone_number, llm_response)
-        _log_event("Usando síntese de voz local (gTTS)")
-    else:
-        audio_path = llm.generate_audio_via_openai(recipient_phone_number, llm_response) 
-        _log_event("Usando síntese de voz via OpenAI")
-
-    audio = mp3_to_base64(audio_path)
-
-    final_api_url = f"{evolution_url}/message/sendWhatsAppAudio/{instance_name}"
-    payload = {
-        "number": recipient_phone_number,
-        "audio": audio,
-        "encoding": False,  # Exemplo de arquivo de áudio
-    }
-
-    headers = {
-        "Content-Type": "application/json",
-        "apikey": evolution_key
-    }
 
     try:
-        response = requests.post(final_api_url, headers=headers, json=payload)
+        response = await evolution.send_audio(recipient_phone_number, audio)
 
         if response.status_code == 201:
             _log_event(f"Mensagem de audio enviada para: {recipient_phone_number}")
@@ -104,30 +113,14 @@ def send_audio_to_whatsapp(recipient_phone_number):
         _log_event(f"Erro ao enviar mensagem de audio via Evolution API: {str(e)}")
         return {"status": 500, "message": "Erro ao enviar mensagem"}
 
-def send_response_to_whatsapp(recipient_phone_number, text_message_content):
+async def send_response_to_whatsapp(recipient_phone_number, text_message_content):
     """Envia mensagem de texto via Evolution API"""
-    evolution_url = os.getenv("EVOLUTION_API_URL")
-    evolution_key = os.getenv("EVOLUTION_API_KEY")
-    instance_name = os.getenv("EVOLUTION_INSTANCE_ID")
-
-    if not all([evolution_url, evolution_key, instance_name]):
+    if not evolution.is_configured():
         _log_event("Variáveis de ambiente Evolution API ausentes ou inválidas.")
         return {"status": 500, "message": "Erro interno de configuração"}
 
-    final_api_url = f"{evolution_url}/message/sendText/{instance_name}"
-
-    payload = {
-        "number": recipient_phone_number,
-        "text": text_message_content
-    }
-
-    headers = {
-        "Content-Type": "application/json",
-        "apikey": evolution_key
-    }
-
     try:
-        response = requests.post(final_api_url, headers=headers, json=payload)
+        response = await evolution.send_text(recipient_phone_number, text_message_content)
 
         if response.status_code == 201:
             _log_event(f"Mensagem de texto enviada para: {recipient_phone_number}")
@@ -142,24 +135,27 @@ def send_response_to_whatsapp(recipient_phone_number, text_message_content):
         return {"status": 500, "message": "Erro ao enviar mensagem"}
 
 
+def sanitize_question(question):
+    return re.sub(r"(--|\||;|--|#|/\*|\*/|')", "", question)
+
+
 def get_final_response(number, question):
     """Processa pergunta e retorna resposta via LLM"""
-    question_sanitized = re.sub(r"(--|\||;|--|#|/\*|\*/|')", "", question)
-    return llm.to_respond(number, question_sanitized, 1)
+    return llm.to_respond(number, sanitize_question(question))
 
 
-def send_typing_indicator(number_sender, message_type):
-    """Envia indicador de digitando..."""
-    evolution_url = os.getenv("EVOLUTION_API_URL")
-    evolution_key = os.getenv("EVOLUTION_API_KEY")
-    instance_name = os.getenv("EVOLUTION_INSTANCE_ID")
+async def get_final_response_async(number, question):
+    if async_engine_enabled:
+        return await llm.to_respond_async(number, sanitize_question(question))
+    return await run_in_threadpool(get_final_response, number, question)
+
 
-    if not all([evolution_url, evolution_key, instance_name]):
+async def send_typing_indicator(number_sender, message_type):
+    """Envia indicador de digitando..."""
+    if not evolution.is_configured():
         _log_event("Variáveis de ambiente Evolution API ausentes ou inválidas.")
         return {"status": 500, "message": "Erro interno de configuração"}
 
-    url = f"{evolution_url}/chat/sendPresence/{instance_name}"
-
     if message_type == "text":
         delay = 5000
         presence = "composing"
@@ -167,19 +163,8 @@ def send_typing_indicator(number_sender, message_type):
         delay = 1000
         presence = "recording"
 
-    payload = {
-        "number": number_sender,
-        "delay": delay,
-        "presence": presence
-    }
-
-    headers = {
-        "Content-Type": "application/json",
-        "apikey": evolution_key
-    }
-
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        response = await evolution.send_presence(number_sender, presence, delay)
 
         if response.status_code != 201:
             _log_event(
@@ -191,31 +176,14 @@ def send_typing_indicator(number_sender, message_type):
         _log_event(f"Erro na requisição ao enviar indicador de presença: {str(e)}")
 
 
-def mark_message_as_read(number_sender):
+async def mark_message_as_read(number_sender):
     """Marca mensagem como lida"""
-    evolution_url = os.getenv("EVOLUTION_API_URL")
-    evolution_key = os.getenv("EVOLUTION_API_KEY")
-    instance_name = os.getenv("EVOLUTION_INSTANCE_ID")
-
-    if not all([evolution_url, evolution_key, instance_name]):
+    if not evolution.is_configured():
         _log_event("Variáveis de ambiente Evolution API ausentes ou inválidas.")
         return {"status": 500, "message": "Erro interno de configuração"}
 
-    url = f"{evolution_url}/chat/sendPresence/{instance_name}"
-
-    payload = {
-        "number": number_sender,
-        "presence": "available",
-        "delay": 1000
-    }
-
-    headers = {
-        "Content-Type": "application/json",
-        "apikey": evolution_key
-    }
-
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        response = await evolution.send_presence(number_sender, "available", 1000)
 
         if response.status_code != 201:
             _log_event(
@@ -227,44 +195,120 @@ def mark_message_as_read(number_sender):
         _log_event(f"Erro ao enviar presença: {str(e)}")
 
 
-def flow_audio(number_sender):
+async def dispatch_message(instance, message_id, number_sender, flow, *args):
+    """Enfileira o fluxo do remetente; se a fila estiver cheia, libera a mensagem para ser re-entregue"""
+    try:
+        # Entrega antes os textos ainda agrupados, para manter a ordem do remetente
+        coalescer.flush(number_sender)
+        dispatcher.submit(number_sender, flow, number_sender, *args)
+    except DispatcherFullError:
+        await deduplicator.release(instance, message_id)
+        raise
+
+
+async def dispatch_text(instance, message_id, number_sender, message):
+    """Agrupa mensagens de texto em rajada antes de enfileirar uma única conversa"""
+    try:
+        # A vaga na fila é reservada quando a rajada abre: a entrega no fim da janela não
+        # pode mais falhar, e as mensagens seguintes da rajada usam a mesma vaga
+        if not coalescer.is_pending(number_sender):
+            dispatcher.reserve(number_sender)
+    except DispatcherFullError:
+        await deduplicator.release(instance, message_id)
+        raise
+    coalescer.add(number_sender, message)
+
+
+def dispatch_coalesced_text(number_sender, message):
+    dispatcher.submit(number_sender, flow_conversation, number_sender, message, reserved=True)
+
+
+coalescer = MessageCoalescer(dispatch_coalesced_text)
+
+
+# Espera máxima pela confirmação de leitura antes de enviar a resposta; depois disso ela segue
+# em segundo plano e a resposta não fica esperando pela Evolution API
+read_receipt_wait = float(os.getenv("PRESENCE_READ_WAIT_MS", "300")) / 1000
+# Referências às tarefas em segundo plano, para que não sejam coletadas antes de terminar
+_background_tasks = set()
+
+
+def run_in_background(coroutine):
+    task = asyncio.create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+class PresenceUpdates:
+    """
+    Marca a mensagem como lida e envia o indicador de presença, nessa ordem, em segundo plano.
+    As requisições nunca são canceladas (cancelar descarta a conexão do pool): ao parar, só o
+    indicador que ainda não saiu é descartado.
+    """
+
+    def __init__(self, number_sender, message_type):
+        self.stopped = False
+        self.read_task = run_in_background(mark_message_as_read(number_sender))
+        self.typing_task = run_in_background(self._send_typing(number_sender, message_type))
+
+    async def _send_typing(self, number_sender, message_type):
+        await asyncio.wait({self.read_task})
+        if not self.stopped:
+            await send_typing_indicator(number_sender, message_type)
+
+    async def stop(self):
+        """Chamado antes de enviar a resposta; espera a leitura por no máximo read_receipt_wait"""
+        if self.stopped:
+            return
+        self.stopped = True
+        await asyncio.wait({self.read_task}, timeout=read_receipt_wait)
+
+
+async def flow_audio(number_sender, audio_base64):
     """Processa mensagem de audio e envia resposta"""
+    # Presença (lida + gravando...) em paralelo com transcrição, resposta e síntese
+    presence = PresenceUpdates(number_sender, "audio")
     try:
-        # Marca mensagem como lida
-        mark_message_as_read(number_sender)
-        
-        # Envia indicador de "digitando..."
-        send_typing_indicator(number_sender, "audio")
-        
-        # Processa resposta
-        # answer = get_final_response(number_sender, message)
-        
+        audio = await generate_audio_answer(number_sender, audio_base64)
+        await presence.stop()
+
         # Envia resposta
-        send_audio_to_whatsapp(number_sender)
+        await send_audio_to_whatsapp(number_sender, audio)
 
         return {"status": "success"}
     except Exception as e:
+        await presence.stop()
         _log_event(f"Erro ao processar mensagem de audio: {e}")
         return {"status": "error", "message": str(e)}
 
 
-def flow_conversation(number_sender, message):
+async def stream_response_to_whatsapp(number_sender, message, presence):
+    """Envia cada trecho da resposta assim que o modelo termina a frase"""
+    chunks = llm.stream_respond(number_sender, sanitize_question(message))
+    async for chunk in iterate_in_threadpool(chunks):
+        await presence.stop()
+        await send_response_to_whatsapp(number_sender, chunk)
+
+
+async def flow_conversation(number_sender, message):
     """Processa mensagem de texto e envia resposta"""
+    # Presença (lida + digitando...) em paralelo com a geração da resposta
+    presence = PresenceUpdates(number_sender, "text")
     try:
-        # Marca mensagem como lida
-        mark_message_as_read(number_sender)
-        
-        # Envia indicador de "digitando..."
-        send_typing_indicator(number_sender, "text")
-        
-        # Processa resposta
-        answer = get_final_response(number_sender, message)
-        
+        if streaming_enabled:
+            await stream_response_to_whatsapp(number_sender, message, presence)
+            return {"status": "success"}
+
+        answer = await get_final_response_async(number_sender, message)
+        await presence.stop()
+
         # Envia resposta
-        send_response_to_whatsapp(number_sender, answer)
+        await send_response_to_whatsapp(number_sender, answer)
 
         return {"status": "success"}
     except Exception as e:
+        await presence.stop()
         _log_event(f"Erro ao processar mensagem de texto: {e}")
         return {"status": "error", "message": str(e)}
 
@@ -274,21 +318,22 @@ def read_root():
     return {"message": f"Chatbot {org_name} - Evolution API (Texto)", "status": "running"}
 
 
+@app.get("/metrics")
+def get_metrics():
+    """Métricas internas do processo (decisões de roteamento, caches, tokens...)"""
+    return metrics.snapshot()
+
+
 @app.get("/status")
-def check_evolution_status():
+async def check_evolution_status():
     """Verifica o status da instância da Evolution API"""
-    evolution_url = os.getenv("EVOLUTION_API_URL")
-    evolution_key = os.getenv("EVOLUTION_API_KEY")
-    instance_name = os.getenv("EVOLUTION_INSTANCE_ID")
+    instance_name = EvolutionConfig.INSTANCE_ID
 
-    if not all([evolution_url, evolution_key, instance_name]):
+    if not evolution.is_configured():
         return {"status": "error", "message": "Variáveis de ambiente não configuradas"}
 
     try:
-        url = f"{evolution_url}/instance/connectionState/{instance_name}"
-        headers = {"apikey": evolution_key}
-        
-        response = requests.get(url, headers=headers)
+        response = await evolution.connection_state()
         
         if response.status_code == 200:
             return {
@@ -330,158 +375,76 @@ async def verify_webhook(
     return Response(status_code=400)
 
 
+async def handle_webhook_message(message: WebhookMessage):
+    number_sender = message.number_sender
+    _log_event(
+        f"Remetente: {number_sender}, Message ID: {message.message_id}, Tipo: {message.kind}"
+    )
+
+    if await deduplicator.is_duplicate(message.instance, message.message_id):
+        _log_event(f"Mensagem duplicada ignorada: {message.message_id}")
+
+    elif message.kind == MESSAGE_TEXT:
+        _log_event(f"Mensagem de texto recebida: '{preview(message.text)}'")
+        await dispatch_text(message.instance, message.message_id, number_sender, message.text)
+
+    elif message.kind == MESSAGE_AUDIO and message.audio_base64:
+        _log_event(
+            f"Mensagem de áudio recebida de {number_sender} ({len(message.audio_base64)} caracteres em base64)"
+        )
+        # Processa a mensagem de áudio
+        await dispatch_message(
+            message.instance, message.message_id, number_sender, flow_audio, message.audio_base64
+        )
+
+    elif message.kind == MESSAGE_AUDIO or message.kind in UNSUPPORTED_MEDIA:
+        _log_event(f"Mensagem do tipo {message.kind} não suportada de {number_sender}")
+        await send_response_to_whatsapp(
+            number_sender,
+            "Desculpe, no momento só consigo responder mensagens de texto."
+        )
+
+    else:
+        _log_event(f"Tipo de mensagem desconhecido de {number_sender}")
+
+
 @app.post("/webhook")
-async def receive_webhook(request: Request, background_tasks: BackgroundTasks):
-    """Recebe e processa mensagens do WhatsApp (apenas texto)"""
+async def receive_webhook(request: Request):
+    """Recebe e processa mensagens do WhatsApp"""
     try:
         body = await request.body()
-        json_body = json.loads(body)
-        
-        _log_event(f"Webhook recebido: {json_body}")
-        
-        # Evolution API webhook structure
-        if "instance" in json_body:
-            instance = json_body["instance"]
-            event_type = json_body.get("event", "")
-            data = json_body.get("data", [])
-            
-            _log_event(f"Processando webhook para instância: {instance}")
-            _log_event(f"Tipo de evento: {event_type}")
-            
-            # Verifica se é um evento de mensagem
-            if event_type == "messages.upsert":
-                _log_event("Evento de mensagem detectado!")
-                
-                # Processa lista de mensagens
-                if isinstance(data, list) and len(data) > 0:
-                    _log_event(f"Processando lista com {len(data)} itens")
-                    
-                    for i, item in enumerate(data):
-                        _log_event(f"Processando item {i}: {item}")
-                        
-                        if isinstance(item, dict) and "message" in item and "key" in item:
-                            message_data = item.get("message", {})
-                            key_data = item.get("key", {})
-                            
-                            # Extrai informações da mensagem
-                            number_sender = key_data.get("remoteJid", "").replace("@s.whatsapp.net", "")
-
-                            message_id = key_data.get("id", "")
-                            
-                            _log_event(f"Remetente: {number_sender}, Message ID: {message_id}")
-                            
-                            # Determina o tipo de mensagem
-                            if "conversation" in message_data:
-                                message = message_data["conversation"]
-                                _log_event(f"Mensagem de conversa recebida: '{message}'")
-                                
-                                # Processa a mensagem de conversa
-                                background_tasks.add_task(
-                                    flow_conversation, number_sender, message
-                                )
-                                
-                            elif "textMessage" in message_data:
-                                message = message_data["textMessage"]["text"]
-                                _log_event(f"Mensagem de texto recebida: '{message}'")
-                                
-                                # Processa a mensagem de texto
-                                background_tasks.add_task(
-                                    flow_conversation, number_sender, message
-                                )
-                                
-                            elif "imageMessage" in message_data:
-                                _log_event(f"Mensagem de imagem recebida de {number_sender}")
-                                send_response_to_whatsapp(
-                                    number_sender, 
-                                    "Desculpe, no momento só consigo responder mensagens de texto."
-                                )
-                                
-                            elif "documentMessage" in message_data:
-                                _log_event(f"Mensagem de documento recebida de {number_sender}")
-                                send_response_to_whatsapp(
-                                    number_sender, 
-                                    "Desculpe, no momento só consigo responder mensagens de texto."
-                                )
-                                
-                            elif "videoMessage" in message_data:
-                                _log_event(f"Mensagem de vídeo recebida de {number_sender}")
-                                send_response_to_whatsapp(
-                                    number_sender, 
-                                    "Desculpe, no momento só consigo responder mensagens de texto."
-                                )
-                                
-                            elif "audioMessage" in message_data:
-                                _log_event(f"Mensagem de áudio recebida de {number_sender}")
-                                send_response_to_whatsapp(
-                                    number_sender, 
-                                    "Desculpe, no momento só consigo responder mensagens de texto."
-                                )
-                                
-                            else:
-                                _log_event(f"Tipo de mensagem desconhecido de {number_sender}")
-                                
-                elif isinstance(data, dict):
-                    _log_event("Processando data como dicionário (formato antigo)")
-                    
-                    # Verificar se é uma mensagem válida
-                    if "message" in data and "key" in data:
-                        message_data = data.get("message", {})
-                        key_data = data.get("key", {})
-                        
-                        # Extrai informações da mensagem
-                        number_sender = key_data.get("remoteJid", "").replace("@s.whatsapp.net", "")
-                        message_id = key_data.get("id", "")
-                        
-                        _log_event(f"Remetente: {number_sender}, Message ID: {message_id}")
-                        
-                        # Determina o tipo de mensagem
-                        if "conversation" in message_data:
-                            message = message_data["conversation"]
-                            _log_event(f"Mensagem de conversa recebida: '{message}'")
-                            
-                            # Processa a mensagem de conversa
-                            background_tasks.add_task(
-                                flow_conversation, number_sender, message
-                            )
-                            
-                        elif "textMessage" in message_data:
-                            message = message_data["textMessage"]["text"]
-                            _log_event(f"Mensagem de texto recebida: '{message}'")
-                            
-                            # Processa a mensagem de texto
-                            background_tasks.add_task(
-                                flow_conversation, number_sender, message
-                            )
-                        
-                        elif "audioMessage" in message_data:
-                            base64_audio = message_data["base64"]
-                            audio_bytes = base64.b64decode(base64_audio)
-                            output_file_path = f"media/{number_sender}_audio_message.ogg"
-                            with open(output_file_path, "wb") as audio_file:
-                                audio_file.write(audio_bytes)
-                            _log_event(f"Mensagem de áudio recebida de {number_sender}")
-                            # Processa a mensagem de áudio
-                            background_tasks.add_task(
-                                flow_audio, number_sender
-                            )
-
-                        else:
-                            _log_event(f"Tipo de mensagem não suportado de {number_sender}")
-                    else:
-                        _log_event(f"Data não contém mensagem válida: {data}")
-                else:
-                    _log_event(f"Data não é lista nem dicionário: {type(data)}")
-            else:
-                _log_event(f"Evento não é de mensagem: {event_type}")
-        else:
+        event = parse_webhook(body)
+
+        if event is None:
             _log_event("Webhook não contém campo 'instance'")
+        elif event.event_type != MESSAGES_UPSERT:
+            _log_event(f"Evento não é de mensagem: {event.event_type} (instância: {event.instance})")
+        else:
+            _log_event(
+                f"Webhook recebido: instância={event.instance}, evento={event.event_type}, "
+                f"mensagens={len(event.messages)}, ignoradas={event.skipped}, bytes={len(body)}"
+            )
+            for message in event.messages:
+                await handle_webhook_message(message)
 
         return JSONResponse(content={"status": "ok"}, status_code=200)
 
+    except InvalidWebhookError as e:
+        # Uma nova entrega do mesmo corpo falharia igual: não pede para reenviar
+        _log_event(str(e))
+        return JSONResponse(content={"detail": "Payload inválido"}, status_code=400)
+
+    except DispatcherFullError as e:
+        _log_event(f"Webhook adiado, fila de processamento cheia: {e}")
+        return JSONResponse(
+            content={"detail": "Servidor ocupado, tente novamente"},
+            status_code=503,
+            headers={"Retry-After": "5"},
+        )
     except Exception as e:
         _log_event(f"Erro ao processar webhook: {e}")
         import traceback
         _log_event(f"Traceback completo: {traceback.format_exc()}")
         return JSONResponse(
             content={"detail": "Erro interno no servidor"}, status_code=500
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Os módulos são importados como `modules.<nome>`, a partir de integration_api/ (como no main.py)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "integration_api"))
@@ -0,0 +1,81 @@
+import asyncio
+
+from modules.coalescer import MessageCoalescer
+
+
+def test_merges_messages_within_the_window():
+    async def scenario():
+        flushed = []
+        coalescer = MessageCoalescer(
+            lambda key, text: flushed.append((key, text)), window_seconds=0.05, max_wait_seconds=1
+        )
+        coalescer.add("5511", "oi")
+        await asyncio.sleep(0.01)
+        coalescer.add("5511", "quero renovar meu RG")
+        coalescer.add("5522", "bom dia")
+        assert coalescer.is_pending("5511")
+        await asyncio.sleep(0.1)
+        return flushed, coalescer.is_pending("5511")
+
+    flushed, pending = asyncio.run(scenario())
+    assert sorted(flushed) == [("5511", "oi\nquero renovar meu RG"), ("5522", "bom dia")]
+    assert not pending
+
+
+def test_max_wait_bounds_a_continuous_burst():
+    async def scenario():
+        flushed = []
+        coalescer = MessageCoalescer(
+            lambda key, text: flushed.append(text), window_seconds=0.05, max_wait_seconds=0.08
+        )
+        for message in ("a", "b", "c", "d"):
+            coalescer.add("5511", message)
+            await asyncio.sleep(0.03)
+        await asyncio.sleep(0.1)
+        return flushed
+
+    flushed = asyncio.run(scenario())
+    assert len(flushed) == 2
+    assert "\n".join(flushed) == "a\nb\nc\nd"
+
+
+def test_flush_delivers_immediately_and_once():
+    async def scenario():
+        flushed = []
+        coalescer = MessageCoalescer(
+            lambda key, text: flushed.append(text), window_seconds=0.05, max_wait_seconds=1
+        )
+        coalescer.add("5511", "a")
+        coalescer.add("5511", "b")
+        coalescer.flush("5511")
+        coalescer.flush("5511")
+        await asyncio.sleep(0.1)
+        return flushed
+
+    assert asyncio.run(scenario()) == ["a\nb"]
+
+
+def test_disabled_by_default_delivers_each_message():
+    async def scenario():
+        flushed = []
+        coalescer = MessageCoalescer(lambda key, text: flushed.append(text))
+        coalescer.add("5511", "a")
+        coalescer.add("5511", "b")
+        return flushed, coalescer.is_pending("5511")
+
+    flushed, pending = asyncio.run(scenario())
+    assert flushed == ["a", "b"]
+    assert not pending
+
+
+def test_flush_error_does_not_keep_the_burst():
+    async def scenario():
+        def on_flush(key, text):
+            raise RuntimeError("falha")
+
+        coalescer = MessageCoalescer(on_flush, window_seconds=0.05, max_wait_seconds=1)
+        coalescer.add("5511", "a")
+        coalescer.flush_all()
+        return coalescer.is_pending("5511")
+
+    assert asyncio.run(scenario()) is False
@@ -0,0 +1,168 @@
+from types import SimpleNamespace
+
+import pytest
+
+from modules.conversation_compactor import ConversationCompactor
+
+
+class WordCounter:
+    def count(self, text):
+        return len(text.split())
+
+
+class FakeHistory:
+    """Todos os números começam com as mesmas mensagens; as propriedades olham o 5511"""
+
+    def __init__(self, turns, summary=""):
+        self.initial = (list(turns), summary)
+        self.conversations = {}
+        self.summaries_enabled = True
+
+    def _conversation(self, number):
+        if number not in self.conversations:
+            turns, summary = self.initial
+            self.conversations[number] = {"turns": list(turns), "summary": summary, "folded": 0}
+        return self.conversations[number]
+
+    @property
+    def turns(self):
+        return self._conversation("5511")["turns"]
+
+    @property
+    def summary(self):
+        return self._conversation("5511")["summary"]
+
+    @property
+    def folded(self):
+        return self._conversation("5511")["folded"]
+
+    def unfolded_turns(self, number):
+        conversation = self._conversation(number)
+        return conversation["summary"], conversation["turns"][conversation["folded"] :]
+
+    def mark_folded(self, number, last_turn, summary):
+        conversation = self._conversation(number)
+        conversation["folded"] = conversation["turns"].index(last_turn) + 1
+        conversation["summary"] = summary
+
+
+class SyncExecutor:
+    def submit(self, func, *args):
+        func(*args)
+
+
+class DeferredExecutor:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, func, *args):
+        self.submitted.append((func, args))
+
+    def run_all(self):
+        submitted, self.submitted = self.submitted, []
+        for func, args in submitted:
+            func(*args)
+
+
+class FakeComplete:
+    def __init__(self, reply="Resumo novo"):
+        self.reply = reply
+        self.calls = []
+
+    def __call__(self, messages, model, max_tokens):
+        self.calls.append(messages)
+        message = SimpleNamespace(content=self.reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def turns(count, words=10):
+    return [
+        ("user" if index % 2 == 0 else "assistant", f"m{index} " + "palavra " * (words - 1), index)
+        for index in range(count)
+    ]
+
+
+@pytest.fixture
+def make_compactor(monkeypatch):
+    def make(history, complete, executor=None, trigger="50", keep="4"):
+        monkeypatch.setenv("COMPACTION_TRIGGER_TOKENS", trigger)
+        monkeypatch.setenv("COMPACTION_KEEP_TURNS", keep)
+        return ConversationCompactor(
+            history, WordCounter(), complete, executor or SyncExecutor(), "PROCON", "mini"
+        )
+
+    return make
+
+
+def test_below_the_trigger_nothing_is_scheduled(make_compactor):
+    # 8 mensagens de 10 palavras, mantendo 4: só 40 tokens candidatos
+    history = FakeHistory(turns(8))
+    complete = FakeComplete()
+
+    make_compactor(history, complete).maybe_schedule("5511")
+
+    assert complete.calls == []
+    assert history.folded == 0
+
+
+def test_compaction_keeps_the_last_keep_turns(make_compactor):
+    history = FakeHistory(turns(10), summary="Resumo antigo")
+    complete = FakeComplete()
+
+    make_compactor(history, complete).maybe_schedule("5511")
+
+    (messages,) = complete.calls
+    prompt = messages[1]["content"]
+    assert "Resumo antigo" in prompt
+    assert "m5 " in prompt and "m6 " not in prompt
+    assert history.folded == 6
+    assert history.summary == "Resumo novo"
+    assert [turn[2] for turn in history.unfolded_turns("5511")[1]] == [6, 7, 8, 9]
+
+
+def test_a_running_compaction_is_not_scheduled_twice(make_compactor):
+    history = FakeHistory(turns(10))
+    complete = FakeComplete()
+    executor = DeferredExecutor()
+    compactor = make_compactor(history, complete, executor)
+
+    compactor.maybe_schedule("5511")
+    compactor.maybe_schedule("5511")
+    compactor.maybe_schedule("5522")
+    assert len(executor.submitted) == 2
+
+    executor.run_all()
+    assert len(complete.calls) == 2
+
+    # Terminada a compactação, a conversa pode ser agendada de novo
+    history.turns.extend(turns(6, words=20))
+    compactor.maybe_schedule("5511")
+    assert len(executor.submitted) == 1
+
+
+def test_failed_completion_releases_the_number(make_compactor):
+    history = FakeHistory(turns(10))
+    executor = DeferredExecutor()
+
+    def fail(**kwargs):
+        raise ConnectionError("OpenAI fora do ar")
+
+    compactor = make_compactor(history, fail, executor)
+    compactor.maybe_schedule("5511")
+    executor.run_all()
+
+    assert history.folded == 0
+    compactor.maybe_schedule("5511")
+    assert len(executor.submitted) == 1
+
+
+def test_disabled_without_summary_storage(make_compactor):
+    history = FakeHistory(turns(10))
+    history.summaries_enabled = False
+    complete = FakeComplete()
+
+    compactor = make_compactor(history, complete)
+    compactor.maybe_schedule("5511")
+
+    assert not compactor.enabled
+    assert complete.calls == []
@@ -0,0 +1,64 @@
+import asyncio
+from unittest import mock
+
+from modules.dedup import InMemoryDedupBackend, MessageDeduplicator
+
+
+def test_second_delivery_is_duplicate():
+    deduplicator = MessageDeduplicator(backend="memory", ttl_seconds=60, max_size=100)
+
+    async def scenario():
+        return [
+            await deduplicator.is_duplicate("inst", "MSG1"),
+            await deduplicator.is_duplicate("inst", "MSG1"),
+            await deduplicator.is_duplicate("outra", "MSG1"),
+        ]
+
+    assert asyncio.run(scenario()) == [False, True, False]
+
+
+def test_release_allows_redelivery():
+    deduplicator = MessageDeduplicator(backend="memory", ttl_seconds=60, max_size=100)
+
+    async def scenario():
+        await deduplicator.is_duplicate("inst", "MSG1")
+        await deduplicator.release("inst", "MSG1")
+        return await deduplicator.is_duplicate("inst", "MSG1")
+
+    assert asyncio.run(scenario()) is False
+
+
+def test_messages_without_id_are_never_duplicates():
+    deduplicator = MessageDeduplicator(backend="memory", ttl_seconds=60, max_size=100)
+
+    async def scenario():
+        return [await deduplicator.is_duplicate("inst", "") for _ in range(2)]
+
+    assert asyncio.run(scenario()) == [False, False]
+
+
+def test_in_memory_backend_expires_and_bounds_entries():
+    backend = InMemoryDedupBackend(ttl_seconds=10, max_size=2)
+    with mock.patch("modules.dedup.time.monotonic", return_value=100.0):
+        assert backend.mark("a")
+        assert backend.mark("b")
+        assert backend.mark("c")  # "a" sai por tamanho
+        assert backend.mark("a")
+        assert not backend.mark("c")
+    with mock.patch("modules.dedup.time.monotonic", return_value=111.0):
+        assert backend.mark("c")  # expirada
+
+
+def test_shared_backend_failure_keeps_the_message():
+    deduplicator = MessageDeduplicator(backend="memory", ttl_seconds=60, max_size=100)
+    deduplicator.shared = mock.Mock()
+    deduplicator.shared.mark.side_effect = RuntimeError("banco fora do ar")
+    deduplicator.shared.release.side_effect = RuntimeError("banco fora do ar")
+
+    async def scenario():
+        duplicate = await deduplicator.is_duplicate("inst", "MSG1")
+        await deduplicator.release("inst", "MSG1")
+        return duplicate
+
+    assert asyncio.run(scenario()) is False
+    deduplicator.shared.release.assert_called_once_with("inst:MSG1")
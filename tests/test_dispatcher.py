@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from modules.dispatcher import ConversationDispatcher, DispatcherFullError
+
+
+def test_preserves_order_per_sender():
+    async def scenario():
+        dispatcher = ConversationDispatcher(max_workers=4, max_pending=10, max_per_sender=10)
+        handled = []
+
+        async def handle(number, message):
+            await asyncio.sleep(0.01 if message == "a" else 0)
+            handled.append((number, message))
+
+        for message in ("a", "b", "c"):
+            dispatcher.submit("5511", handle, "5511", message)
+        await dispatcher.shutdown()
+        return handled, dispatcher.stats()
+
+    handled, stats = asyncio.run(scenario())
+    assert handled == [("5511", "a"), ("5511", "b"), ("5511", "c")]
+    assert stats["pending"] == 0
+    assert stats["active_senders"] == 0
+
+
+def test_rejects_when_sender_queue_is_full():
+    async def scenario():
+        dispatcher = ConversationDispatcher(max_workers=1, max_pending=10, max_per_sender=2)
+        release = asyncio.Event()
+
+        async def handle(number):
+            await release.wait()
+
+        dispatcher.submit("5511", handle, "5511")
+        dispatcher.submit("5511", handle, "5511")
+        await asyncio.sleep(0)  # o worker retira a primeira mensagem da fila
+        dispatcher.submit("5511", handle, "5511")
+        with pytest.raises(DispatcherFullError):
+            dispatcher.submit("5511", handle, "5511")
+        # Outro remetente ainda tem espaço
+        dispatcher.submit("5522", handle, "5522")
+        release.set()
+        await dispatcher.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_rejects_when_global_limit_is_reached():
+    async def scenario():
+        dispatcher = ConversationDispatcher(max_workers=1, max_pending=2, max_per_sender=10)
+        release = asyncio.Event()
+
+        async def handle(number):
+            await release.wait()
+
+        dispatcher.submit("5511", handle, "5511")
+        dispatcher.submit("5522", handle, "5522")
+        with pytest.raises(DispatcherFullError):
+            dispatcher.check_capacity("5533")
+        release.set()
+        await dispatcher.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_failed_message_does_not_stop_the_queue():
+    async def scenario():
+        dispatcher = ConversationDispatcher(max_workers=1, max_pending=10, max_per_sender=10)
+        handled = []
+
+        async def handle(message):
+            if message == "boom":
+                raise RuntimeError(message)
+            handled.append(message)
+
+        dispatcher.submit("5511", handle, "boom")
+        dispatcher.submit("5511", handle, "ok")
+        await dispatcher.shutdown()
+        return handled
+
+    assert asyncio.run(scenario()) == ["ok"]
+
+
+def test_reserved_slot_guarantees_a_later_submit():
+    async def scenario():
+        dispatcher = ConversationDispatcher(max_workers=1, max_pending=1, max_per_sender=10)
+        handled = []
+
+        async def handle(message):
+            handled.append(message)
+
+        dispatcher.reserve("5511")
+        # A vaga reservada conta no limite: ninguém mais entra
+        with pytest.raises(DispatcherFullError):
+            dispatcher.submit("5522", handle, "outro")
+        with pytest.raises(DispatcherFullError):
+            dispatcher.reserve("5511")
+        dispatcher.submit("5511", handle, "agrupada", reserved=True)
+        await dispatcher.shutdown()
+        return handled, dispatcher.stats()
+
+    handled, stats = asyncio.run(scenario())
+    assert handled == ["agrupada"]
+    assert stats["pending"] == 0
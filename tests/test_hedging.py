@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from modules.hedging import LatencyTracker, hedged
+from modules.metrics import Metrics
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    recorded = Metrics()
+    monkeypatch.setattr("modules.hedging.metrics", recorded)
+    return recorded
+
+
+def counter(recorded, name):
+    return sum(c["value"] for c in recorded.snapshot()["counters"] if c["name"] == name)
+
+
+class FakeCall:
+    """Cada chamada segue o próximo roteiro (espera, resultado ou exceção) e registra o desfecho"""
+
+    def __init__(self, *scripts):
+        self.scripts = list(scripts)
+        self.started = 0
+        self.cancelled = []
+
+    async def __call__(self):
+        attempt = self.started
+        delay, outcome = self.scripts[attempt]
+        self.started += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(attempt)
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def test_p95_needs_min_samples():
+    tracker = LatencyTracker(window=200, min_samples=20)
+    for seconds in range(19):
+        tracker.record(seconds)
+    assert tracker.p95() is None
+
+    tracker.record(19)
+    assert tracker.p95() == 18
+
+
+def test_p95_uses_only_the_recent_window():
+    tracker = LatencyTracker(window=100, min_samples=1)
+    for seconds in range(1, 101):
+        tracker.record(seconds / 100)
+    assert tracker.p95() == pytest.approx(0.95)
+
+    for _ in range(100):
+        tracker.record(0.01)
+    assert tracker.p95() == pytest.approx(0.01)
+
+
+def test_fast_first_attempt_is_not_hedged(recorded):
+    call = FakeCall((0.0, "primeira"), (0.0, "cópia"))
+
+    assert asyncio.run(hedged(call, 0.2, 1.0, "completion")) == "primeira"
+    assert call.started == 1
+    assert counter(recorded, "llm_hedged_requests") == 0
+
+
+def test_hedge_fires_after_the_delay_and_cancels_the_loser(recorded):
+    call = FakeCall((0.5, "primeira"), (0.01, "cópia"))
+
+    async def scenario():
+        result = await hedged(call, 0.05, 1.0, "completion")
+        # O cancelamento da tentativa perdedora é processado no próximo ciclo do loop
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(scenario()) == "cópia"
+    assert call.started == 2
+    assert call.cancelled == [0]
+    assert counter(recorded, "llm_hedged_requests") == 1
+    assert counter(recorded, "llm_hedge_wins") == 1
+
+
+def test_first_error_does_not_preempt_a_pending_success(recorded):
+    call = FakeCall((0.1, RuntimeError("falhou")), (0.1, "cópia"))
+
+    assert asyncio.run(hedged(call, 0.05, 1.0, "completion")) == "cópia"
+
+
+def test_all_attempts_failing_raise_the_first_error(recorded):
+    call = FakeCall((0.06, RuntimeError("primeira")), (0.0, RuntimeError("cópia")))
+
+    with pytest.raises(RuntimeError, match="primeira"):
+        asyncio.run(hedged(call, 0.05, 1.0, "completion"))
+
+
+def test_timeout_cancels_every_attempt(recorded):
+    call = FakeCall((1.0, "primeira"), (1.0, "cópia"))
+
+    async def scenario():
+        try:
+            await hedged(call, 0.02, 0.1, "completion")
+        finally:
+            await asyncio.sleep(0)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(scenario())
+    assert sorted(call.cancelled) == [0, 1]
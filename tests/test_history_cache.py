@@ -0,0 +1,129 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from modules.history_cache import ConversationHistoryCache
+
+
+class FakeDB:
+    def __init__(self, clock_offset=timedelta(0), rows=None):
+        self.clock_offset = clock_offset
+        self.rows = rows or {}
+        self.inserted = []
+        self.fail_inserts = False
+        self.fail_alter = False
+        self.summaries = {}
+        self.lock = threading.Lock()
+
+    def create_conversation_summary_columns(self):
+        if self.fail_alter:
+            raise PermissionError("sem permissão para ALTER TABLE")
+
+    def get_local_timestamp(self):
+        return datetime.now() + self.clock_offset
+
+    def get_recent_messages(self, number, limit, with_summary=True):
+        rows = self.rows.get(number, [])[:limit]
+        if not with_summary:
+            return [(role, message, at, False, "") for role, message, at, _, _ in rows]
+        return rows
+
+    def insert_messages(self, rows):
+        if self.fail_inserts:
+            raise ConnectionError("banco fora do ar")
+        with self.lock:
+            self.inserted.extend(rows)
+
+    def update_conversation_summary(self, number, summary, summary_until):
+        self.summaries[number] = (summary, summary_until)
+
+
+@pytest.fixture
+def make_cache(monkeypatch):
+    caches = []
+
+    def make(db, **env):
+        monkeypatch.setenv("HISTORY_FLUSH_INTERVAL", "60")
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        cache = ConversationHistoryCache(db)
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        cache.close(timeout=1)
+
+
+def test_rows_of_one_append_get_increasing_timestamps(make_cache):
+    db = FakeDB()
+    cache = make_cache(db)
+    cache.append("5511", [("user", "oi"), ("assistant", "olá")])
+    cache.flush()
+
+    (_, _, _, user_at), (_, _, _, assistant_at) = db.inserted
+    assert user_at < assistant_at
+
+
+def test_timestamps_follow_the_database_clock(make_cache):
+    db = FakeDB(clock_offset=timedelta(hours=3))
+    cache = make_cache(db)
+    cache.append("5511", [("user", "oi")])
+    cache.flush()
+
+    created_at = db.inserted[0][3]
+    assert abs(created_at - (datetime.now() + timedelta(hours=3))) < timedelta(seconds=5)
+
+
+def test_history_is_served_from_memory_with_pending_writes(make_cache):
+    loaded_at = datetime(2026, 1, 1)
+    db = FakeDB(rows={"5511": [("assistant", "antiga", loaded_at, False, "")]})
+    cache = make_cache(db)
+    cache.append("5511", [("user", "nova")])
+
+    assert cache.get_messages("5511") == [("user", "nova"), ("assistant", "antiga")]
+
+
+def test_failed_flush_keeps_rows_for_the_next_attempt(make_cache):
+    db = FakeDB()
+    cache = make_cache(db)
+    cache.append("5511", [("user", "oi")])
+
+    db.fail_inserts = True
+    with pytest.raises(ConnectionError):
+        cache.flush()
+    db.fail_inserts = False
+    cache.flush()
+    assert [row[2] for row in db.inserted] == ["oi"]
+
+
+def test_close_flushes_pending_rows(make_cache):
+    db = FakeDB()
+    cache = make_cache(db)
+    cache.append("5511", [("user", "oi"), ("assistant", "olá")])
+    cache.close(timeout=1)
+    assert len(db.inserted) == 2
+
+
+def test_folded_turns_leave_the_context(make_cache):
+    db = FakeDB()
+    cache = make_cache(db)
+    cache.append("5511", [("user", "primeira"), ("assistant", "resposta")])
+    cache.append("5511", [("user", "segunda")])
+    # Carrega a conversa no cache, como no primeiro acesso
+    summary, turns = cache.unfolded_turns("5511")
+    cache.mark_folded("5511", turns[1], "resumo")
+
+    assert cache.get_context("5511") == ("resumo", [("user", "segunda")])
+    assert db.summaries["5511"] == ("resumo", turns[1][2])
+
+
+def test_failed_summary_ddl_degrades_to_no_summaries(make_cache):
+    start = datetime(2024, 1, 1, 12, 0)
+    db = FakeDB(rows={"5511": [("user", "oi", start, True, "Resumo antigo")]})
+    db.fail_alter = True
+    cache = make_cache(db)
+
+    assert not cache.summaries_enabled
+    assert cache.get_context("5511") == ("", [("user", "oi")])
@@ -0,0 +1,41 @@
+import pytest
+
+from modules.intent_router import (
+    ACKNOWLEDGEMENT,
+    GOODBYE,
+    GREETING,
+    OUT_OF_SCOPE,
+    THANKS,
+    IntentRouter,
+)
+
+
+@pytest.fixture(scope="module")
+def router():
+    return IntentRouter("PROCON")
+
+
+@pytest.mark.parametrize(
+    "message, intent",
+    [
+        ("Oi, bom dia!", GREETING),
+        ("olá PROCON", GREETING),
+        ("Muito obrigado!", THANKS),
+        ("ok, obrigada", THANKS),
+        ("ok", ACKNOWLEDGEMENT),
+        ("tá bom então", ACKNOWLEDGEMENT),
+        ("tchau, obrigado mt", GOODBYE),
+        ("me conta uma piada", OUT_OF_SCOPE),
+    ],
+)
+def test_local_intents(router, message, intent):
+    routed = router.route(message)
+    assert routed is not None and routed.intent == intent
+
+
+@pytest.mark.parametrize(
+    "message",
+    ["muito caro?", "muito", "mt", "ok muito", "tá caro", "muito bom", "oi, quero renovar meu RG"],
+)
+def test_questions_and_partial_matches_go_to_the_model(router, message):
+    assert router.route(message) is None
@@ -0,0 +1,34 @@
+import pytest
+
+from modules.model_router import DEFAULT, LARGE, SMALL, ModelRouter
+
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setenv("MODEL_ROUTING_ENABLED", "true")
+    return ModelRouter()
+
+
+def test_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("MODEL_ROUTING_ENABLED", raising=False)
+    choice = ModelRouter().choose(200, None, 30)
+    assert (choice.tier, choice.reason) == (DEFAULT, "routing_disabled")
+
+
+def test_empty_retrieval_goes_to_the_small_model(router):
+    choice = router.choose(200, None, 30)
+    assert (choice.tier, choice.reason) == (SMALL, "no_retrieval")
+
+
+@pytest.mark.parametrize(
+    "question_tokens, top_distance, depth, tier",
+    [
+        (10, 1.2, 0, LARGE),  # busca fraca
+        (100, 0.3, 0, LARGE),  # pergunta longa
+        (40, 0.8, 20, LARGE),  # conversa longa
+        (10, 0.4, 0, SMALL),  # pergunta curta com contexto forte
+        (40, 0.8, 2, DEFAULT),
+    ],
+)
+def test_tiers(router, question_tokens, top_distance, depth, tier):
+    assert router.choose(question_tokens, top_distance, depth).tier == tier
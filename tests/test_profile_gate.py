@@ -0,0 +1,49 @@
+import pytest
+
+from modules.profile_gate import PERSONAL_INFO_PATTERNS, ProfileUpdateGate
+
+PHONE = PERSONAL_INFO_PATTERNS["phone"]
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "meu telefone é (62) 99999-8888",
+        "liga no 62 99999-8888",
+        "62-3201-2345",
+        "whats +55 62 999998888",
+        "(62)32012345",
+        "fixo 3201-2345",
+        "celular 99999 8888",
+        "99999-8888.",
+    ],
+)
+def test_phone_numbers_are_detected(message):
+    assert PHONE.search(message)
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "protocolo 123456789",
+        "protocolo 12345678",
+        "o código é 999998888",
+        "CPF 123.456.789-01",
+        "cartão 1234 5678 9012 3456",
+        "processo 0001234-56.2024.8.09.0051",
+        "atendimento das 08:00 - 17:00",
+        "nos anos 2023 2024",
+        "valor de R$ 1.234,56",
+        "número 12345-67890",
+    ],
+)
+def test_other_numbers_are_not_phones(message):
+    assert not PHONE.search(message)
+
+
+def test_gate_updates_on_phone_and_skips_plain_numbers(monkeypatch):
+    monkeypatch.setenv("PROFILE_GATE_EVERY_N_MESSAGES", "100")
+    gate = ProfileUpdateGate()
+
+    assert gate.should_update("5562", "meu número novo é (62) 99999-8888")
+    assert not gate.should_update("5562", "qual o andamento do protocolo 123456789?")
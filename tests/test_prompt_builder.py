@@ -0,0 +1,58 @@
+from modules.metrics import Metrics
+from modules.prompt_builder import PromptBudget, PromptBuilder
+
+
+class CharCounter:
+    """Um token por palavra, para os testes não dependerem do tiktoken"""
+
+    def count(self, text):
+        return len(text.split())
+
+    def truncate(self, text, max_tokens):
+        return " ".join(text.split()[: max(max_tokens, 0)])
+
+
+def render_context(profile, services, context):
+    return f"perfil: {profile} serviços: {services} contexto: {context}"
+
+
+def build(history, question, budget=None):
+    builder = PromptBuilder(CharCounter(), budget or PromptBudget())
+    return builder.build(
+        "instruções fixas", render_context, "Ana", "RG", ["trecho"], history, question, "resumo"
+    )
+
+
+def test_variable_content_follows_the_conversation_prefix():
+    history = [("user", "oi"), ("assistant", "olá")]
+    first, _ = build(history, "como tirar o RG")
+    second, _ = build(history + [("user", "como tirar o RG"), ("assistant", "no posto")], "e a CNH")
+
+    assert first[0] == {"role": "system", "content": "instruções fixas"}
+    assert first[-1] == {"role": "user", "content": "como tirar o RG"}
+    # O prefixo do turno anterior (tudo antes do contexto variável) se repete no turno seguinte
+    assert second[: len(first) - 2] == first[:-2]
+
+
+def test_oldest_history_is_trimmed_first(monkeypatch):
+    monkeypatch.setenv("PROMPT_MAX_TOKENS", "40")
+    history = [("user", "mensagem antiga " * 5), ("user", "recente")]
+    messages, sizes = build(history, "pergunta")
+
+    contents = [message["content"] for message in messages]
+    assert "recente" in contents
+    assert not any(content.startswith("mensagem antiga") for content in contents)
+    assert sizes["total"] <= 40
+
+
+def test_stable_prefix_size_is_recorded(monkeypatch):
+    recorded = Metrics()
+    monkeypatch.setattr("modules.prompt_builder.metrics", recorded)
+    build([("user", "oi")], "pergunta")
+
+    snapshot = recorded.snapshot()
+    (prefix,) = [o for o in snapshot["observations"] if o["name"] == "prompt_stable_prefix_tokens"]
+    # instruções (2) + resumo + histórico, com os tokens extras de cada mensagem
+    assert prefix["sum"] > 2
+    (cacheable,) = [c for c in snapshot["counters"] if c["name"] == "prompt_prefix_cacheable"]
+    assert cacheable["labels"] == {"cacheable": "false"}
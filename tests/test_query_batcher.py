@@ -0,0 +1,144 @@
+import threading
+import time
+
+from modules.query_batcher import QueryBatcher
+
+
+class FakeCollection:
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def query(self, query_texts, n_results, include):
+        with self.lock:
+            self.calls.append(list(query_texts))
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {
+            "ids": [[f"{text}-{rank}" for rank in range(n_results)] for text in query_texts],
+            "distances": [[float(rank) for rank in range(n_results)] for text in query_texts],
+            "documents": None,
+            "included": include,
+        }
+
+
+def make_batcher(collection, monkeypatch, window_ms="50", max_queries="32"):
+    monkeypatch.setenv("QUERY_BATCH_WINDOW_MS", window_ms)
+    monkeypatch.setenv("QUERY_BATCH_MAX_QUERIES", max_queries)
+    return QueryBatcher(lambda: collection)
+
+
+def run_concurrently(batcher, queries, n_results=2, include=("distances",)):
+    results, errors = {}, {}
+
+    def worker(texts):
+        try:
+            results[tuple(texts)] = batcher.query(texts, n_results, list(include))
+        except Exception as e:
+            errors[tuple(texts)] = e
+
+    threads = [threading.Thread(target=worker, args=(texts,)) for texts in queries]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_single_query_is_sent_without_waiting(monkeypatch):
+    collection = FakeCollection()
+    batcher = make_batcher(collection, monkeypatch, window_ms="500")
+
+    start = time.monotonic()
+    result = batcher.query(["rg"], 2, ["distances"])
+    assert time.monotonic() - start < 0.2
+    assert result["ids"] == [["rg-0", "rg-1"]]
+
+
+def test_concurrent_queries_share_a_batch_and_get_their_own_slice(monkeypatch):
+    # A primeira consulta ocupa o Chroma; as seguintes se juntam em um único lote
+    collection = FakeCollection(delay=0.05)
+    batcher = make_batcher(collection, monkeypatch)
+    first = threading.Thread(target=batcher.query, args=(["inicial"], 2, ["distances"]))
+    first.start()
+    time.sleep(0.01)
+
+    queries = [["rg", "cnh"], ["cpf"], ["passaporte"]]
+    results, errors = run_concurrently(batcher, queries)
+    first.join()
+
+    assert not errors
+    assert len(collection.calls) == 2
+    assert sorted(collection.calls[1]) == ["cnh", "cpf", "passaporte", "rg"]
+    assert results[("rg", "cnh")]["ids"] == [["rg-0", "rg-1"], ["cnh-0", "cnh-1"]]
+    assert results[("cpf",)]["distances"] == [[0.0, 1.0]]
+    # Campos que não são por texto seguem inalterados
+    assert results[("cpf",)]["documents"] is None
+    assert results[("cpf",)]["included"] == ["distances"]
+
+
+def test_error_is_raised_to_every_caller_in_the_batch(monkeypatch):
+    collection = FakeCollection(delay=0.05, error=RuntimeError("chroma fora do ar"))
+    batcher = make_batcher(collection, monkeypatch)
+    first = threading.Thread(target=run_concurrently, args=(batcher, [["a"]]), kwargs={"include": ()})
+    first.start()
+    time.sleep(0.01)
+
+    _, errors = run_concurrently(batcher, [["b"], ["c"]], include=())
+    first.join()
+
+    assert len(collection.calls) == 2
+    assert set(errors) == {("b",), ("c",)}
+    assert all(isinstance(error, RuntimeError) for error in errors.values())
+
+
+def test_different_parameters_go_in_separate_batches(monkeypatch):
+    collection = FakeCollection(delay=0.05)
+    batcher = make_batcher(collection, monkeypatch)
+    first = threading.Thread(target=batcher.query, args=(["inicial"], 2, ["distances"]))
+    first.start()
+    time.sleep(0.01)
+
+    results = {}
+
+    def query(texts, n_results):
+        results[texts[0]] = batcher.query(texts, n_results, ["distances"])
+
+    threads = [
+        threading.Thread(target=query, args=(["rg"], 1)),
+        threading.Thread(target=query, args=(["cpf"], 3)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    first.join()
+
+    assert len(collection.calls) == 3
+    assert results["rg"]["ids"] == [["rg-0"]]
+    assert results["cpf"]["ids"] == [["cpf-0", "cpf-1", "cpf-2"]]
+
+
+def test_full_batch_is_sent_before_the_window(monkeypatch):
+    collection = FakeCollection(delay=0.05)
+    batcher = make_batcher(collection, monkeypatch, window_ms="2000", max_queries="2")
+    first = threading.Thread(target=batcher.query, args=(["inicial"], 2, ["distances"]))
+    first.start()
+    time.sleep(0.01)
+
+    start = time.monotonic()
+    _, errors = run_concurrently(batcher, [["rg"], ["cpf"]])
+    first.join()
+    assert not errors
+    assert time.monotonic() - start < 1
+
+
+def test_disabled_batcher_passes_queries_through(monkeypatch):
+    monkeypatch.setenv("QUERY_BATCH_ENABLED", "false")
+    collection = FakeCollection()
+    batcher = QueryBatcher(lambda: collection)
+    assert batcher.query(["rg"], 1, ["distances"])["ids"] == [["rg-0"]]
+    assert collection.calls == [["rg"]]
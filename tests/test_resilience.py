@@ -0,0 +1,197 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from modules.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    acall_with_retry,
+    call_with_retry,
+    is_retryable,
+)
+
+NO_WAIT = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+
+
+def connection_error():
+    return httpx.ConnectError("conexão recusada")
+
+
+def open_breaker(reset_timeout=0.05):
+    breaker = CircuitBreaker("teste", failure_threshold=2, reset_timeout=reset_timeout)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_threshold_and_rejects():
+    breaker = open_breaker(reset_timeout=60)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_half_open_allows_a_single_probe():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_successful_probe_closes_the_circuit():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert call_with_retry(breaker, lambda: "ok", policy=NO_WAIT) == "ok"
+    assert breaker.state == "closed"
+    assert breaker.allow() is False
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = open_breaker()
+    time.sleep(0.06)
+
+    def fail():
+        raise connection_error()
+
+    with pytest.raises(httpx.ConnectError):
+        call_with_retry(breaker, fail, policy=NO_WAIT)
+    assert breaker.state == "open"
+
+
+def test_cancelled_probe_releases_the_half_open_slot():
+    breaker = open_breaker()
+    time.sleep(0.06)
+
+    async def scenario():
+        async def slow():
+            await asyncio.sleep(10)
+
+        probe = asyncio.create_task(acall_with_retry(breaker, slow, policy=NO_WAIT))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        async def fast():
+            return "ok"
+
+        return await acall_with_retry(breaker, fast, policy=NO_WAIT)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_interrupted_sync_probe_releases_the_half_open_slot():
+    breaker = open_breaker()
+    time.sleep(0.06)
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        call_with_retry(breaker, interrupted, policy=NO_WAIT)
+    assert breaker.allow() is True
+
+
+def test_retries_transient_errors_then_succeeds():
+    breaker = CircuitBreaker("teste", failure_threshold=5, reset_timeout=60)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise connection_error()
+        return "ok"
+
+    assert call_with_retry(breaker, flaky, policy=NO_WAIT) == "ok"
+    assert len(calls) == 3
+    assert breaker.state == "closed"
+
+
+def test_request_errors_are_not_retried():
+    breaker = CircuitBreaker("teste", failure_threshold=5, reset_timeout=60)
+    calls = []
+
+    def bad_request():
+        calls.append(1)
+        raise ValueError("requisição inválida")
+
+    with pytest.raises(ValueError):
+        call_with_retry(breaker, bad_request, policy=NO_WAIT)
+    assert len(calls) == 1
+
+
+def test_non_idempotent_calls_only_retry_when_not_processed():
+    assert is_retryable(connection_error(), idempotent=False)
+    assert not is_retryable(httpx.ReadTimeout("sem resposta"), idempotent=False)
+    assert is_retryable(httpx.ReadTimeout("sem resposta"), idempotent=True)
+
+
+def status_error(status):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status, request=request)
+    return openai.APIStatusError("erro", response=response, body=None)
+
+
+def test_non_idempotent_timeouts_open_the_circuit():
+    breaker = CircuitBreaker("teste", failure_threshold=5, reset_timeout=60)
+
+    def send():
+        raise httpx.ReadTimeout("sem resposta")
+
+    for _ in range(5):
+        with pytest.raises(httpx.ReadTimeout):
+            call_with_retry(breaker, send, policy=NO_WAIT, idempotent=False)
+    assert breaker.state == "open"
+
+
+def test_non_idempotent_server_errors_count_as_failures():
+    breaker = CircuitBreaker("teste", failure_threshold=2, reset_timeout=60)
+
+    async def send():
+        raise status_error(500)
+
+    for _ in range(2):
+        with pytest.raises(openai.APIStatusError):
+            asyncio.run(acall_with_retry(breaker, send, policy=NO_WAIT, idempotent=False))
+    assert breaker.state == "open"
+
+
+def test_provider_4xx_counts_as_success():
+    breaker = CircuitBreaker("teste", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+
+    def bad_request():
+        raise status_error(400)
+
+    with pytest.raises(openai.APIStatusError):
+        call_with_retry(breaker, bad_request, policy=NO_WAIT)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_local_errors_do_not_touch_the_circuit():
+    breaker = CircuitBreaker("teste", failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+
+    def bug():
+        raise KeyError("campo")
+
+    with pytest.raises(KeyError):
+        call_with_retry(breaker, bug, policy=NO_WAIT)
+    # A falha anterior continua contando
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    # No teste do circuito meio aberto, o erro local só libera a vaga
+    time.sleep(0.06)
+    with pytest.raises(KeyError):
+        call_with_retry(breaker, bug, policy=NO_WAIT)
+    assert breaker.state == "half_open"
+    assert breaker.allow() is True
@@ -0,0 +1,85 @@
+from unittest import mock
+
+import pytest
+
+from modules.retrieval import RetrievalSettings, fuse_results
+
+
+@pytest.fixture
+def settings():
+    with mock.patch.dict(
+        "os.environ",
+        {"RETRIEVAL_TOP_K": "3", "RETRIEVAL_MAX_DISTANCE": "1.0", "RETRIEVAL_RRF_K": "60"},
+    ):
+        return RetrievalSettings()
+
+
+def results(*queries):
+    """Cada consulta é uma lista de (id, documento, distância), já ordenada por distância"""
+    return {
+        "ids": [[item[0] for item in query] for query in queries],
+        "documents": [[item[1] for item in query] for query in queries],
+        "distances": [[item[2] for item in query] for query in queries],
+    }
+
+
+def test_same_id_from_both_queries_is_fused_once(settings):
+    chunks = fuse_results(
+        results([("a", "RG no Vapt Vupt", 0.2)], [("a", "RG no Vapt Vupt", 0.3)]), settings
+    )
+
+    assert [chunk.id for chunk in chunks] == ["a"]
+    assert chunks[0].score == pytest.approx(2 / 61)
+
+
+def test_chunks_found_by_both_queries_rank_first(settings):
+    chunks = fuse_results(
+        results(
+            [("a", "primeiro da consulta 1", 0.1), ("b", "comum", 0.2)],
+            [("c", "primeiro da consulta 2", 0.1), ("b", "comum", 0.3)],
+        ),
+        settings,
+    )
+
+    assert [chunk.id for chunk in chunks] == ["b", "a", "c"]
+    assert chunks[0].score > chunks[1].score >= chunks[2].score
+
+
+def test_top_k_caps_the_candidates(settings):
+    query = [(f"id{i}", f"trecho {i}", 0.1 * i) for i in range(6)]
+    chunks = fuse_results(results(query), settings)
+
+    assert [chunk.id for chunk in chunks] == ["id0", "id1", "id2"]
+
+
+def test_chunks_beyond_max_distance_are_dropped(settings):
+    chunks = fuse_results(results([("a", "perto", 0.5), ("b", "longe", 1.2)]), settings)
+
+    assert [chunk.id for chunk in chunks] == ["a"]
+
+
+def test_distance_is_the_smallest_seen_for_the_chunk(settings):
+    chunks = fuse_results(
+        results([("a", "horário do posto", 0.6)], [("a", "horário do posto", 0.25)]), settings
+    )
+
+    assert chunks[0].distance == 0.25
+
+
+def test_repeated_text_under_another_id_keeps_the_smallest_distance(settings):
+    chunks = fuse_results(
+        results(
+            [("a", "Horário do posto", 0.4), ("b", "outro trecho", 0.5)],
+            [("a", "Horário do posto", 0.45), ("c", "horário   do posto ", 0.1)],
+        ),
+        settings,
+    )
+
+    assert [chunk.id for chunk in chunks] == ["a", "b"]
+    # model_router usa a menor distância entre os trechos
+    assert min(chunk.distance for chunk in chunks) == 0.1
+
+
+def test_empty_results(settings):
+    assert fuse_results({"ids": [[]], "documents": [[]], "distances": [[]]}, settings) == []
+    assert fuse_results({}, settings) == []
@@ -0,0 +1,92 @@
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from modules.semantic_cache import DEFAULT_THRESHOLDS, SemanticAnswerCache, normalize_question
+
+VECTORS = {
+    "como tirar segunda via do rg": [1.0, 0.0, 0.0],
+    "como tiro a segunda via do rg": [0.99, 0.05, 0.0],
+    "como tirar segunda via da cnh": [0.9, 0.43, 0.0],
+}
+
+
+def embed(texts):
+    return [VECTORS[text] for text in texts]
+
+
+def make_cache(provider="local", **env):
+    with mock.patch.dict("os.environ", env):
+        return SemanticAnswerCache(embed, provider)
+
+
+def test_threshold_depends_on_the_embedding_provider():
+    assert make_cache("local").threshold == DEFAULT_THRESHOLDS["local"]
+    assert make_cache("openai").threshold == DEFAULT_THRESHOLDS["openai"]
+    assert make_cache("local", SEMANTIC_CACHE_THRESHOLD="0.8").threshold == 0.8
+
+
+def test_paraphrase_hits_and_different_service_misses():
+    cache = make_cache()
+    answer, ticket = cache.lookup("Como tirar segunda via do RG?")
+    assert answer is None
+    cache.store("Como tirar segunda via do RG?", "Vá ao posto.", ticket)
+
+    assert cache.lookup("como tiro a segunda via do RG")[0] == "Vá ao posto."
+    assert cache.lookup("Como tirar segunda via da CNH?")[0] is None
+
+
+def test_store_computed_before_invalidation_is_dropped():
+    cache = make_cache()
+    _, ticket = cache.lookup("como tirar segunda via do rg")
+    cache.invalidate("base atualizada")
+    cache.store("como tirar segunda via do rg", "resposta da base antiga", ticket)
+
+    assert cache.stats()["entries"] == 0
+    assert cache.lookup("como tirar segunda via do rg")[0] is None
+
+
+def test_store_without_ticket_is_ignored():
+    cache = make_cache()
+    cache.store("como tirar segunda via do rg", "resposta", None)
+    assert cache.stats()["entries"] == 0
+
+
+def test_short_questions_are_not_eligible():
+    cache = make_cache()
+    assert cache.lookup("e endereço?") == (None, None)
+
+
+def test_embeddings_are_normalized():
+    cache = make_cache()
+    _, ticket = cache.lookup("como tirar segunda via da cnh")
+    assert np.isclose(np.linalg.norm(ticket.embedding), 1.0)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Qual o horário de atendimento do Vapt Vupt?",
+        "Como tirar a segunda via do RG?",
+        "Onde fica o posto mais próximo do centro?",
+    ],
+)
+def test_standalone_questions_are_cacheable(question):
+    assert make_cache().is_standalone(normalize_question(question))
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "E o endereço do posto?",
+        "Quanto custa isso no posto?",
+        "Como renovo a minha CNH?",
+        "Qual o andamento do protocolo 123456?",
+        "Precisa agendar lá também?",
+    ],
+)
+def test_questions_that_depend_on_the_conversation_or_user_are_not(question):
+    cache = make_cache()
+    assert not cache.is_standalone(normalize_question(question))
+    assert cache.lookup(question) == (None, None)
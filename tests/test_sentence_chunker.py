@@ -0,0 +1,80 @@
+from modules.sentence_chunker import SentenceChunker
+
+
+def stream(chunker, text, step=7):
+    chunks = []
+    for start in range(0, len(text), step):
+        chunks.extend(chunker.feed(text[start : start + step]))
+    return chunks + chunker.finish()
+
+
+def test_cuts_at_sentence_ends():
+    chunker = SentenceChunker(max_chars=300, min_chars=10)
+    text = "O RG é emitido no Vapt Vupt. Leve a certidão de nascimento! Precisa agendar?"
+
+    assert stream(chunker, text) == [
+        "O RG é emitido no Vapt Vupt.",
+        "Leve a certidão de nascimento!",
+        "Precisa agendar?",
+    ]
+
+
+def test_abbreviations_and_list_markers_do_not_end_a_sentence():
+    chunker = SentenceChunker(max_chars=300, min_chars=10)
+    text = "Fica na Av. Goiás, com o Dr. Silva. Passos: 1. Agende 2. Compareça."
+
+    assert stream(chunker, text) == [
+        "Fica na Av. Goiás, com o Dr. Silva.",
+        "Passos: 1. Agende 2. Compareça.",
+    ]
+
+
+def test_decimals_split_across_deltas_stay_together():
+    chunker = SentenceChunker(max_chars=300, min_chars=10)
+    chunks = []
+    for delta in ["A taxa é de R$ 1", ".", "234,56 e o prazo é 2", ".", "5 dias. ", "Até logo."]:
+        chunks.extend(chunker.feed(delta))
+    chunks.extend(chunker.finish())
+
+    assert chunks == ["A taxa é de R$ 1.234,56 e o prazo é 2.5 dias.", "Até logo."]
+
+
+def test_line_breaks_split_list_items():
+    chunker = SentenceChunker(max_chars=300, min_chars=5)
+    text = "Documentos\n• RG original\n• Comprovante de endereço"
+
+    assert stream(chunker, text) == [
+        "Documentos",
+        "• RG original",
+        "• Comprovante de endereço",
+    ]
+
+
+def test_short_sentences_are_grouped_up_to_min_chars():
+    chunker = SentenceChunker(max_chars=300, min_chars=20)
+
+    assert stream(chunker, "Sim. Pode ir. O posto abre às oito. Ok.") == [
+        "Sim. Pode ir. O posto abre às oito.",
+        "Ok.",
+    ]
+
+
+def test_trailing_partial_sentence_is_flushed_at_stream_end():
+    chunker = SentenceChunker(max_chars=300, min_chars=10)
+
+    assert chunker.feed("Leve o RG original. Qualquer dúvida") == ["Leve o RG original."]
+    assert chunker.finish() == ["Qualquer dúvida"]
+    assert chunker.text == "Leve o RG original. Qualquer dúvida"
+
+
+def test_length_cap_matches_the_non_streaming_truncation():
+    text = "Primeira frase bem longa sobre o serviço. " * 10
+    chunker = SentenceChunker(max_chars=100, min_chars=10)
+
+    chunks = stream(chunker, text)
+
+    assert chunker.done
+    assert chunker.text == text[:100].strip()
+    assert " ".join(chunks) == text[:100].strip()
+    assert chunker.feed("mais texto.") == []
+    assert chunker.finish() == []
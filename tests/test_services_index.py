@@ -0,0 +1,139 @@
+import os
+
+import pytest
+
+from modules.services_index import ServicesIndex, split_sections
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self.documents = {}
+        self.deleted = False
+
+    def count(self):
+        return len(self.documents)
+
+    def upsert(self, ids, documents):
+        self.documents.update(zip(ids, documents))
+
+    def query(self, query_texts, n_results, include):
+        assert not self.deleted, "consulta em coleção removida"
+        # A seção mais próxima é a que contém a primeira palavra da pergunta
+        ids, distances = [], []
+        for text in query_texts:
+            ranked = sorted(
+                self.documents,
+                key=lambda section_id: text.split()[0] not in self.documents[section_id],
+            )[:n_results]
+            ids.append(ranked)
+            distances.append(
+                [0.2 if text.split()[0] in self.documents[i] else 1.3 for i in ranked]
+            )
+        return {"ids": ids, "distances": distances}
+
+
+class FakeChroma:
+    def __init__(self):
+        self.collections = {}
+
+    def get_or_create_collection(self, name, metadata=None):
+        return self.collections.setdefault(name, FakeCollection(name))
+
+    def list_collections(self):
+        return list(self.collections.values())
+
+    def delete_collection(self, name):
+        self.collections.pop(name).deleted = True
+
+
+def write_services(path, names, mtime):
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("\n\n".join(f"# {name}\n\nServiço de {name}." for name in names))
+    os.utime(path, (mtime, mtime))
+
+
+def test_split_sections_breaks_on_headings_and_size():
+    text = "# RG\n\nEmissão de RG.\n\n# CNH\n\n" + "a" * 30
+    assert split_sections(text, 20) == [
+        "# RG\n\nEmissão de RG.",
+        "# CNH",
+        "a" * 20,
+        "a" * 10,
+    ]
+
+
+@pytest.mark.parametrize(
+    "heading", ["# Emissão de RG", "## cnh", "SERVIÇOS DO DETRAN", "Documentos necessários:"]
+)
+def test_headings_open_a_new_section(heading):
+    assert split_sections(f"Intro.\n\n{heading}\n\nTexto.", 500) == [
+        "Intro.",
+        f"{heading}\n\nTexto.",
+    ]
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "(62) 3201-2345",
+        "08:00 - 17:00",
+        "RUA 7, Nº 123 - CENTRO",
+        "74000-000",
+        "2ª VIA:",
+        "Horário: 08:00 às 17:00",
+        "- • -",
+    ],
+)
+def test_numbers_and_symbols_are_not_headings(line):
+    assert split_sections(f"Intro.\n\n{line}\n\nTexto.", 500) == [
+        f"Intro.\n\n{line}\n\nTexto."
+    ]
+
+
+def test_rebuild_keeps_the_previous_version_for_inflight_searches(tmp_path, monkeypatch):
+    monkeypatch.setenv("SERVICES_COLLECTION", "servicos")
+    monkeypatch.setenv("SERVICES_TOP_K", "1")
+    path = str(tmp_path / "servicos.txt")
+    chroma = FakeChroma()
+
+    write_services(path, ["rg", "cnh"], 1000)
+    index = ServicesIndex(chroma, path)
+    assert index.search(["cnh vencida"]) == ["# cnh\n\nServiço de cnh."]
+    first = index._current[0]
+
+    write_services(path, ["rg", "cnh", "passaporte"], 2000)
+    assert index.search(["passaporte novo"]) == ["# passaporte\n\nServiço de passaporte."]
+    # A versão anterior continua consultável por quem já tinha a referência
+    assert not first.deleted
+
+    write_services(path, ["rg"], 3000)
+    index.search(["rg"])
+    assert first.deleted
+    assert len(chroma.collections) == 2
+
+
+def test_existing_version_is_reused(tmp_path, monkeypatch):
+    monkeypatch.setenv("SERVICES_COLLECTION", "servicos")
+    path = str(tmp_path / "servicos.txt")
+    chroma = FakeChroma()
+    write_services(path, ["rg", "cnh", "passaporte", "cpf"], 1000)
+
+    first = ServicesIndex(chroma, path)._current[0]
+    second = ServicesIndex(chroma, path)._current[0]
+    assert first is second
+    assert list(chroma.collections) == [first.name]
+
+
+def test_only_versions_created_by_the_index_are_dropped(tmp_path, monkeypatch):
+    monkeypatch.setenv("SERVICES_COLLECTION", "servicos")
+    path = str(tmp_path / "servicos.txt")
+    chroma = FakeChroma()
+    others = ["servicos", "servicos_backup", "servicos_0123456789ab_old"]
+    for name in others + ["servicos_0123456789ab"]:
+        chroma.get_or_create_collection(name)
+    write_services(path, ["rg", "cnh"], 1000)
+
+    current = ServicesIndex(chroma, path)._current[0]
+
+    assert sorted(chroma.collections) == sorted(others + [current.name])
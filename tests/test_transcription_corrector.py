@@ -0,0 +1,69 @@
+import random
+import string
+
+import pytest
+from rapidfuzz import fuzz
+
+from modules.transcription_corrector import TranscriptionCorrector
+
+
+@pytest.fixture
+def corrector():
+    return TranscriptionCorrector({"ascom": "PROCON"}, ["PROCON", "Detran"], threshold=65)
+
+
+def test_exact_substitutions_apply_case_insensitively(corrector):
+    assert corrector.correct("Liguei para o Ascom ontem") == "Liguei para o PROCON ontem"
+
+
+def test_close_mistranscription_is_corrected(corrector):
+    # ratio("procom", "procon") = 83,3
+    assert corrector.correct("quero falar com o procom") == "quero falar com o PROCON"
+    assert corrector.correct("renovar no detram") == "renovar no Detran"
+
+
+def test_near_miss_below_the_cutoff_is_kept(corrector):
+    # ratio("protesto", "procon") = 57,1
+    assert fuzz.ratio("protesto", "procon") < 65
+    assert corrector.correct("fazer um protesto") == "fazer um protesto"
+
+
+def test_score_equal_to_the_threshold_is_kept():
+    # ratio("pxocon", "procon") = 83,3: com o limite exatamente na nota, não corrige
+    corrector = TranscriptionCorrector({}, ["PROCON"], threshold=fuzz.ratio("pxocon", "procon"))
+    assert corrector.correct("pxocon") == "pxocon"
+
+
+def test_short_tokens_are_never_fuzzy_corrected(corrector):
+    # ratio("pro", "procon") = 66,7, acima do limite
+    assert fuzz.ratio("pro", "procon") > 65
+    assert corrector.correct("vou pro centro de") == "vou pro centro de"
+
+
+def test_vocabulary_words_keep_their_spelling(corrector):
+    assert corrector.correct("o Procon abre cedo") == "o Procon abre cedo"
+
+
+def test_prefilter_never_drops_a_correction():
+    """O pré-filtro por inicial e tamanho dá o mesmo resultado da comparação com todo o vocabulário"""
+    vocabulary = ["PROCON", "Detran", "Vapt Vupt", "Casa do Cidadão", "CNH"]
+    corrector = TranscriptionCorrector({}, vocabulary, threshold=65)
+    rng = random.Random(7)
+
+    def brute_force(word):
+        if len(word) < corrector.min_length or word in {t.lower() for t in vocabulary}:
+            return word
+        scored = [
+            (fuzz.ratio(word, term.lower()), term)
+            for term in vocabulary
+            if term[0].lower() == word[0]
+        ]
+        best = max(scored, default=(0, None))
+        return best[1] if best[0] > 65 else word
+
+    for _ in range(2000):
+        base = rng.choice(["procon", "detran", "vapt", "casa", "cnh"])
+        word = "".join(
+            rng.choice(string.ascii_lowercase) if rng.random() < 0.25 else char for char in base
+        )[: rng.randint(1, 9)]
+        assert corrector.correct(word) == brute_force(word), word
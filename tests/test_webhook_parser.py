@@ -0,0 +1,98 @@
+import orjson
+import pytest
+
+from modules.webhook_parser import (
+    MESSAGE_AUDIO,
+    MESSAGE_IMAGE,
+    MESSAGE_TEXT,
+    MESSAGE_UNKNOWN,
+    MESSAGES_UPSERT,
+    InvalidWebhookError,
+    parse_webhook,
+    preview,
+)
+
+
+def body(data, event=MESSAGES_UPSERT, instance="inst"):
+    return orjson.dumps({"instance": instance, "event": event, "data": data})
+
+
+def item(message, message_id="MSG1", from_me=False):
+    return {
+        "key": {"remoteJid": "5585999990000@s.whatsapp.net", "id": message_id, "fromMe": from_me},
+        "message": message,
+    }
+
+
+def test_malformed_json_raises_invalid_webhook():
+    with pytest.raises(InvalidWebhookError):
+        parse_webhook(b'{"instance": "inst", ')
+
+
+def test_payload_without_instance_is_ignored():
+    assert parse_webhook(b'{"event": "messages.upsert"}') is None
+    assert parse_webhook(b"[]") is None
+
+
+def test_other_events_carry_no_messages():
+    event = parse_webhook(body([item({"conversation": "oi"})], event="connection.update"))
+    assert event.event_type == "connection.update"
+    assert event.messages == []
+
+
+def test_text_message():
+    event = parse_webhook(body([item({"conversation": "Oi, bom dia"})]))
+    (message,) = event.messages
+    assert (message.instance, message.message_id, message.number_sender) == (
+        "inst",
+        "MSG1",
+        "5585999990000",
+    )
+    assert (message.kind, message.text) == (MESSAGE_TEXT, "Oi, bom dia")
+
+
+def test_extended_text_and_single_dict_data():
+    event = parse_webhook(body(item({"textMessage": {"text": "segunda via"}})))
+    assert [(m.kind, m.text) for m in event.messages] == [(MESSAGE_TEXT, "segunda via")]
+
+
+def test_audio_message_keeps_only_the_base64():
+    event = parse_webhook(body([item({"audioMessage": {"seconds": 3}, "base64": "T2dnUw=="})]))
+    (message,) = event.messages
+    assert (message.kind, message.audio_base64, message.text) == (MESSAGE_AUDIO, "T2dnUw==", None)
+
+
+def test_media_and_unknown_kinds():
+    event = parse_webhook(
+        body([item({"imageMessage": {}}, "A"), item({"stickerMessage": {}}, "B")])
+    )
+    assert [m.kind for m in event.messages] == [MESSAGE_IMAGE, MESSAGE_UNKNOWN]
+
+
+def test_text_without_content_is_unknown():
+    event = parse_webhook(body([item({"textMessage": {}})]))
+    assert [(m.kind, m.text) for m in event.messages] == [(MESSAGE_UNKNOWN, None)]
+
+
+def test_items_without_key_or_message_are_skipped():
+    event = parse_webhook(
+        body([{"message": {"conversation": "oi"}}, {"key": {"id": "X"}}, None, item({"conversation": "ok"})])
+    )
+    assert event.skipped == 3
+    assert [m.text for m in event.messages] == ["ok"]
+
+
+def test_missing_data_has_no_messages():
+    event = parse_webhook(orjson.dumps({"instance": "inst", "event": MESSAGES_UPSERT}))
+    assert (event.messages, event.skipped) == ([], 0)
+
+
+def test_messages_sent_by_the_bot_are_skipped():
+    event = parse_webhook(body([item({"conversation": "resposta do bot"}, from_me=True)]))
+    assert (event.messages, event.skipped) == ([], 1)
+
+
+def test_preview_truncates_long_text():
+    assert preview("abc", limit=5) == "abc"
+    assert preview("abcdefgh", limit=5) == "abcde... (+3 caracteres)"
+    assert preview(None) == ""